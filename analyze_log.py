@@ -0,0 +1,252 @@
+import argparse
+import time
+
+import numpy as np
+
+NUMERIC = {'Temperature': 'temperature', 'LoadPower': 'load_power', 'Voltage': 'voltage', 'Frequency': 'frequency'}
+CATEGORICAL = {'Mode': 'mode', 'OperationType': 'operation'}
+
+
+class Categories:
+    """Category strings -> stable integer codes, shared by every chunk of a file"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, column):
+        uniques, inverse = np.unique(column, return_inverse=True)
+        lookup = np.empty(len(uniques), dtype=np.int16)
+        for i, value in enumerate(uniques):
+            value = value.decode() if isinstance(value, bytes) else str(value)
+            if value not in self.codes:
+                self.codes[value] = len(self.values)
+                self.values.append(value)
+            lookup[i] = self.codes[value]
+        return lookup[inverse]
+
+
+def to_float(column):
+    """Byte strings -> float, blank cells become NaN"""
+    out = np.full(len(column), np.nan)
+    present = np.char.str_len(column) > 0
+    out[present] = column[present].astype(float)
+    return out
+
+
+def parse_lines(lines, header, categories):
+    """Parse a block of CSV lines into columns without a per-row Python loop"""
+    rest = np.char.rstrip(np.array(lines, dtype=bytes), b'\r\n')
+    rest = rest[np.char.str_len(rest) > 0]
+    columns = {}
+    for name in header:
+        cell, _, rest = np.char.partition(rest, b',').T
+        if name == 'Timestamp':
+            columns['timestamp'] = cell.astype('U19').astype('datetime64[s]')
+        elif name in NUMERIC:
+            columns[NUMERIC[name]] = to_float(cell)
+        elif name in CATEGORICAL:
+            key = CATEGORICAL[name]
+            columns[key] = categories.setdefault(key, Categories()).encode(cell)
+    return columns
+
+
+def read_chunks(paths, chunk_bytes=8 * 1024 * 1024, categories=None):
+    """Stream one or more logs as column chunks of about chunk_bytes of text"""
+    categories = {} if categories is None else categories
+    for path in paths:
+        with open(path, 'rb') as f:
+            header = f.readline().decode().strip().split(',')
+            if 'Timestamp' not in header or 'Temperature' not in header:
+                raise ValueError(f"{path} does not look like a temperature log: {header}")
+            while True:
+                lines = f.readlines(chunk_bytes)
+                if not lines:
+                    break
+                yield parse_lines(lines, header, categories), categories
+
+
+def load_log(path):
+    """Whole log as a dict of arrays, for files that fit in memory"""
+    chunks = []
+    categories = {}
+    for chunk, categories in read_chunks([path]):
+        chunks.append(chunk)
+    if not chunks:
+        return {}, categories
+    return {key: np.concatenate([c[key] for c in chunks]) for key in chunks[0]}, categories
+
+
+class LogStats:
+    """Streaming statistics over log chunks.
+
+    A run is a stretch of rows with the same Mode and OperationType and no
+    gap longer than `gap` seconds. Time above threshold counts the interval
+    leading up to each sample over the threshold, gaps excluded. The
+    rolling mean restarts with every run and every file.
+    """
+
+    def __init__(self, threshold=45.0, gap=5.0, window=60, bins=None):
+        self.threshold = threshold
+        self.gap = gap
+        self.window = window
+        self.bins = np.arange(20, 81, 2.5) if bins is None else np.asarray(bins)
+        self.rows = 0
+        self.runs = []
+        self.open_run = None
+        self.last = None  # (timestamp, mode, operation) of the previous row
+        self.tail = np.empty(0)  # last window-1 temperatures of the open run, for the rolling mean
+        self.histograms = {}
+        self.above = {}
+
+    def add(self, chunk):
+        t = chunk['timestamp'].astype(np.int64)
+        temp = chunk['temperature']
+        n = len(t)
+        if n == 0:
+            return
+        mode = chunk.get('mode', np.zeros(n, dtype=np.int16))
+        operation = chunk.get('operation', np.zeros(n, dtype=np.int16))
+        self.rows += n
+
+        if self.last is None:
+            prev_t, prev_mode, prev_op = t[0], -1, -1
+        else:
+            prev_t, prev_mode, prev_op = self.last
+        dt = np.diff(np.r_[prev_t, t]).astype(float)
+        new = (dt > self.gap) | (mode != np.r_[prev_mode, mode[:-1]]) | (operation != np.r_[prev_op, operation[:-1]])
+        dt[new] = 0.0
+        above = np.where(temp > self.threshold, dt, 0.0)
+
+        # Rolling mean over the last `window` samples of the same run, carried across chunks
+        tail = np.empty(0) if new[0] else self.tail
+        joined = np.r_[tail, temp]
+        index = np.arange(len(joined))
+        # The carried tail only holds the open run, so the window can't reach before it
+        starts_here = np.r_[np.zeros(len(tail), bool), new]
+        starts_here[0] = True
+        run_start = np.maximum.accumulate(np.where(starts_here, index, 0))
+        valid_joined = ~np.isnan(joined)
+        csum = np.r_[0.0, np.cumsum(np.where(valid_joined, joined, 0.0))]
+        ccount = np.r_[0, np.cumsum(valid_joined)]
+        w = self.window
+        full = index - run_start >= w - 1
+        lo = np.maximum(index + 1 - w, 0)
+        count = ccount[index + 1] - ccount[lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolling = np.where(full & (count > 0), (csum[index + 1] - csum[lo]) / count, np.nan)[len(tail):]
+        keep = max(len(joined) - (w - 1), run_start[-1]) if w > 1 else len(joined)
+        self.tail = joined[keep:]
+
+        for code in np.unique(operation):
+            mask = operation == code
+            counts, _ = np.histogram(temp[mask], self.bins)
+            self.histograms[code] = self.histograms.get(code, 0) + counts
+            self.above[code] = self.above.get(code, 0.0) + above[mask].sum()
+
+        # Per-run aggregates with one reduceat per statistic
+        starts = np.flatnonzero(new)
+        continues = not new[0]
+        if continues:
+            starts = np.r_[0, starts]
+        ends = np.r_[starts[1:], n]
+        valid = ~np.isnan(temp)
+        segments = {
+            'start': t[starts],
+            'end': t[ends - 1],
+            'count': np.add.reduceat(valid.astype(np.int64), starts),
+            'sum': np.add.reduceat(np.where(valid, temp, 0.0), starts),
+            'min': np.fmin.reduceat(temp, starts),
+            'max': np.fmax.reduceat(temp, starts),
+            'above': np.add.reduceat(above, starts),
+            'peak_rolling': np.fmax.reduceat(rolling, starts),
+            'mode': mode[starts],
+            'operation': operation[starts],
+        }
+        for i in range(len(starts)):
+            run = {key: values[i].item() for key, values in segments.items()}
+            if i == 0 and continues and self.open_run is not None:
+                self._merge(self.open_run, run)
+                continue
+            if self.open_run is not None:
+                self.runs.append(self.open_run)
+            self.open_run = run
+        self.last = (t[-1], mode[-1], operation[-1])
+
+    @staticmethod
+    def _merge(run, more):
+        run['end'] = more['end']
+        run['count'] += more['count']
+        run['sum'] += more['sum']
+        run['min'] = float(np.fmin(run['min'], more['min']))
+        run['max'] = float(np.fmax(run['max'], more['max']))
+        run['above'] += more['above']
+        run['peak_rolling'] = float(np.fmax(run['peak_rolling'], more['peak_rolling']))
+
+    def start_file(self):
+        """The next chunk comes from a new file, its rolling mean starts over"""
+        self.tail = np.empty(0)
+
+    def finish(self):
+        if self.open_run is not None:
+            self.runs.append(self.open_run)
+            self.open_run = None
+        return self.runs
+
+
+def name_of(categories, key, code):
+    values = categories.get(key).values if key in categories else []
+    return values[code] if 0 <= code < len(values) else '-'
+
+
+def report(stats, categories):
+    print(f"{stats.rows} rows, {len(stats.runs)} runs")
+    print()
+    print(f"{'start':19} {'dur s':>7} {'mode':>5} {'operation':>10} {'n':>6} "
+          f"{'mean':>6} {'min':>6} {'max':>6} {f'>{stats.threshold:g} s':>8} {f'roll{stats.window}':>7}")
+    for run in stats.runs:
+        start = str(np.datetime64(run['start'], 's')).replace('T', ' ')
+        mean = run['sum'] / run['count'] if run['count'] else float('nan')
+        print(f"{start:19} {run['end'] - run['start']:7d} {name_of(categories, 'mode', run['mode']):>5} "
+              f"{name_of(categories, 'operation', run['operation']):>10} {run['count']:6d} {mean:6.1f} "
+              f"{run['min']:6.1f} {run['max']:6.1f} {run['above']:8.0f} {run['peak_rolling']:7.1f}")
+
+    for code, counts in sorted(stats.histograms.items()):
+        operation = name_of(categories, 'operation', code)
+        total = counts.sum()
+        print()
+        print(f"{operation}: {total} samples, {stats.above[code]:.0f} s above {stats.threshold:g} °C")
+        peak = counts.max() if total else 1
+        for lo, hi, count in zip(stats.bins[:-1], stats.bins[1:], counts):
+            if count:
+                print(f"  {lo:5.1f}-{hi:5.1f} °C {count:8d} {'#' * max(1, int(40 * count / peak))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise temperature_data.csv style logs")
+    parser.add_argument('logs', nargs='+', help="log files, processed in the order given")
+    parser.add_argument('--threshold', type=float, default=45.0, help="°C, for time above threshold")
+    parser.add_argument('--gap', type=float, default=5.0, help="seconds without data that end a run")
+    parser.add_argument('--window', type=int, default=60, help="samples in the rolling mean")
+    parser.add_argument('--bins', type=float, nargs=3, metavar=('LO', 'HI', 'STEP'), default=(20, 80, 2.5),
+                        help="histogram range and bin width in °C")
+    parser.add_argument('--chunk-mb', type=float, default=8, help="text read per chunk")
+    args = parser.parse_args()
+
+    lo, hi, step = args.bins
+    stats = LogStats(args.threshold, args.gap, args.window, np.arange(lo, hi + step / 2, step))
+    categories = {}
+    start = time.perf_counter()
+    for path in args.logs:
+        stats.start_file()
+        for chunk, categories in read_chunks([path], int(args.chunk_mb * 1024 * 1024), categories):
+            stats.add(chunk)
+    stats.finish()
+    elapsed = time.perf_counter() - start
+    report(stats, categories)
+    print()
+    print(f"Processed in {elapsed:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
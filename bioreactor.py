@@ -0,0 +1,144 @@
+from startup import after_first_frame, mark, preload
+# What the subsystems import, loaded while Kivy sets up the window
+preload('numpy', 'serial', 'run_archive')
+
+import time
+
+from kivy.config import Config
+Config.set('input', 'mtdev_%(name)s', 'disabled')
+Config.set('input', 'hid_%(name)s', 'disabled')
+Config.set('input', 'mouse', 'mouse,disable_multitouch')
+
+from kivy.app import App
+from kivy.clock import Clock
+from kivy.core.window import Window
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.label import Label
+from kivy.uix.screenmanager import NoTransition, Screen, ScreenManager
+from kivy.uix.togglebutton import ToggleButton
+
+from services import Services
+
+# One window for both subsystems (for touchscreen)
+Window.fullscreen = 'auto'
+Window.clearcolor = (0.1, 0.1, 0.12, 1)
+
+
+class LazyScreen(Screen):
+    """Screen whose content is built by factory() the first time it is shown.
+
+    A subsystem costs import time and memory, so nothing is imported until
+    the operator first switches to it. Screens stay empty until `live` is
+    set, which the host does after the first frame. If building fails the
+    error is shown in place of the content and the next visit tries again.
+    """
+
+    def __init__(self, factory, **kwargs):
+        super().__init__(**kwargs)
+        self.factory = factory
+        self.body = None
+        self.live = False
+
+    def on_pre_enter(self, *args):
+        if self.live:
+            self.load()
+
+    def load(self):
+        if self.body is not None:
+            return
+        self.clear_widgets()
+        started = time.perf_counter()
+        try:
+            self.body = self.factory()
+        except Exception as e:
+            print(f"Could not load {self.name}: {e}")
+            self.add_widget(Label(text=f'{self.name} unavailable\n{e}', font_size='20sp',
+                                  color=(1, 0.3, 0.3, 1), halign='center'))
+            return
+        self.add_widget(self.body)
+        print(f"Loaded {self.name} in {time.perf_counter() - started:.2f} s")
+
+
+class BioreactorApp(App):
+    """The ultrasound dashboard and the pump panel in one process and window"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.services = Services()
+        self.dashboard = None
+        self.pump_panel = None
+
+    def build(self):
+        self.title = "Low Frequency Ultrasound Bio-Reactor"
+        root = BoxLayout(orientation='vertical')
+
+        tabs = BoxLayout(orientation='horizontal', size_hint_y=0.08, spacing=4, padding=4)
+        self.screens = ScreenManager(transition=NoTransition())
+        for name, factory in (('Ultrasound', self.build_ultrasound), ('Pump', self.build_pump)):
+            self.screens.add_widget(LazyScreen(factory, name=name))
+            button = ToggleButton(text=name, group='screens', allow_no_selection=False,
+                                  state='down' if name == 'Ultrasound' else 'normal', size_hint_x=0.15)
+            button.bind(on_press=lambda instance: setattr(self.screens, 'current', instance.text))
+            tabs.add_widget(button)
+        self.status = Label(text='', font_size='16sp', color=(0.8, 0.8, 0.8, 1), size_hint_x=0.7)
+        tabs.add_widget(self.status)
+        root.add_widget(tabs)
+        root.add_widget(self.screens)
+
+        self.services.bus.subscribe('*', self.update_status)
+        Clock.schedule_interval(self.services.bus.drain, 0.2)
+        mark('host built')
+        return root
+
+    def on_start(self):
+        # The first screen is built once the window is up, its hardware after that
+        after_first_frame(self.go_live)
+
+    def go_live(self):
+        for screen in self.screens.screens:
+            screen.live = True
+        self.screens.current_screen.load()
+
+    def build_ultrasound(self):
+        import main
+        self.dashboard = main.Dashboard()
+        self.dashboard.bus = self.services.bus
+        self.services.on_shutdown(self.dashboard.shutdown)
+        self.services.register('amplifier', main.AmplifierLink())
+        after_first_frame(self.dashboard.connect)
+        return self.dashboard
+
+    def build_pump(self):
+        import pump_control
+        stepper = pump_control.create_stepper()
+        self.services.on_shutdown(stepper.cleanup)
+        self.pump_panel = pump_control.StepperControlPanel(stepper=stepper)
+        self.services.on_shutdown(self.pump_panel.runner.shutdown)
+        self.services.register('pump', self.pump_panel.pump)
+        Clock.schedule_interval(self.publish_pump, 1)
+        after_first_frame(self.pump_panel.connect)
+        return self.pump_panel
+
+    def publish_pump(self, dt):
+        panel = self.pump_panel
+        self.services.bus.publish('pump', running=panel.motor_running, flow=panel.pump.get_flow(),
+                                  rpm=panel.runner.achieved_rpm(), delivered_ml=panel.pump.delivered_ml)
+
+    def update_status(self, topic, values):
+        bus = self.services.bus
+        parts = []
+        if 'ultrasound' in bus.latest:
+            temperature = bus.get('ultrasound', 'temperature')
+            state = 'ON' if bus.get('ultrasound', 'running') else 'OFF'
+            parts.append(f"Ultrasound {state}" + (f", {temperature} °C" if temperature is not None else ''))
+        if 'pump' in bus.latest:
+            flow = f"{bus.get('pump', 'flow'):.2f} mL/min" if bus.get('pump', 'running') else 'stopped'
+            parts.append(f"Pump {flow}, {bus.get('pump', 'delivered_ml'):.2f} mL delivered")
+        self.status.text = '   |   '.join(parts)
+
+    def on_stop(self):
+        self.services.shutdown()
+
+
+if __name__ == '__main__':
+    BioreactorApp().run()
@@ -0,0 +1,101 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+import ntc
+
+
+def fit_steinhart_hart(resistance, reference_c):
+    """Least-squares fit of the four Steinhart-Hart coefficients.
+
+    Solves 1/T = a + b*x + c*x^2 + d*x^3 with x = ln(R/R25) in one call,
+    returns the coefficients and the per-point residuals in °C.
+    """
+    r = np.asarray(resistance, dtype=float)
+    t = np.asarray(reference_c, dtype=float)
+    if r.shape != t.shape or r.ndim != 1:
+        raise ValueError("Resistance and reference temperatures must be matching 1-D arrays")
+    if len(r) < 4:
+        raise ValueError("Need at least four calibration points for four coefficients")
+    if np.any(r <= 0):
+        raise ValueError("Resistances must be positive")
+
+    x = np.log(r / ntc.r25)
+    design = np.vander(x, 4, increasing=True)
+    # Scale columns so the solve is well conditioned, x^3 is tiny next to 1
+    scale = np.abs(design).max(axis=0)
+    scale[scale == 0] = 1.0
+    solution, _, _, _ = np.linalg.lstsq(design / scale, 1 / (t + 273.15), rcond=None)
+    coeffs = tuple(float(c) for c in solution / scale)
+
+    residuals = ntc.resistance_to_celsius(r, coeffs) - t
+    return coeffs, residuals
+
+
+def load_points(path):
+    """Paired (resistance, reference °C) measurements from a two column CSV"""
+    resistance = []
+    reference = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].strip().startswith('#'):
+                continue
+            try:
+                r, t = float(row[0]), float(row[1])
+            except ValueError:
+                continue  # header line
+            resistance.append(r)
+            reference.append(t)
+    return np.array(resistance), np.array(reference)
+
+
+def save_calibration(probe, coeffs, residuals, directory=ntc.CALIBRATION_DIR):
+    """Write a per-probe calibration file that ntc.py builds its conversion table from"""
+    os.makedirs(directory, exist_ok=True)
+    path = ntc.calibration_path(probe, directory)
+    data = {
+        'probe': probe,
+        'r25': ntc.r25,
+        'coefficients': list(coeffs),
+        'points': int(len(residuals)),
+        'rms_error_c': float(np.sqrt(np.mean(residuals ** 2))),
+        'max_error_c': float(np.max(np.abs(residuals))),
+        'fitted': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit Steinhart-Hart coefficients for an NTC probe")
+    parser.add_argument('points', help="CSV of resistance (ohm), reference temperature (°C)")
+    parser.add_argument('--probe', required=True, help="probe id, names the calibration file")
+    parser.add_argument('--dir', default=ntc.CALIBRATION_DIR, help="calibration directory")
+    parser.add_argument('--dry-run', action='store_true', help="report the fit without saving it")
+    args = parser.parse_args()
+
+    resistance, reference = load_points(args.points)
+    start = time.perf_counter()
+    coeffs, residuals = fit_steinhart_hart(resistance, reference)
+    elapsed = time.perf_counter() - start
+
+    print(f"Fitted {len(residuals)} points in {elapsed * 1000:.2f} ms")
+    for name, value in zip('abcd', coeffs):
+        print(f"  {name} = {value:.9e}")
+    print(f"{'R (ohm)':>12} {'ref °C':>8} {'fit °C':>8} {'error':>7}")
+    for r, t, e in zip(resistance, reference, residuals):
+        print(f"{r:12.1f} {t:8.2f} {t + e:8.2f} {e:+7.3f}")
+    print(f"RMS error {np.sqrt(np.mean(residuals ** 2)):.3f} °C, max {np.max(np.abs(residuals)):.3f} °C")
+
+    if not args.dry_run:
+        path = save_calibration(args.probe, coeffs, residuals, args.dir)
+        print(f"Calibration written to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+import struct
+
+import numpy as np
+
+MAGIC = b'LFZ2'
+# Smallest value needing 2, 3, ... 10 varint bytes
+_VARINT_LIMITS = np.array([1 << (7 * k) for k in range(1, 10)], dtype=np.uint64)
+
+# Kept precision per column when compacting a run, 100 keeps 0.01
+SCALES = {'temperature': 100, 'load_power': 100, 'voltage': 100, 'frequency': 1}
+
+
+def zigzag_encode(values):
+    """Signed int64 -> unsigned, small magnitudes stay small"""
+    v = np.asarray(values, dtype=np.int64)
+    return ((v << 1) ^ (v >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(values):
+    u = np.asarray(values, dtype=np.uint64)
+    return ((u >> np.uint64(1)).astype(np.int64)) ^ -((u & np.uint64(1)).astype(np.int64))
+
+
+def varint_encode(values):
+    """LEB128 varints for a uint64 array, built without a per-value loop"""
+    u = np.asarray(values, dtype=np.uint64)
+    if len(u) == 0:
+        return b''
+    # Bytes needed per value, 7 payload bits each
+    lengths = np.searchsorted(_VARINT_LIMITS, u, side='right') + 1
+
+    owner = np.repeat(np.arange(len(u)), lengths)
+    first = np.r_[0, np.cumsum(lengths)[:-1]]
+    position = np.arange(len(owner)) - first[owner]
+    out = ((u[owner] >> (7 * position).astype(np.uint64)) & np.uint64(0x7F)).astype(np.uint8)
+    more = position < lengths[owner] - 1
+    out[more] |= 0x80
+    return out.tobytes()
+
+
+def varint_decode(data, count=None):
+    """Inverse of varint_encode, returns (values, bytes consumed)"""
+    b = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(b < 0x80)
+    if count is not None:
+        if len(ends) < count:
+            raise ValueError("Truncated varint stream")
+        ends = ends[:count]
+    if len(ends) == 0:
+        return np.empty(0, dtype=np.uint64), 0
+    used = int(ends[-1]) + 1
+    b = b[:used]
+    starts = np.r_[0, ends[:-1] + 1]
+    owner = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    position = np.arange(used) - starts[owner]
+    if position.max() > 9:
+        raise ValueError("Varint longer than 64 bits")
+    parts = (b & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.add.reduceat(parts, starts), used
+
+
+def encode_timestamps(timestamps, resolution=1e-3):
+    """Delta-of-delta on integer ticks, regular sampling encodes as runs of zero"""
+    ticks = np.rint(np.asarray(timestamps, dtype=np.float64) / resolution).astype(np.int64)
+    if len(ticks) == 0:
+        return ticks
+    deltas = np.diff(ticks, prepend=0)
+    return np.diff(deltas, prepend=0)  # first entry is ticks[0] itself
+
+
+def decode_timestamps(dod, resolution=1e-3):
+    return np.cumsum(np.cumsum(dod)) * resolution
+
+
+def encode_values(values, scale):
+    """Readings as scaled integers, first entry absolute then deltas.
+
+    NaN is kept as a separate bitmask, so gaps in load power or voltage
+    cost one bit a sample.
+    """
+    v = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(v)
+    ints = np.rint(np.where(missing, 0.0, v) * scale).astype(np.int64)
+    if missing.any():
+        # Carry the last value over gaps so they don't cost two large deltas
+        idx = np.where(missing, 0, np.arange(len(v)))
+        np.maximum.accumulate(idx, out=idx)
+        ints = ints[idx]
+    return np.diff(ints, prepend=0), missing
+
+
+def decode_values(deltas, missing, scale):
+    v = np.cumsum(deltas) / scale
+    v[missing] = np.nan
+    return v
+
+
+def _pack_text(text):
+    encoded = text.encode()
+    return struct.pack('<B', len(encoded)) + encoded
+
+
+def _unpack_text(data, offset):
+    (length,) = struct.unpack_from('<B', data, offset)
+    offset += 1
+    return bytes(data[offset:offset + length]).decode(), offset + length
+
+
+def encode_chunk(timestamps, columns, scales, time_resolution=1e-3, categories=None):
+    """Compress one chunk of telemetry to bytes.
+
+    columns is name -> float array and scales is name -> multiplier giving
+    the kept precision (100 keeps 0.01 °C). categories is name -> (codes,
+    values) for string columns such as Mode: the values list goes in the
+    header as a dictionary, the codes as delta varints. Layout: header,
+    then for the timestamps and each column a zig-zag varint block, column
+    missing-value bitmaps are packed after their block, category code
+    blocks come last.
+    """
+    n = len(timestamps)
+    names = list(columns)
+    categories = categories or {}
+    header = MAGIC + struct.pack('<Id', n, time_resolution) + struct.pack('<H', len(names))
+    for name in names:
+        encoded = name.encode()
+        header += struct.pack('<Bd', len(encoded), scales[name]) + encoded
+    header += struct.pack('<H', len(categories))
+    for name, (_, values) in categories.items():
+        header += _pack_text(name) + struct.pack('<H', len(values)) + b''.join(map(_pack_text, values))
+
+    blocks = [varint_encode(zigzag_encode(encode_timestamps(timestamps, time_resolution)))]
+    for name in names:
+        deltas, missing = encode_values(columns[name], scales[name])
+        blocks.append(varint_encode(zigzag_encode(deltas)))
+        mask = np.packbits(missing).tobytes() if missing.any() else b''
+        blocks.append(mask)
+    for codes, _ in categories.values():
+        blocks.append(varint_encode(zigzag_encode(np.diff(np.asarray(codes, dtype=np.int64), prepend=0))))
+
+    sizes = struct.pack(f'<{len(blocks)}I', *map(len, blocks))
+    return header + sizes + b''.join(blocks)
+
+
+def decode_chunk(data):
+    """Inverse of encode_chunk, returns (timestamps, {name: values}).
+
+    Category columns come back as arrays of their strings.
+    """
+    data = memoryview(data)
+    if bytes(data[:4]) != MAGIC:
+        raise ValueError("Not an encoded telemetry chunk")
+    n, time_resolution = struct.unpack_from('<Id', data, 4)
+    (count,) = struct.unpack_from('<H', data, 16)
+    offset = 18
+    names = []
+    scales = {}
+    for _ in range(count):
+        length, scale = struct.unpack_from('<Bd', data, offset)
+        offset += 9
+        name = bytes(data[offset:offset + length]).decode()
+        offset += length
+        names.append(name)
+        scales[name] = scale
+    dictionaries = {}
+    (ncategories,) = struct.unpack_from('<H', data, offset)
+    offset += 2
+    for _ in range(ncategories):
+        name, offset = _unpack_text(data, offset)
+        (nvalues,) = struct.unpack_from('<H', data, offset)
+        offset += 2
+        values = []
+        for _ in range(nvalues):
+            value, offset = _unpack_text(data, offset)
+            values.append(value)
+        dictionaries[name] = values
+    nblocks = 1 + 2 * count + len(dictionaries)
+    sizes = struct.unpack_from(f'<{nblocks}I', data, offset)
+    offset += 4 * nblocks
+
+    def block(i):
+        start = offset + sum(sizes[:i])
+        return data[start:start + sizes[i]]
+
+    dod, _ = varint_decode(block(0), n)
+    timestamps = decode_timestamps(zigzag_decode(dod), time_resolution)
+    columns = {}
+    for i, name in enumerate(names):
+        deltas, _ = varint_decode(block(1 + 2 * i), n)
+        mask = block(2 + 2 * i)
+        missing = np.unpackbits(np.frombuffer(mask, dtype=np.uint8), count=n).astype(bool) if len(mask) \
+            else np.zeros(n, dtype=bool)
+        columns[name] = decode_values(zigzag_decode(deltas), missing, scales[name])
+    for i, (name, values) in enumerate(dictionaries.items()):
+        deltas, _ = varint_decode(block(1 + 2 * count + i), n)
+        codes = np.cumsum(zigzag_decode(deltas))
+        columns[name] = np.asarray(values, dtype=object)[codes]
+    return timestamps, columns
+
+
+def write_compressed(store, path, chunk_rows=65536, scales=SCALES):
+    """Compact a ColumnStore into a file of length-prefixed encoded chunks"""
+    names = [name for name in scales if name in store.columns]
+    with open(path, 'wb') as f:
+        for start in range(0, store.length, chunk_rows):
+            rows = slice(start, min(start + chunk_rows, store.length))
+            chunk = encode_chunk(store.maps['timestamp'][rows],
+                                 {name: store.maps[name][rows] for name in names},
+                                 {name: scales[name] for name in names},
+                                 categories={name: (store.maps[name][rows], values)
+                                             for name, values in store.categories.items()})
+            f.write(struct.pack('<I', len(chunk)))
+            f.write(chunk)
+
+
+def read_compressed(path):
+    """Yield (timestamps, columns) for each chunk written by write_compressed"""
+    with open(path, 'rb') as f:
+        while True:
+            size = f.read(4)
+            if not size:
+                return
+            (length,) = struct.unpack('<I', size)
+            yield decode_chunk(f.read(length))
@@ -0,0 +1,198 @@
+import math
+
+# Record positions of the compressed channels, see TelemetryLogger.log
+CHANNELS = {'temperature': 1, 'load_power': 4, 'voltage': 5}
+
+
+class ChannelCompressor:
+    """Deadband plus swinging-door compression for one channel.
+
+    Samples within `deadband` of the last reference value are snapped to
+    it, then the swinging door keeps a point only when the straight line
+    from the last kept point to the newest sample would no longer stay
+    within `deviation` of every sample in between. Linear interpolation
+    between kept points is therefore within deviation + 2 * deadband of
+    every input sample (the deadband counts once for the snapped samples
+    and once for the raw values stored at the kept points).
+
+    Crossings of `limits` and the start and end of a run of missing values
+    are always kept, together with the sample before them. A sustained
+    excursion or gap is one state, not an event per sample: excursions are
+    compressed like any other stretch, gaps keep only their first sample.
+    Forced points (faults) are kept with the samples before and after.
+    """
+
+    def __init__(self, deviation, deadband=0.0, limits=None, max_interval=None):
+        self.deviation = deviation
+        self.deadband = deadband
+        self.limits = limits
+        self.max_interval = max_interval
+        self.reset()
+
+    def reset(self):
+        self.anchor = None      # (t, v) of the last kept point
+        self.last = None        # (t, v) of the previous sample
+        self.last_kept = False
+        self.last_event = False
+        self.state = None       # 'inside', 'outside' (the limits) or 'missing'
+        self.reference = None   # deadband reference value
+        self.slope_hi = math.inf
+        self.slope_lo = -math.inf
+
+    def _state(self, v):
+        if math.isnan(v):
+            return 'missing'
+        if self.limits is not None:
+            lo, hi = self.limits
+            if (lo is not None and v < lo) or (hi is not None and v > hi):
+                return 'outside'
+        return 'inside'
+
+    def _keep(self, t, v):
+        self.anchor = (t, v)
+        self.last = (t, v)
+        self.last_kept = True
+        self.slope_hi = math.inf
+        self.slope_lo = -math.inf
+
+    def push(self, t, v, force=False):
+        """Feed one sample, returns (keep previous sample, keep this sample)"""
+        if v is None:
+            v = math.nan
+        state = self._state(v)
+        changed = state != self.state
+        self.state = state
+
+        if state == 'missing' and not changed and not force:
+            # Still in the gap, its first sample already marks it
+            self.last = (t, v)
+            self.last_kept = True
+            return False, False
+
+        if self.anchor is None or force or changed or self.last_event or \
+                (self.max_interval is not None and t - self.anchor[0] >= self.max_interval):
+            keep_previous = self.last is not None and not self.last_kept
+            self._keep(t, v)
+            self.last_event = force
+            self.reference = None if state == 'missing' else v
+            return keep_previous, True
+        self.last_event = False
+
+        if self.reference is not None and abs(v - self.reference) <= self.deadband:
+            v = self.reference
+        else:
+            self.reference = v
+
+        ta, va = self.anchor
+        dt = t - ta
+        if dt <= 0:
+            self.last = (t, v)
+            return False, False
+        keep_previous = False
+        if not self.slope_lo <= (v - va) / dt <= self.slope_hi:
+            # Door closed: the line to this sample would leave the corridor,
+            # so the previous sample (still a valid end point) is kept
+            keep_previous = not self.last_kept
+            self.anchor = self.last
+            self.slope_hi = math.inf
+            self.slope_lo = -math.inf
+            ta, va = self.anchor
+            dt = t - ta
+        if dt > 0:
+            self.slope_hi = min(self.slope_hi, (v + self.deviation - va) / dt)
+            self.slope_lo = max(self.slope_lo, (v - self.deviation - va) / dt)
+        self.last = (t, v)
+        self.last_kept = False
+        return keep_previous, False
+
+    def finish(self):
+        """End of stream, returns whether the final sample still needs keeping"""
+        keep = self.last is not None and not self.last_kept
+        self.reset()
+        return keep
+
+
+class RecordCompressor:
+    """Row-level compression of TelemetryLogger records.
+
+    A record is kept when any compressed channel keeps it. A change of Mode
+    or OperationType, or a record flagged by is_fault, is kept along with
+    its neighbours. Decisions lag one record behind, as the swinging door
+    only knows a point was needed once the next sample arrives.
+    """
+
+    def __init__(self, deviations, deadbands=None, limits=None, max_interval=60.0, is_fault=None):
+        deadbands = deadbands or {}
+        limits = limits or {}
+        self.compressors = {
+            CHANNELS[name]: ChannelCompressor(dev, deadbands.get(name, 0.0), limits.get(name), max_interval)
+            for name, dev in deviations.items()
+        }
+        self.is_fault = is_fault
+        self.pending = None
+        self.pending_kept = False
+
+    def push(self, record):
+        """Feed one record, returns the records to store (zero, one or two)"""
+        event = self.pending is not None and tuple(record[2:4]) != tuple(self.pending[2:4])
+        if self.is_fault is not None and self.is_fault(record):
+            event = True
+        keep_previous = keep_current = False
+        for index, compressor in self.compressors.items():
+            previous, current = compressor.push(record[0], record[index], force=event)
+            keep_previous |= previous
+            keep_current |= current
+
+        kept = []
+        if keep_previous and self.pending is not None and not self.pending_kept:
+            kept.append(self.pending)
+        if keep_current:
+            kept.append(record)
+        self.pending = record
+        self.pending_kept = keep_current
+        return kept
+
+    def finish(self):
+        """Flush the held-back record at the end of a run"""
+        kept = [self.pending] if self.pending is not None and not self.pending_kept else []
+        for compressor in self.compressors.values():
+            compressor.finish()
+        self.pending = None
+        self.pending_kept = False
+        return kept
+
+
+class CompressingWriter:
+    """TelemetryLogger writer that compresses records before the real writer"""
+
+    def __init__(self, writer, compressor):
+        self.writer = writer
+        self.compressor = compressor
+        self.received = 0
+        self.stored = 0
+
+    def _store(self, records):
+        if records:
+            self.stored += len(records)
+            self.writer.write_batch(records)
+
+    def write_batch(self, records):
+        self.received += len(records)
+        kept = []
+        for record in records:
+            kept.extend(self.compressor.push(record))
+        self._store(kept)
+
+    def flush(self):
+        self.writer.flush()
+
+    def sync(self):
+        self.writer.sync()
+
+    def rotate(self, info=None):
+        self._store(self.compressor.finish())
+        self.writer.rotate(info)
+
+    def close(self):
+        self._store(self.compressor.finish())
+        self.writer.close()
@@ -0,0 +1,243 @@
+import argparse
+import csv
+import heapq
+import itertools
+import time
+from threading import Condition, Thread
+
+from step_runner import SPIN_NS, wait_until
+
+# A setVOLT command is ~10 characters at 9600 baud, 10 bits each, so the
+# amplifier sees it ~10 ms after the write starts. Pump calls only flip
+# flags on the step engine and take effect within a step.
+LEADS = {'amplifier': 0.011, 'pump': 0.0}
+
+
+class Scheduled:
+    """One event on the timeline, cancel() before it is due to drop it"""
+
+    def __init__(self, due_ns, device, label, action, args, period_ns=None):
+        self.due_ns = due_ns
+        self.device = device
+        self.label = label
+        self.action = action
+        self.args = args
+        self.period_ns = period_ns
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Coordinator(Thread):
+    """Runs amplifier and pump actions against one perf_counter_ns clock.
+
+    Times are seconds from `epoch`. Each device has a lead, the time its
+    command takes to reach the hardware, and its actions are started that
+    much early so events on different devices land together. Actions run
+    one after another on this thread, so they must be short: a serial write
+    or a pump rate change, not a wait. Every action is logged with its due,
+    start and finish times in `log`.
+    """
+
+    def __init__(self, leads=None, spin_ns=SPIN_NS):
+        super().__init__(daemon=True)
+        self.leads = dict(LEADS if leads is None else leads)
+        self.spin_ns = spin_ns
+        self.epoch_ns = time.perf_counter_ns()
+        self.log = []
+        self.alive = True
+        self._heap = []
+        self._seq = itertools.count()
+        self._changed = Condition()
+
+    def now(self):
+        return (time.perf_counter_ns() - self.epoch_ns) / 1e9
+
+    def restart_clock(self):
+        """Make now() zero, for programs written from t=0"""
+        self.epoch_ns = time.perf_counter_ns()
+
+    def at(self, t, device, label, action, *args):
+        """Run action(*args) so that it takes effect at t"""
+        return self._push(Scheduled(self.epoch_ns + int(t * 1e9), device, label, action, args))
+
+    def after(self, delay, device, label, action, *args):
+        return self.at(self.now() + delay, device, label, action, *args)
+
+    def every(self, period, start, device, label, action, *args):
+        """Run action(*args) at start, start + period, ... until cancelled"""
+        event = Scheduled(self.epoch_ns + int(start * 1e9), device, label, action, args, int(period * 1e9))
+        return self._push(event)
+
+    def watch(self, t, device, label, wait, *args):
+        """Log when wait(*args) returns, as an event due at t.
+
+        For things the devices report rather than do on command, like a
+        pump coming to rest. The wait runs on its own thread so the
+        timeline isn't held up; a wait returning False is logged as a timeout.
+        """
+        due_ns = self.epoch_ns + int(t * 1e9)
+
+        def run():
+            try:
+                error = '' if wait(*args) is not False else 'timed out'
+            except Exception as e:
+                error = repr(e)
+            self.log.append((device, label, due_ns - self.epoch_ns, time.perf_counter_ns() - due_ns, 0, error))
+        Thread(target=run, daemon=True).start()
+
+    def clear(self):
+        """Drop everything not yet started"""
+        with self._changed:
+            for *_, event in self._heap:
+                event.cancel()
+            self._heap.clear()
+            self._changed.notify()
+
+    def shutdown(self):
+        self.alive = False
+        self.clear()
+
+    def _push(self, event):
+        fire_ns = event.due_ns - int(self.leads.get(event.device, 0.0) * 1e9)
+        with self._changed:
+            heapq.heappush(self._heap, (fire_ns, next(self._seq), event))
+            self._changed.notify()
+        return event
+
+    def _next(self):
+        """Wait for the next event's start time, None at shutdown"""
+        with self._changed:
+            while self.alive:
+                if not self._heap:
+                    self._changed.wait()
+                    continue
+                fire_ns, _, event = self._heap[0]
+                remaining = fire_ns - time.perf_counter_ns()
+                if remaining > self.spin_ns:
+                    # woken early if something sooner is added
+                    self._changed.wait((remaining - self.spin_ns) / 1e9)
+                    continue
+                heapq.heappop(self._heap)
+                if not event.cancelled:
+                    return fire_ns, event
+        return None
+
+    def run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                break
+            fire_ns, event = item
+            wait_until(fire_ns, 0)
+            started = time.perf_counter_ns()
+            try:
+                event.action(*event.args)
+                error = ''
+            except Exception as e:
+                error = repr(e)
+                print(f"{event.label} failed: {error}")
+            finished = time.perf_counter_ns()
+            self.log.append((event.device, event.label, event.due_ns - self.epoch_ns,
+                             started - fire_ns, finished - started, error))
+            if event.period_ns and not event.cancelled:
+                event.due_ns += event.period_ns
+                self._push(event)
+
+    def lateness(self, device=None):
+        """Worst start lateness in ms, for one device or all"""
+        late = [row[3] for row in self.log if device is None or row[0] == device]
+        return max(late) / 1e6 if late else 0.0
+
+    def write_log(self, path):
+        """The actual event times as CSV, ms from the epoch"""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['device', 'event', 'due_ms', 'started_ms', 'late_ms', 'took_ms', 'error'])
+            for device, label, due, late, took, error in self.log:
+                lead = int(self.leads.get(device, 0.0) * 1e9)
+                started = due - lead + late
+                writer.writerow([device, label, f'{due / 1e6:.3f}', f'{started / 1e6:.3f}',
+                                 f'{late / 1e6:.3f}', f'{took / 1e6:.3f}', error])
+
+
+def pulsed_sonication(coordinator, start, on, off, cycles, amp_on, amp_off,
+                      pump=None, guard=0.05, dose_ml=None):
+    """Schedule on/off bursts, holding perfusion still during each one.
+
+    amp_on and amp_off are the amplifier commands (e.g. lambda:
+    write_voltage(volt) and lambda: write_voltage(0)). With a dosing.Pump
+    the pump is paused early enough to finish its ramp down `guard` seconds
+    before every burst (at the flow set now), and the moment it reports
+    rest is logged as 'pump at rest'. `guard` seconds after the burst the
+    flow is restarted or, with dose_ml, a dose is started instead. Returns
+    the scheduled events so they can be cancelled.
+    """
+    events = []
+    stopping = pump.stop_time() if pump is not None else 0.0
+
+    def pause(cycle, rest_by):
+        pump.pause()
+        coordinator.watch(rest_by, 'pump', f'pump at rest {cycle}', pump.wait_stopped, max(on + off, 1.0))
+
+    t = start
+    for cycle in range(1, cycles + 1):
+        if pump is not None:
+            events.append(coordinator.at(t - guard - stopping, 'pump', f'pause pump {cycle}',
+                                         pause, cycle, t - guard))
+        events.append(coordinator.at(t, 'amplifier', f'burst {cycle} on', amp_on))
+        events.append(coordinator.at(t + on, 'amplifier', f'burst {cycle} off', amp_off))
+        if pump is not None:
+            if dose_ml is None:
+                events.append(coordinator.at(t + on + guard, 'pump', f'resume flow {cycle}', pump.start_flow))
+            else:
+                # pump.dose refuses (logged as an error) if the pump hasn't come to rest
+                events.append(coordinator.at(t + on + guard, 'pump', f'dose {cycle}', pump.dose, dose_ml))
+        t += on + off
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dry-run pulsed sonication with perfusion pauses and log the timing")
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--on', type=float, default=1.0, help="burst length, s")
+    parser.add_argument('--off', type=float, default=1.0, help="gap between bursts, s")
+    parser.add_argument('--guard', type=float, default=0.05, help="pump stopped this long either side, s")
+    parser.add_argument('--log', default='events.csv')
+    args = parser.parse_args()
+
+    from pulse_analysis import BenchStepper
+    from dosing import Pump
+    from gpio_backend import GPIO
+    from step_runner import StepRunner
+
+    stepper = BenchStepper(GPIO, rpm=60)
+    runner = StepRunner(stepper)
+    runner.start()
+    pump = Pump(stepper, runner=runner)
+
+    def amplifier(volt):
+        # stands in for write_voltage(), the same 9600 baud write time
+        time.sleep(len(f'setVOLT{volt}\r') * 10 / 9600)
+
+    coordinator = Coordinator()
+    coordinator.start()
+    pump.start_flow()
+    # Room for the first pause to ramp the pump down
+    start = 0.5 + args.guard + pump.stop_time()
+    pulsed_sonication(coordinator, start, args.on, args.off, args.cycles,
+                      lambda: amplifier(10), lambda: amplifier(0), pump, args.guard)
+    time.sleep(start + args.cycles * (args.on + args.off))
+    pump.stop_flow()
+    coordinator.shutdown()
+    runner.shutdown()
+
+    coordinator.write_log(args.log)
+    print(f"{len(coordinator.log)} events, worst lateness {coordinator.lateness('amplifier'):.2f} ms amplifier, "
+          f"{coordinator.lateness('pump'):.2f} ms pump")
+    print(f"Wrote {args.log}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import time
+from threading import Event, Lock, Thread
+
+from motion_profile import plan_move, ramp_time
+from motion_scheduler import shared_scheduler
+from paths import CALIBRATION_DIR
+
+POLL = 0.05  # s between progress updates of a running dose
+DEFAULT_UL_PER_REV = 100.0  # rough figure for uncalibrated tubing, calibrate before dosing
+
+
+def tubing_path(tubing, directory=CALIBRATION_DIR):
+    return os.path.join(directory, f'tubing_{tubing}.json')
+
+
+def load_tubing(tubing, steps_per_rev, directory=CALIBRATION_DIR):
+    """µL per step for a tubing, rescaled if the microstep setting changed since calibration"""
+    try:
+        with open(tubing_path(tubing, directory)) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        print(f"No calibration for tubing {tubing!r}, using {DEFAULT_UL_PER_REV} µL/rev")
+        return DEFAULT_UL_PER_REV / steps_per_rev
+    return data['ul_per_step'] * data['steps_per_rev'] / steps_per_rev
+
+
+def save_tubing(tubing, steps, measured_ml, steps_per_rev, directory=CALIBRATION_DIR):
+    """Calibrate from a test run: `steps` pumped, `measured_ml` weighed or read off"""
+    if steps <= 0 or measured_ml <= 0:
+        raise ValueError("Steps and measured volume must be greater than 0")
+    os.makedirs(directory, exist_ok=True)
+    ul_per_step = measured_ml * 1000 / steps
+    with open(tubing_path(tubing, directory), 'w') as f:
+        json.dump({'ul_per_step': ul_per_step, 'steps_per_rev': steps_per_rev,
+                   'calibrated': time.strftime('%Y-%m-%d %H:%M:%S')}, f, indent=2)
+    return ul_per_step
+
+
+class DoseHandle:
+    """Progress of one dose, filled in by the dosing thread"""
+
+    def __init__(self, steps, ul_per_step, on_complete=None):
+        self.target_steps = steps
+        self.steps_done = 0
+        self.ul_per_step = ul_per_step
+        self.on_complete = on_complete
+        self.cancelled = False
+        self.stop_move = None  # set by the dosing thread once the move has started
+        self.error = None
+        self.finished = Event()
+
+    @property
+    def progress(self):
+        return self.steps_done / self.target_steps if self.target_steps else 1.0
+
+    @property
+    def delivered_ml(self):
+        return self.steps_done * self.ul_per_step / 1000
+
+    def done(self):
+        return self.finished.is_set()
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def cancel(self):
+        """Stop before the next pulse (the firmware ramps down), steps already made stay counted"""
+        self.cancelled = True
+        if self.stop_move is not None:
+            self.stop_move()
+
+
+class Pump:
+    """Volumetric layer over TB6600_Stepper.
+
+    Flow is in mL/min and volumes in mL, converted through the tubing's
+    µL-per-step calibration. Every step made by a dose or by the continuous
+    StepRunner goes into a signed odometer (forward dispenses), so the volume
+    delivered in a run is always known without counting anything afterwards.
+    """
+
+    def __init__(self, stepper, ul_per_step=None, tubing='default', runner=None):
+        self.stepper = stepper
+        self.tubing = tubing
+        self.ul_per_step = ul_per_step or load_tubing(tubing, stepper.steps_per_rev)
+        self.runner = runner
+        self.dose_steps = 0
+        self.runner_base = 0
+        self.active = None
+        self.jogging = False
+        self.lock = Lock()
+
+    def steps_for(self, ml):
+        return int(round(ml * 1000 / self.ul_per_step))
+
+    def ml_for(self, steps):
+        return steps * self.ul_per_step / 1000
+
+    def set_flow(self, ml_per_min):
+        """Flow rate for continuous running and doses"""
+        if ml_per_min <= 0:
+            raise ValueError("Flow must be greater than 0")
+        steps_per_s = ml_per_min * 1000 / self.ul_per_step / 60
+        self.stepper.set_rpm(steps_per_s * 60 / self.stepper.steps_per_rev)
+
+    def get_flow(self):
+        return self.stepper.step_rate() * self.ul_per_step * 60 / 1000
+
+    def start_flow(self, forward=True):
+        """Run continuously at the set flow, through the StepRunner when there is one"""
+        if self.runner is not None:
+            self.runner.run_motor(forward)
+        else:
+            self.stepper.start_continuous(forward)
+
+    def stop_flow(self):
+        """Ramp down and stop a continuous run"""
+        if self.runner is not None:
+            self.runner.stop_motor()
+        else:
+            self.stepper.stop_continuous()
+
+    def pause(self):
+        """Stop a continuous run (ramped) and cancel a dose in progress"""
+        self.stop_flow()
+        if self.active is not None:
+            self.active.cancel()
+
+    def stop_time(self):
+        """Seconds a stop takes to ramp down from the set flow"""
+        stepper = self.stepper
+        return ramp_time(stepper.step_rate(), stepper.accel, stepper.profile)
+
+    def wait_stopped(self, timeout=None):
+        """Block until no step is being made, False on timeout"""
+        if self.active is not None and not self.active.wait(timeout):
+            return False
+        if self.runner is not None:
+            return self.runner.idle.wait(timeout)
+        if hasattr(self.stepper, 'wait'):
+            return self.stepper.wait(timeout)
+        return True
+
+    @property
+    def odometer(self):
+        """Signed steps since the last reset_odometer()"""
+        runner_steps = self.runner.total_steps if self.runner is not None else 0
+        return self.dose_steps + runner_steps - self.runner_base
+
+    @property
+    def delivered_ml(self):
+        return self.ml_for(self.odometer)
+
+    def reset_odometer(self, steps=0):
+        """Start counting a new run, or continue one that had made `steps`"""
+        self.dose_steps = steps
+        self.runner_base = self.runner.total_steps if self.runner is not None else 0
+
+    def jog(self, steps):
+        """Blocking move through stepper.step(), counted on the odometer"""
+        with self.lock:
+            if self.busy():
+                raise RuntimeError("Pump is busy")
+            self.jogging = True
+        try:
+            self.stepper.step(steps)
+            self.dose_steps += steps
+        finally:
+            self.jogging = False
+
+    def busy(self):
+        return self.jogging or (self.active is not None and not self.active.done()) or \
+            (self.runner is not None and self.runner.moving)
+
+    def dose(self, ml, on_complete=None):
+        """Pump `ml` (negative to withdraw) on a background thread, returns a DoseHandle"""
+        with self.lock:
+            if self.busy():
+                raise RuntimeError("Pump is busy")
+            handle = DoseHandle(abs(self.steps_for(ml)), self.ul_per_step, on_complete)
+            self.active = handle
+        Thread(target=self._dose, args=(handle, ml > 0), daemon=True).start()
+        return handle
+
+    def _dose(self, handle, forward):
+        sign = 1 if forward else -1
+        try:
+            if getattr(self.stepper, 'PUL', None) is None:
+                # The firmware makes the pulses and ramps itself
+                progress = self._firmware_move(handle, forward)
+            else:
+                progress = self._scheduled_move(handle, forward)
+            for steps in progress:
+                self.dose_steps += sign * (steps - handle.steps_done)
+                handle.steps_done = steps
+        except Exception as e:
+            handle.error = e
+            print(f"Dose error: {e}")
+        finally:
+            handle.finished.set()
+            if handle.on_complete is not None:
+                handle.on_complete(handle)
+
+    def _scheduled_move(self, handle, forward):
+        """Pulse the move on the motion scheduler, yields the steps made so far"""
+        stepper = self.stepper
+        intervals = plan_move(handle.target_steps, stepper.step_rate(), stepper.accel,
+                              profile=stepper.profile).tolist()
+        scheduler = getattr(stepper, 'scheduler', None) or shared_scheduler()
+        motion = scheduler.move(stepper, intervals, forward)
+        handle.stop_move = motion.cancel
+        if handle.cancelled:
+            motion.cancel()
+        while not motion.wait(POLL):
+            yield motion.steps_done
+        yield motion.steps_done
+
+    def _firmware_move(self, handle, forward):
+        """MOVE on the pump firmware, yields the steps made so far from its status"""
+        stepper = self.stepper
+        start = stepper.status()['position']
+        if handle.target_steps:
+            stepper.step(handle.target_steps if forward else -handle.target_steps)
+        stopping = False
+        while True:
+            status = stepper.status()
+            yield abs(status['position'] - start)
+            if status['state'] == 'IDLE':
+                break
+            if handle.cancelled and not stopping:
+                stepper.stop_continuous()
+                stopping = True
+            time.sleep(POLL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate pump tubing in µL per step")
+    parser.add_argument('--tubing', default='default')
+    parser.add_argument('--steps', type=int, required=True, help="steps pumped in the test run")
+    parser.add_argument('--measured-ml', type=float, required=True, help="volume collected")
+    parser.add_argument('--steps-per-rev', type=int, default=400, help="driver setting during the test run")
+    parser.add_argument('--dir', default=CALIBRATION_DIR)
+    args = parser.parse_args()
+
+    ul_per_step = save_tubing(args.tubing, args.steps, args.measured_ml, args.steps_per_rev, args.dir)
+    print(f"{args.tubing}: {ul_per_step:.4f} µL/step, {ul_per_step * args.steps_per_rev:.1f} µL/rev")
+    print(f"Saved to {tubing_path(args.tubing, args.dir)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import csv
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+from rollup import raw_stats, reduce_buckets
+from telemetry_logger import TIME_FORMAT
+from telemetry_store import TelemetryStore, format_column
+
+
+def iter_blocks(store, t0=None, t1=None, columns=None, block_rows=65536, progress=None):
+    """Yield a run's rows as dicts of memmap views, block_rows at a time"""
+    rows = store.range_slice(t0, t1)
+    names = ['timestamp'] + list(columns or store.meta['columns'])
+    total = rows.stop - rows.start
+    for start in range(rows.start, rows.stop, block_rows):
+        part = slice(start, min(start + block_rows, rows.stop))
+        yield {name: store.maps[name][part] for name in names}
+        if progress is not None:
+            progress(part.stop - rows.start, total)
+
+
+def resample(blocks, interval, categories):
+    """Mean per interval-wide bucket, partial buckets carried across blocks.
+
+    Category columns take the value of the bucket's first row. Only the
+    sums and counts of the last, possibly incomplete, bucket are carried
+    to the next block, so memory stays at one block whatever the run length.
+    """
+    carry = None
+    for block in blocks:
+        if len(block['timestamp']) == 0:
+            continue
+        sums = _bucket_sums(block, interval, categories)
+        if carry is not None:
+            sums = _merge_carry(carry, sums, categories)
+        # Hold back the last bucket, the next block may add to it
+        carry = {name: values[-1:] for name, values in sums.items()}
+        if len(sums['timestamp']) > 1:
+            yield _bucket_means({name: values[:-1] for name, values in sums.items()}, categories)
+    if carry is not None:
+        yield _bucket_means(carry, categories)
+
+
+def _bucket_sums(block, interval, categories):
+    """Per-bucket sums and counts of the numeric columns, first value of the categories"""
+    numeric = [name for name in block if name != 'timestamp' and name not in categories]
+    times, reduced = reduce_buckets(block['timestamp'], {name: raw_stats(block[name]) for name in numeric}, interval)
+    starts = np.searchsorted(np.floor(block['timestamp'] / interval) * interval, times)
+    out = {'timestamp': times}
+    for name in block:
+        if name in categories:
+            out[name] = block[name][starts]
+        elif name != 'timestamp':
+            _, _, out[f'{name}_sum'], out[f'{name}_count'] = reduced[name]
+    return out
+
+
+def _merge_carry(carry, sums, categories):
+    """Prepend the carried bucket, adding it into the first one if it is the same bucket"""
+    if carry['timestamp'][0] != sums['timestamp'][0]:
+        return {name: np.r_[carry[name], values] for name, values in sums.items()}
+    merged = {name: values.copy() for name, values in sums.items()}
+    for name in merged:
+        if name in categories:
+            merged[name][0] = carry[name][0]
+        elif name != 'timestamp':
+            merged[name][0] += carry[name][0]
+    return merged
+
+
+def _bucket_means(sums, categories):
+    out = {'timestamp': sums['timestamp']}
+    for name in sums:
+        if name in categories:
+            out[name] = sums[name]
+        elif name.endswith('_sum'):
+            total, counts = sums[name], sums[f'{name[:-4]}_count']
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[name[:-4]] = np.where(counts > 0, total / np.maximum(counts, 1), np.nan)
+    return out
+
+
+def format_timestamps(timestamps):
+    """Local-time strings in the logger's format, vectorised per block"""
+    if len(timestamps) == 0:
+        return np.empty(0, dtype='U19')
+    first = time.localtime(float(timestamps[0])).tm_gmtoff
+    last = time.localtime(float(timestamps[-1])).tm_gmtoff
+    if first != last:
+        # Block spans a DST change, fall back to per-row conversion
+        return np.array([time.strftime(TIME_FORMAT, time.localtime(t)) for t in timestamps])
+    local = (np.asarray(timestamps, dtype=np.float64) + first).astype('datetime64[s]')
+    return np.char.replace(np.datetime_as_string(local), 'T', ' ')
+
+
+def write_csv(blocks, path, store):
+    with open(path, 'w', newline='', buffering=1024 * 1024) as f:
+        writer = csv.writer(f)
+        header = None
+        for block in blocks:
+            if header is None:
+                header = list(block)
+                writer.writerow(header)
+            cols = [format_timestamps(block['timestamp'])]
+            for name in header[1:]:
+                values = block[name]
+                cols.append(store.decode(name, values) if name in store.categories else format_column(values))
+            writer.writerows(zip(*cols))
+
+
+def write_jsonl(blocks, path, store):
+    with open(path, 'w', buffering=1024 * 1024) as f:
+        for block in blocks:
+            names = list(block)
+            cols = [format_timestamps(block['timestamp']).tolist()]
+            for name in names[1:]:
+                values = block[name]
+                if name in store.categories:
+                    cols.append(store.decode(name, values).tolist())
+                else:
+                    cols.append([None if math.isnan(v) else v for v in values.tolist()])
+            for row in zip(*cols):
+                f.write(json.dumps(dict(zip(names, row))))
+                f.write('\n')
+
+
+def write_npz(blocks, path, store):
+    """Stream each column to a scratch file, then wrap them as .npy members.
+
+    The zip is written member by member from disk, so memory use does not
+    grow with the length of the run.
+    """
+    scratch = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        files = {}
+        dtypes = {}
+        count = 0
+        for block in blocks:
+            for name, values in block.items():
+                if name not in files:
+                    files[name] = open(os.path.join(scratch, name), 'wb')
+                    dtypes[name] = values.dtype
+                np.ascontiguousarray(values, dtype=dtypes[name]).tofile(files[name])
+            count += len(block['timestamp'])
+        for f in files.values():
+            f.close()
+
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            for name, dtype in dtypes.items():
+                with archive.open(f'{name}.npy', 'w', force_zip64=True) as member:
+                    header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (count,)}
+                    np.lib.format.write_array_header_2_0(member, header)
+                    with open(os.path.join(scratch, name), 'rb') as raw:
+                        shutil.copyfileobj(raw, member, 1024 * 1024)
+            for name in dtypes:
+                if name in store.categories:
+                    # Category codes need their labels to mean anything
+                    with archive.open(f'{name}_labels.npy', 'w') as member:
+                        np.lib.format.write_array(member, np.array(store.categories[name]))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'npz': write_npz}
+
+
+def export_run(store, path, fmt='csv', t0=None, t1=None, columns=None, interval=None, progress=None):
+    """Stream a run (or part of it) to CSV, JSON Lines or .npz"""
+    blocks = iter_blocks(store, t0, t1, columns, progress=progress)
+    if interval:
+        blocks = resample(blocks, interval, store.categories)
+    WRITERS[fmt](blocks, path, store)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an archived run without loading it into memory")
+    parser.add_argument('run', type=int, help="run id")
+    parser.add_argument('out', help="output file, format from --format or the extension")
+    parser.add_argument('--root', default='telemetry')
+    parser.add_argument('--format', choices=sorted(WRITERS))
+    parser.add_argument('--start', help="'YYYY-mm-dd HH:MM:SS'")
+    parser.add_argument('--end', help="'YYYY-mm-dd HH:MM:SS'")
+    parser.add_argument('--columns', nargs='+', help="columns to export, default all")
+    parser.add_argument('--resample', type=float, metavar='SECONDS', help="average into buckets")
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.out)[1].lstrip('.')
+    if fmt not in WRITERS:
+        parser.error(f"Unknown format {fmt!r}, use --format")
+    store = TelemetryStore(args.root).open_run(args.run)
+    unknown = set(args.columns or []) - set(store.meta['columns'])
+    if unknown:
+        parser.error(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+    started = time.perf_counter()
+
+    def progress(done, total):
+        sys.stderr.write(f"\r{done}/{total} rows ({100 * done / max(total, 1):.0f}%)")
+        sys.stderr.flush()
+
+    export_run(store, args.out, fmt, args.start, args.end, args.columns, args.resample, progress)
+    sys.stderr.write(f"\nWrote {args.out} in {time.perf_counter() - started:.1f} s\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import time
+
+import numpy as np
+
+# The parts of the RPi.GPIO API the pump scripts use
+BOARD = 10
+BCM = 11
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+
+CAPACITY = 1 << 20
+
+
+class Timeline:
+    """Every output() call as (perf_counter_ns, pin, level), preallocated.
+
+    Recording is three stores into arrays allocated up front, so the fake
+    adds as little as possible to the loop being measured. Once full,
+    further edges are counted in `dropped` instead of growing anything.
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.pins = np.zeros(capacity, dtype=np.int16)
+        self.levels = np.zeros(capacity, dtype=np.int8)
+        self.count = 0
+        self.dropped = 0
+
+    def record(self, t, pin, level):
+        i = self.count
+        if i == len(self.times):
+            self.dropped += 1
+            return
+        self.times[i] = t
+        self.pins[i] = pin
+        self.levels[i] = level
+        self.count = i + 1
+
+    def clear(self):
+        self.count = 0
+        self.dropped = 0
+
+    def view(self):
+        """(times, pins, levels) of the recorded part, no copies"""
+        n = self.count
+        return self.times[:n], self.pins[:n], self.levels[:n]
+
+
+timeline = Timeline()
+_mode = None
+_pins = {}
+
+
+def reset(capacity=CAPACITY):
+    """Fresh timeline and pin state"""
+    global timeline, _mode
+    timeline = Timeline(capacity)
+    _mode = None
+    _pins.clear()
+
+
+def setmode(mode):
+    global _mode
+    _mode = mode
+
+
+def getmode():
+    return _mode
+
+
+def setwarnings(flag):
+    pass
+
+
+def setup(channel, direction, pull_up_down=PUD_OFF, initial=None):
+    for pin in channel if isinstance(channel, (list, tuple)) else (channel,):
+        _pins[pin] = initial if initial is not None else LOW
+
+
+def output(channel, value):
+    t = time.perf_counter_ns()
+    if isinstance(channel, (list, tuple)):
+        values = value if isinstance(value, (list, tuple)) else [value] * len(channel)
+        for pin, level in zip(channel, values):
+            _pins[pin] = level
+            timeline.record(t, pin, level)
+    else:
+        _pins[channel] = value
+        timeline.record(t, channel, value)
+
+
+def input(channel):
+    return _pins.get(channel, LOW)
+
+
+def cleanup(channel=None):
+    if channel is None:
+        _pins.clear()
+    else:
+        _pins.pop(channel, None)
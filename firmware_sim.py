@@ -0,0 +1,173 @@
+import time
+
+IDLE, MOVING, RUNNING, STOPPING = range(4)
+MIN_RATE = 50.0
+
+
+class PumpFirmwareSim:
+    """pump_control.ino's serial protocol, simulated on the host.
+
+    Looks like a pyserial port (write, read_until, read, in_waiting,
+    reset_input_buffer, close) so SerialStepper can drive it directly.
+    Steps are replayed one by one with the firmware's own ramp and edge
+    timing whenever the port is touched, against `clock` (perf_counter by
+    default, pass a function returning a virtual time to run faster than
+    real time).
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or time.perf_counter
+        self.output = bytearray()
+        self.line = bytearray()
+        self.target_rate = 625.0
+        self.accel = 2000.0
+        self.rate = 0.0
+        self.position = 0
+        self.remaining = 0
+        self.state = IDLE
+        self.forward = True
+        self.enabled = False
+        self.pulse_high = False
+        self.last_edge = self.clock()
+        self.commands = []  # (time, command) as received
+
+    # pyserial surface
+
+    def write(self, data):
+        self._advance()
+        for byte in bytes(data):
+            if byte in b'\r\n':
+                if self.line:
+                    self._handle(self.line.decode())
+                    self.line.clear()
+            elif len(self.line) < 31:
+                self.line.append(byte)
+        return len(data)
+
+    def read_until(self, expected=b'\n', size=None):
+        self._advance()
+        end = self.output.find(expected)
+        if end < 0:
+            data, self.output = bytes(self.output), bytearray()
+            return data
+        data = bytes(self.output[:end + len(expected)])
+        del self.output[:end + len(expected)]
+        return data
+
+    def read(self, size=1):
+        self._advance()
+        data = bytes(self.output[:size])
+        del self.output[:size]
+        return data
+
+    @property
+    def in_waiting(self):
+        return len(self.output)
+
+    def reset_input_buffer(self):
+        self.output.clear()
+
+    flushInput = reset_input_buffer
+
+    def close(self):
+        pass
+
+    # firmware
+
+    def _reply(self, text):
+        self.output += text.encode() + b'\r'
+
+    def _start(self, state):
+        if self.state == IDLE:
+            self.rate = min(MIN_RATE, self.target_rate) if self.accel > 0 else self.target_rate
+            self.last_edge = self.clock()
+            self.pulse_high = False
+        self.state = state
+
+    def _stop_now(self):
+        self.pulse_high = False
+        self.state = IDLE
+        self.remaining = 0
+        self.rate = 0.0
+
+    def _update_rate(self):
+        if self.state == MOVING and self.remaining == 0:
+            self._stop_now()
+            return
+        if self.accel <= 0:
+            if self.state == STOPPING:
+                self._stop_now()
+            else:
+                self.rate = self.target_rate
+            return
+        slowing = self.state == STOPPING or \
+            (self.state == MOVING and self.remaining <= self.rate ** 2 / (2 * self.accel))
+        if slowing:
+            self.rate -= self.accel / self.rate
+            if self.rate <= MIN_RATE:
+                if self.state == STOPPING:
+                    self._stop_now()
+                    return
+                self.rate = MIN_RATE
+        elif self.rate < self.target_rate:
+            self.rate = min(self.target_rate, self.rate + self.accel / self.rate)
+        else:
+            self.rate = max(self.target_rate, self.rate - self.accel / self.rate)
+
+    def _advance(self):
+        """Replay every edge the firmware would have made up to now"""
+        now = self.clock()
+        while self.state != IDLE:
+            half = int(500000.0 / self.rate) / 1e6  # firmware rounds to whole µs
+            if now - self.last_edge < half:
+                return
+            self.last_edge += half
+            if not self.pulse_high:
+                self.pulse_high = True
+                self.position += 1 if self.forward else -1
+                if self.state == MOVING:
+                    self.remaining -= 1
+            else:
+                self.pulse_high = False
+                self._update_rate()
+
+    def _handle(self, cmd):
+        self.commands.append((self.clock(), cmd))
+        try:
+            if cmd.startswith('setRATE'):
+                value = float(cmd[7:])
+                if value <= 0:
+                    return self._reply('ERR setRATE')
+                self.target_rate = value
+            elif cmd.startswith('setACCEL'):
+                self.accel = max(0.0, float(cmd[8:]))
+            elif cmd.startswith('setDIR'):
+                if self.state != IDLE:
+                    return self._reply('ERR busy')
+                self.forward = int(cmd[6:]) != 0
+            elif cmd.startswith('setENA'):
+                self.enabled = int(cmd[6:]) != 0
+                if not self.enabled:
+                    self._stop_now()
+            elif cmd.startswith('MOVE'):
+                steps = int(cmd[4:])
+                if steps <= 0:
+                    return self._reply('ERR MOVE')
+                self.remaining = steps
+                self._start(MOVING)
+            elif cmd == 'RUN':
+                self._start(RUNNING)
+            elif cmd == 'STOP':
+                if self.state != IDLE:
+                    self.state = STOPPING
+            elif cmd == 'HALT':
+                self._stop_now()
+            elif cmd == 'getSTATUS':
+                return self._reply(f'STATUS {self.position} {self.remaining} {int(self.rate)} '
+                                   f'{int(self.forward)} {int(self.enabled)} {self.state}')
+            else:
+                return self._reply(f'ERR {cmd}')
+        except ValueError:
+            # The board's atof/atoi would read garbage as 0, reject it so driver bugs show
+            return self._reply(f'ERR {cmd}')
+        self._reply('OK')
@@ -0,0 +1,94 @@
+import threading
+import time
+
+
+class PulseGovernor:
+    """Holds the sample below a temperature ceiling in PULSED mode.
+
+    Runs once per pulse period: reads the filtered temperature, updates a
+    PI controller on the headroom to the ceiling and turns the output into
+    the on-time of the next pulse. The integrator is frozen while the duty
+    cycle is saturated (anti-windup). When the duty cycle is already at its
+    minimum and the sample is still too hot, the drive voltage is scaled
+    down, and restored again once there is headroom.
+    """
+
+    def __init__(self, read_temperature, ceiling, period=2.0, kp=0.05, ki=0.01,
+                 min_duty=0.05, max_duty=0.5, voltage_step=0.1, min_voltage_scale=0.3, margin=1.0):
+        if not 0 < min_duty <= max_duty <= 1:
+            raise ValueError("Duty limits must satisfy 0 < min_duty <= max_duty <= 1")
+        self.read_temperature = read_temperature
+        self.ceiling = ceiling
+        self.period = period
+        self.kp = kp
+        self.ki = ki
+        self.min_duty = min_duty
+        self.max_duty = max_duty
+        self.voltage_step = voltage_step
+        self.min_voltage_scale = min_voltage_scale
+        self.margin = margin
+
+        self.integral = max_duty  # start at the uncontrolled 1 s on / 1 s off duty
+        self.duty = max_duty
+        self.voltage_scale = 1.0
+        self.temperature = None
+        self._next_cycle = None
+        self._cancel = threading.Event()
+
+    def reset(self):
+        self.integral = self.max_duty
+        self.duty = self.max_duty
+        self.voltage_scale = 1.0
+        self._next_cycle = None
+        self._cancel.clear()
+
+    def cancel(self):
+        """Abort the pulse in progress, the caller turns the output off"""
+        self._cancel.set()
+
+    def update(self, temperature):
+        """One controller step, returns the duty cycle for the next pulse"""
+        self.temperature = temperature
+        error = self.ceiling - temperature
+        integral = self.integral + self.ki * error * self.period
+        raw = self.kp * error + integral
+        duty = min(max(raw, self.min_duty), self.max_duty)
+
+        # Conditional integration: only accept the new integral when the
+        # output is not saturated, or when it pulls the output back in range
+        if raw == duty or (raw > self.max_duty and error < 0) or (raw < self.min_duty and error > 0):
+            self.integral = min(max(integral, 0.0), 1.0)
+        self.duty = duty
+
+        if duty == self.min_duty and temperature > self.ceiling:
+            self.voltage_scale = max(self.min_voltage_scale, self.voltage_scale - self.voltage_step)
+        elif temperature < self.ceiling - self.margin and self.voltage_scale < 1.0:
+            self.voltage_scale = min(1.0, self.voltage_scale + self.voltage_step)
+        return duty
+
+    def _wait_until(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            self._cancel.wait(remaining)
+        return not self._cancel.is_set()
+
+    def cycle(self, volt, write_voltage):
+        """Run one governed pulse period on the setVOLT path.
+
+        Periods are scheduled on absolute deadlines so the loop runs at a
+        fixed rate regardless of how long the serial writes take.
+        """
+        now = time.monotonic()
+        if self._next_cycle is None or now - self._next_cycle > self.period:
+            self._next_cycle = now  # first cycle, or we fell a whole period behind
+        start = self._next_cycle
+        self._next_cycle = start + self.period
+
+        temperature = self.read_temperature()
+        if temperature is not None:
+            self.update(temperature)
+
+        write_voltage(round(volt * self.voltage_scale, 2))
+        self._wait_until(start + self.duty * self.period)
+        write_voltage(0)
+        return self._wait_until(self._next_cycle)
@@ -0,0 +1,29 @@
+import os
+
+MODEL_PATH = '/proc/device-tree/model'
+
+
+def on_raspberry_pi(model_path=MODEL_PATH):
+    try:
+        with open(model_path, 'rb') as f:
+            return b'Raspberry Pi' in f.read()
+    except OSError:
+        return False
+
+
+# RPi.GPIO on the Pi, the recording fake_gpio anywhere else (or with
+# GPIO_BACKEND=fake, to measure the step loops on the Pi itself). On a Pi
+# a broken RPi.GPIO is an error, not a reason to pulse nothing.
+if os.environ.get('GPIO_BACKEND') == 'fake':
+    import fake_gpio as GPIO
+else:
+    try:
+        import RPi.GPIO as GPIO
+    except (ImportError, RuntimeError):
+        # RPi.GPIO raises RuntimeError when imported off a Pi
+        if on_raspberry_pi():
+            raise
+        import fake_gpio as GPIO
+        print("RPi.GPIO not available, recording to fake_gpio")
+
+FAKE = GPIO.__name__ == 'fake_gpio'
@@ -1,6 +1,10 @@
 # Developed by Akshay
 # akshaykumar1@iisc.ac.in
 
+from startup import after_first_frame, in_background, mark, preload
+# numpy (through run_archive) and pyserial load while Kivy sets up the window
+preload('serial', 'run_archive')
+
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
@@ -10,15 +14,21 @@ from kivy.clock import Clock
 from kivy.graphics import Color, Rectangle, Line, Ellipse
 from kivy.core.window import Window
 from kivy.properties import BooleanProperty, StringProperty, ListProperty, NumericProperty
-from kivy.uix.image import Image
+from kivy.uix.image import AsyncImage
 
 import random
 from kivy.core.text import Label as CoreLabel
 
 import serial
 import time
-from struct import *
+import struct
 import threading
+from governor import PulseGovernor
+from ntc import NTCScanner
+from telemetry_logger import TelemetryLogger
+from run_archive import RunArchive
+from paths import TELEMETRY_DIR
+from compression import ChannelCompressor, CompressingWriter, RecordCompressor
 from kivy.config import Config
 Config.set('input', 'mtdev_%(name)s', 'disabled')
 Config.set('input', 'hid_%(name)s', 'disabled')
@@ -26,7 +36,12 @@ Config.set('input', 'mouse', 'mouse,disable_multitouch')
 
 # Set the window to fullscreen (for touchscreen)
 Window.fullscreen = 'auto'
+mark('main imported')
 loop_stop = False
+TEMP_CEILING = 42.0  # °C, PULSED mode duty cycle is trimmed to stay below this
+PROBE_CHANNELS = (1,)  # MCP3208 channel of the sample probe, the first one is governed
+PROBE_PERIOD = 0.5  # s between scans
+POWER_PERIOD = 1.0  # s between load power polls, the telemetry rate
 
 class MeshLinePlot(Widget):
     def __init__(self, **kwargs):
@@ -55,6 +70,11 @@ class TemperatureGraph(Widget):
         self.start_time = None
         self.is_recording = False
 
+        # Only points needed to draw the trace within 0.25 °C are kept,
+        # the newest sample is always shown as the live tip
+        self.compressor = ChannelCompressor(deviation=0.25, limits=(None, TEMP_CEILING))
+        self.tip_kept = True
+
         # Graph properties
         self.x_min = 0.0
         self.x_max = 100.0
@@ -167,6 +187,8 @@ class TemperatureGraph(Widget):
         self.temp_data = []
         self.start_time = time.time()
         self.is_recording = True
+        self.compressor.reset()
+        self.tip_kept = True
         self.x_min = 0.0
         self.x_max = 100.0
         self.update_canvas()
@@ -181,8 +203,14 @@ class TemperatureGraph(Widget):
         """Add a new temperature data point"""
         if self.is_recording and self.start_time is not None:
             current_time = time.time() - self.start_time
+            keep_previous, keep_current = self.compressor.push(current_time, temperature)
+            if self.time_data and not self.tip_kept and not keep_previous:
+                # Previous tip lies on the line between kept points, drop it
+                self.time_data.pop()
+                self.temp_data.pop()
             self.time_data.append(current_time)
             self.temp_data.append(temperature)
+            self.tip_kept = keep_current
 
             # Update graph limits if needed (same strategy as before)
             if current_time > self.x_max - 20:
@@ -258,6 +286,12 @@ class Dashboard(BoxLayout):
 
         self.loop_thread = None
         self.loop_running = False
+        self.current_temp = None
+        self.load_power = None
+        self.scanner = None  # opened with the amplifier, see connect()
+        self.telemetry = None  # opened by connect(), after the first frame
+        self.bus = None  # set by the combined app, see bioreactor.py
+        self.governor = PulseGovernor(read_temperature=self.read_temperature, ceiling=TEMP_CEILING)
         self.orientation = 'vertical'
         self.padding = 24
         self.spacing = 24
@@ -278,14 +312,15 @@ class Dashboard(BoxLayout):
             markup = True,  # enable markup
 
         )
-        mb_logo = Image(
+        # Logos decode on Kivy's loader threads instead of holding up the first frame
+        mb_logo = AsyncImage(
             source='logo/mb_light.jpg',  # ← replace with your actual image path
             size_hint_x=None,
             width=250,
             allow_stretch=True,
             keep_ratio=True
         )
-        all_logo = Image(
+        all_logo = AsyncImage(
             source='logo/all_logo.jpg',  # ← replace with your actual image path
             size_hint_x=None,
             width=200,
@@ -347,6 +382,15 @@ class Dashboard(BoxLayout):
         )
         left_panel.add_widget(self.status_label)
 
+        # Amplifier link, opened in the background once the window is up
+        self.link_label = Label(
+            text='Amplifier: not connected',
+            font_size='20sp',
+            size_hint_y=0.1,
+            color=(0.8, 0.6, 0.2, 1)
+        )
+        left_panel.add_widget(self.link_label)
+
         # Add left panel to content
         content.add_widget(left_panel)
 
@@ -506,8 +550,56 @@ class Dashboard(BoxLayout):
 
         right_panel.add_widget(self.start_stop_toggle)
 
+    def connect(self):
+        """Open the amplifier link off the UI thread, the label shows how it went"""
+        self.link_label.text = f'Amplifier: connecting to {SERIAL_PORT}...'
+        self.link_label.color = (0.8, 0.6, 0.2, 1)
+
+        def work():
+            connect()
+            self.apply_pressure()
+        in_background('amplifier', work, self.on_connected)
+        in_background('probe', open_probe, self.on_probe)
+        if self.telemetry is None:
+            self.telemetry = open_telemetry()
+
+    def on_probe(self, scanner, error):
+        if error is None:
+            self.scanner = scanner
+        else:
+            print(f"Temperature probe unavailable, PULSED mode runs ungoverned: {error}")
+
+    def read_temperature(self):
+        """Filtered sample temperature from the probe, None without one"""
+        if self.scanner is None:
+            return None
+        return self.scanner.temperature()
+
+    def shutdown(self):
+        """Stop the loop and the background threads, flushing what is still queued"""
+        if self.loop_running:
+            self.stop_async_loop()
+        if self.scanner is not None:
+            self.scanner.stop()
+        if self.telemetry is not None:
+            self.telemetry.stop()
+
+    def on_connected(self, result, error):
+        if error is None:
+            self.link_label.text = f'Amplifier: connected on {SERIAL_PORT}'
+            self.link_label.color = (0.3, 1, 0.3, 1)
+        else:
+            print(f"Amplifier connection failed: {error}")
+            self.link_label.text = f'Amplifier: not connected ({error})'
+            self.link_label.color = (1, 0.3, 0.3, 1)
+
     def start_async_loop(self):
         """Start background loop"""
+        if not connected():
+            self.link_label.text = 'Amplifier: not connected, cannot start'
+            self.link_label.color = (1, 0.3, 0.3, 1)
+            Clock.schedule_once(lambda dt: setattr(self.start_stop_toggle.toggle_btn, 'state', 'normal'))
+            return
         print("Starting background loop")
 
         if self.loop_thread and self.loop_thread.is_alive():
@@ -515,24 +607,53 @@ class Dashboard(BoxLayout):
             return  # already running
         loop_stop = False
         self.loop_running = True
+        self.load_power = None
+        self.governor.reset()
         update('ENABLE', '')
 
         def worker():
-            while self.loop_running:
-                print()
-                if self.operation_value.text == 'PULSED':
-                    start_pulsing(volt)
-                else:
-                    set_voltage(volt)
+            next_poll = time.monotonic()
+            try:
+                while self.loop_running:
+                    if self.operation_value.text == 'PULSED':
+                        # Power between bursts would read 0, it stays unknown in PULSED runs
+                        self.governor.cycle(volt, write_voltage)
+                    else:
+                        set_voltage(volt)
+                        if time.monotonic() >= next_poll:
+                            next_poll = time.monotonic() + POWER_PERIOD
+                            self.load_power = self.poll_power()
+            except Exception as e:
+                print(f"Amplifier loop stopped: {e!r}")
+                self.loop_running = False
+                Clock.schedule_once(lambda dt, error=e: self.loop_failed(error))
         self.loop_thread = threading.Thread(target=worker, daemon=True)
         self.loop_thread.start()
 
+    def poll_power(self):
+        """Load power from getSTATE, None if the reply was bad"""
+        try:
+            return get_load_power()
+        except (serial.SerialException, struct.error) as e:
+            print(f"Load power poll failed: {e!r}")
+            return None
+
+    def loop_failed(self, error):
+        self.link_label.text = f'Amplifier: loop stopped ({error})'
+        self.link_label.color = (1, 0.3, 0.3, 1)
+
+    def drive_mode(self):
+        """Mode column: AUTO while the amplifier loop drives the output, OFF otherwise"""
+        return 'AUTO' if self.loop_running else 'OFF'
+
     def stop_async_loop(self):
         """Stop background loop"""
         self.loop_running = False
         loop_stop =True
+        self.governor.cancel()
         self.loop_thread = None
-        stop()
+        if connected():
+            stop()
 
     def on_loop_result(self, result):
         """Handle loop output on UI thread"""
@@ -569,12 +690,16 @@ class Dashboard(BoxLayout):
                 btn.color = (0.8, 0.8, 0.8, 1)  # Light gray text when not selected
 
     def radio_selected(self, instance):
-        calibration_data ={5:10,10:25,30:75,50:100}
         if instance.state == 'down':
             self.selected_mode = instance.text
             self.status_label.text = f'Sound Pressure: {self.selected_mode}'
-            select_v =  int(self.selected_mode[:-3])
-            set_voltage(calibration_data[select_v])
+            if connected():
+                self.apply_pressure()
+
+    def apply_pressure(self):
+        calibration_data ={5:10,10:25,30:75,50:100}
+        select_v =  int(self.selected_mode[:-3])
+        set_voltage(calibration_data[select_v])
 
 
     def op_type_selected(self, instance):
@@ -592,17 +717,26 @@ class Dashboard(BoxLayout):
                 self.is_system_running = True
                 self.running_time = 0
                 self.temp_graph.start_recording()
+                if self.telemetry is not None:
+                    self.telemetry.new_run(pressure_kpa=int(self.selected_mode[:-3]),
+                                           operation=self.selected_op_type)
 
             # Update running time
             self.running_time += 1
             self.running_time_label.text = f'{self.running_time} s'
 
-            # Generate new temperature data (simulated)
-            new_temp = random.randint(40, 65)
+            self.current_temp = self.read_temperature()
+            new_temp = self.current_temp
+            if new_temp is None:
+                # No probe: simulated reading for the graph only, never logged or governed
+                new_temp = random.randint(40, 65)
             # self.temp_value.text = f'{new_temp}°C'
 
             # Update temperature graphcon
             self.temp_graph.add_data_point(new_temp)
+            if self.telemetry is not None:
+                self.telemetry.log(self.current_temp, self.drive_mode(), self.selected_op_type,
+                                   load_power=self.load_power, voltage=volt, frequency=freq)
 
             # Update other simulated values
             self.freq_value.text = f'40 kHz'
@@ -613,8 +747,18 @@ class Dashboard(BoxLayout):
                 # System just stopped
                 self.is_system_running = False
                 self.temp_graph.stop_recording()
-ser = serial.Serial(port='/dev/ttyUSB0', baudrate=9600, timeout=1)
-# ser = serial.Serial(port='COM7', baudrate=9600, timeout=1)
+                if self.telemetry is not None:
+                    self.telemetry.end_run()
+
+        if self.bus is not None:
+            self.bus.publish('ultrasound', running=self.is_system_running, temperature=self.current_temp,
+                             load_power=self.load_power, voltage=volt, operation=self.selected_op_type)
+SERIAL_PORT = '/dev/ttyUSB0'
+# SERIAL_PORT = 'COM7'
+ser = None  # opened by connect(), after the window is up
+# The drive loop, the UI (apply_pressure) and coordinated programs all talk
+# to the amplifier, one command and its reply at a time
+ser_lock = threading.Lock()
 is_pulsed = True
 volt = 0
 freq = 40000
@@ -623,7 +767,6 @@ class AmpliferState:
     is_pulsed = True
     start_flag = False
     def __init__(self, data):
-        print(data)
         self.enabled = bool(data[0])
         self.phaseTracking = bool(data[1])
         self.currentTracking = bool(data[2])
@@ -631,35 +774,74 @@ class AmpliferState:
         self.errorAmp = bool(data[4])
         self.errorLoad = bool(data[5])
         self.errorTemperature = bool(data[6])
-        self.voltage = float(unpack('f', data[8:12])[0])
-        self.frequency = float(unpack('f', data[12:16])[0])
-        self.minFrequency = float(unpack('f', data[16:20])[0])
-        self.maxFrequency = float(unpack('f', data[20:24])[0])
-        self.phaseSetpoint = float(unpack('f', data[24:28])[0])
-        self.phaseControlGain = float(unpack('f', data[28:32])[0])
-        self.currentSetpoint = float(unpack('f', data[32:36])[0])
-        self.currentControlGain = float(unpack('f', data[36:40])[0])
-        self.powerSetpoint = float(unpack('f', data[40:44])[0])
-        self.powerControlGain = float(unpack('f', data[44:48])[0])
-        self.maxLoadPower = float(unpack('f', data[48:52])[0])
-        self.ampliferPower = float(unpack('f', data[52:56])[0])
-        self.loadPower = float(unpack('f', data[56:60])[0])
-        self.temperature = float(unpack('f', data[60:64])[0])
-        self.measuredPhase = float(unpack('f', data[64:68])[0])
-        self.measuredCurrent = float(unpack('f', data[68:72])[0])
-        self.Impedance = float(unpack('f', data[72:76])[0])
-        self.transformerTruns = float(unpack('f', data[76:80])[0])
-
-
-def update(command, value):
-    ser.write((command + value + '\r').encode())
-    ser.read_until('\r'.encode())
+        self.voltage = float(struct.unpack('f', data[8:12])[0])
+        self.frequency = float(struct.unpack('f', data[12:16])[0])
+        self.minFrequency = float(struct.unpack('f', data[16:20])[0])
+        self.maxFrequency = float(struct.unpack('f', data[20:24])[0])
+        self.phaseSetpoint = float(struct.unpack('f', data[24:28])[0])
+        self.phaseControlGain = float(struct.unpack('f', data[28:32])[0])
+        self.currentSetpoint = float(struct.unpack('f', data[32:36])[0])
+        self.currentControlGain = float(struct.unpack('f', data[36:40])[0])
+        self.powerSetpoint = float(struct.unpack('f', data[40:44])[0])
+        self.powerControlGain = float(struct.unpack('f', data[44:48])[0])
+        self.maxLoadPower = float(struct.unpack('f', data[48:52])[0])
+        self.ampliferPower = float(struct.unpack('f', data[52:56])[0])
+        self.loadPower = float(struct.unpack('f', data[56:60])[0])
+        self.temperature = float(struct.unpack('f', data[60:64])[0])
+        self.measuredPhase = float(struct.unpack('f', data[64:68])[0])
+        self.measuredCurrent = float(struct.unpack('f', data[68:72])[0])
+        self.Impedance = float(struct.unpack('f', data[72:76])[0])
+        self.transformerTruns = float(struct.unpack('f', data[76:80])[0])
+
+
+def connect(port=SERIAL_PORT, baudrate=9600):
+    """Open the amplifier link and set the default drive, blocks until it answers"""
+    global ser, volt
+    link = serial.Serial(port=port, baudrate=baudrate, timeout=1)
+    try:
+        if not update('setVOLT', '10', link):
+            raise serial.SerialException(f"No reply from the amplifier on {port}")
+    except Exception:
+        link.close()
+        raise
+    # Only a link that answered counts as connected
+    volt = 10
+    ser = link
+
+
+def connected():
+    return ser is not None
+
+
+def open_probe():
+    """The sample probe scanning in the background"""
+    scanner = NTCScanner(channels=PROBE_CHANNELS)
+    scanner.start(PROBE_PERIOD)
+    return scanner
+
+
+def open_telemetry(directory=TELEMETRY_DIR):
+    """Telemetry logger writing compressed runs, by default next to the code"""
+    telemetry = TelemetryLogger(CompressingWriter(
+        RunArchive(directory),
+        RecordCompressor({'temperature': 0.1, 'load_power': 0.05, 'voltage': 0.05},
+                         limits={'temperature': (None, TEMP_CEILING)})))
+    telemetry.start()
+    return telemetry
+
+
+def update(command, value, link=None):
+    link = link or ser
+    with ser_lock:
+        link.write((command + value + '\r').encode())
+        return link.read_until('\r'.encode())
 
 def getAmplifierState():
-    ser.flushInput()
-    ser.write('getSTATE\r'.encode())
-    returned = ser.read(80)
-    ser.flushInput()
+    with ser_lock:
+        ser.flushInput()
+        ser.write('getSTATE\r'.encode())
+        returned = ser.read(80)
+        ser.flushInput()
     amplifer = AmpliferState(returned)
     return amplifer
 
@@ -672,6 +854,10 @@ def set_voltage(voltage):
     volt = voltage
     update('setVOLT', str(voltage))
 
+def write_voltage(voltage):
+    # Drive level for a single pulse, leaves the selected volt untouched
+    update('setVOLT', str(voltage))
+
 def set_freq(freq):
     update('setFREQ', str(freq))
 
@@ -684,23 +870,40 @@ def get_voltage():
     amplifier_state = getAmplifierState()
     return  amplifier_state.voltage
 
-def start_pulsing(volt):
-    set_voltage(volt)
-    time.sleep(1)
-    update('setVOLT', str(0))
-    time.sleep(1)
-
 def stop():
     print("stop")
     # amplifier_state = getAmplifierState()
 
     update('DISABLE', '')
 
-set_voltage(10)
+
+class AmplifierLink:
+    """The amplifier as a coordinator device, over this module's serial link"""
+
+    def connected(self):
+        return connected()
+
+    def write_voltage(self, voltage):
+        write_voltage(voltage)
+
+    def set_voltage(self, voltage):
+        set_voltage(voltage)
+
+    def stop(self):
+        stop()
+
 
 class DashboardApp(App):
     def build(self):
-        return Dashboard()
+        self.dashboard = Dashboard()
+        mark('dashboard built')
+        return self.dashboard
+
+    def on_start(self):
+        after_first_frame(self.dashboard.connect)
+
+    def on_stop(self):
+        self.dashboard.shutdown()
 
 if __name__ == '__main__':
     DashboardApp().run()
@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import time
+
+from motion_scheduler import MotionScheduler
+from paths import CALIBRATION_DIR
+
+FULL_STEPS_PER_REV = 200  # 1.8° motor
+DEFAULT_MAX_PULSE_RATE = 2000.0  # steps/s, used until the host has been measured
+HEADROOM = 0.7  # share of the measured rate the pumps may use, the UI needs the rest
+
+# TB6600 SW1-SW3 per microstep setting (pulses/rev = 200 * microsteps)
+SWITCHES = {
+    1: ('ON', 'ON', 'OFF'),
+    2: ('ON', 'OFF', 'ON'),
+    4: ('ON', 'OFF', 'OFF'),
+    8: ('OFF', 'ON', 'OFF'),
+    16: ('OFF', 'OFF', 'ON'),
+    32: ('OFF', 'OFF', 'OFF'),
+}
+
+
+def switch_settings(microsteps):
+    """DIP switch positions for a microstep setting, as text for the operator"""
+    return ' '.join(f'SW{i}={state}' for i, state in enumerate(SWITCHES[microsteps], 1))
+
+
+def driver_path(directory=CALIBRATION_DIR):
+    return os.path.join(directory, 'driver.json')
+
+
+def load_driver(directory=CALIBRATION_DIR):
+    try:
+        with open(driver_path(directory)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_driver(directory=CALIBRATION_DIR, **values):
+    data = load_driver(directory)
+    data.update(values)
+    os.makedirs(directory, exist_ok=True)
+    with open(driver_path(directory), 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def measure_max_pulse_rate(stepper, seconds=0.5, start=500.0, limit=50000.0, tolerance=0.02, resolution=0.05):
+    """Highest step rate the scheduler thread sustains on this host.
+
+    Pulses the stepper's PUL pin with the driver disabled, so the motor
+    doesn't move. A rate fails when fewer than (1 - tolerance) of the
+    commanded steps come out in time or more than 1% miss their deadline.
+    """
+    stepper.disable()
+
+    def sustains(rate):
+        count = int(rate * seconds)
+        scheduler = MotionScheduler()
+        scheduler.start()
+        began = time.perf_counter()
+        motion = scheduler.move(_Disabled(stepper), [1 / rate] * count)
+        motion.wait()
+        elapsed = time.perf_counter() - began
+        scheduler.shutdown()
+        achieved = count / elapsed
+        print(f"{rate:8.0f} steps/s commanded, {achieved:8.0f} achieved, {scheduler.missed} missed")
+        return achieved >= rate * (1 - tolerance) and scheduler.missed <= count * 0.01
+
+    return find_max_rate(sustains, start, limit, resolution)
+
+
+def find_max_rate(sustains, start, limit, resolution=0.05):
+    """Highest rate up to limit for which sustains(rate) holds, 0 if not even start.
+
+    Doubles from start to bracket the limit, then bisects between the last
+    passing and the first failing rate until they are within `resolution`
+    (a fraction of the passing rate) of each other.
+    """
+    best = 0.0
+    rate = min(start, limit)
+    while sustains(rate):
+        best = rate
+        if rate >= limit:
+            return best
+        rate = min(rate * 2, limit)
+    if not best:
+        return 0.0
+    failed = rate
+    while failed - best > best * resolution:
+        middle = (best + failed) / 2
+        if sustains(middle):
+            best = middle
+        else:
+            failed = middle
+    return best
+
+
+class _Disabled:
+    """Stepper stand-in that keeps the driver disabled while pulsing"""
+
+    def __init__(self, stepper):
+        self.PUL = stepper.PUL
+
+    def enable(self):
+        pass
+
+    def set_direction(self, direction):
+        pass
+
+
+def choose_microsteps(max_rpm, max_pulse_rate, headroom=HEADROOM, full_steps=FULL_STEPS_PER_REV):
+    """Finest microstep setting that still reaches max_rpm within the pulse budget.
+
+    The DIP switches can't change at run time, so the choice is made for
+    the top of the speed range; lower speeds get the same (smoother) setting
+    at proportionally fewer pulses. Returns (microsteps, pulse rate at max_rpm).
+    """
+    budget = max_pulse_rate * headroom
+    for microsteps in sorted(SWITCHES, reverse=True):
+        rate = max_rpm * full_steps * microsteps / 60
+        if rate <= budget:
+            return microsteps, rate
+    raise ValueError(f"{max_rpm} RPM needs {max_rpm * full_steps / 60:.0f} steps/s even at full steps, "
+                     f"this host sustains {budget:.0f}")
+
+
+def max_rpm(stepper, max_pulse_rate=None, headroom=HEADROOM):
+    """Fastest RPM the current setting allows within the pulse budget"""
+    if max_pulse_rate is None:
+        max_pulse_rate = load_driver().get('max_pulse_rate', DEFAULT_MAX_PULSE_RATE)
+    return max_pulse_rate * headroom * 60 / stepper.steps_per_rev
+
+
+def apply_microsteps(stepper, microsteps):
+    """Set steps_per_rev for a microstep setting, keeping the commanded RPM"""
+    rpm = stepper.get_rpm()
+    stepper.microsteps = microsteps
+    stepper.steps_per_rev = FULL_STEPS_PER_REV * microsteps
+    stepper.set_rpm(rpm)
+
+
+def load_microsteps(stepper, directory=CALIBRATION_DIR):
+    """Apply the microstep setting the operator confirmed with `microstep.py --save`"""
+    microsteps = load_driver(directory).get('microsteps')
+    if microsteps is not None:
+        apply_microsteps(stepper, microsteps)
+        print(f"Driver at {microsteps} microsteps ({switch_settings(microsteps)}), "
+              f"{stepper.steps_per_rev} steps/rev")
+    return microsteps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick the TB6600 microstep setting for a top speed")
+    parser.add_argument('--max-rpm', type=float, required=True, help="fastest speed the pump has to run")
+    parser.add_argument('--measure', action='store_true', help="measure this host's pulse rate first")
+    parser.add_argument('--pul', type=int, default=8, help="PUL pin used for --measure")
+    parser.add_argument('--ena', type=int, default=15, help="ENA pin, held disabled during --measure")
+    parser.add_argument('--save', action='store_true',
+                        help="record the setting once the switches are set, the apps then use it")
+    parser.add_argument('--dir', default=CALIBRATION_DIR)
+    args = parser.parse_args()
+
+    if args.measure:
+        from gpio_backend import GPIO
+
+        class Pins:
+            PUL = args.pul
+
+            def disable(self):
+                GPIO.output(args.ena, GPIO.HIGH)
+
+        GPIO.setmode(GPIO.BOARD)
+        GPIO.setup(args.pul, GPIO.OUT)
+        GPIO.setup(args.ena, GPIO.OUT)
+        rate = measure_max_pulse_rate(Pins())
+        GPIO.cleanup()
+        save_driver(args.dir, max_pulse_rate=rate)
+        print(f"Sustained {rate:.0f} steps/s")
+    else:
+        rate = load_driver(args.dir).get('max_pulse_rate', DEFAULT_MAX_PULSE_RATE)
+
+    microsteps, pulse_rate = choose_microsteps(args.max_rpm, rate)
+    print(f"Use {microsteps} microsteps ({FULL_STEPS_PER_REV * microsteps} pulses/rev), "
+          f"{pulse_rate:.0f} steps/s at {args.max_rpm} RPM")
+    print(f"Set the TB6600 DIP switches to {switch_settings(microsteps)}")
+    if args.save:
+        save_driver(args.dir, microsteps=microsteps)
+        print(f"Saved to {driver_path(args.dir)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+
+PROFILES = ('trapezoidal', 's-curve')
+
+
+def _ramp_distance(v0, vp, accel, profile):
+    """Steps covered while ramping from v0 to vp steps/s"""
+    if profile == 'trapezoidal':
+        return (vp ** 2 - v0 ** 2) / (2 * accel)
+    # Cosine velocity ramp peaks at `accel`, lasting (vp - v0) * pi / (2 * accel)
+    return (vp ** 2 - v0 ** 2) * math.pi / (4 * accel)
+
+
+def _peak_for_distance(v0, distance, accel, profile):
+    """Highest rate reachable when the ramp may only cover `distance` steps"""
+    if profile == 'trapezoidal':
+        return math.sqrt(v0 ** 2 + 2 * accel * distance)
+    return math.sqrt(v0 ** 2 + 4 * accel * distance / math.pi)
+
+
+def _ramp_duration(v0, vp, accel, profile):
+    if profile == 'trapezoidal':
+        return (vp - v0) / accel
+    return (vp - v0) * math.pi / (2 * accel)
+
+
+def _ramp_times(positions, v0, vp, accel, profile):
+    """Time at which each position (in steps) is reached during a ramp"""
+    positions = np.asarray(positions, dtype=float)
+    if vp <= v0:
+        return positions / max(v0, 1e-9)
+    if profile == 'trapezoidal':
+        return (np.sqrt(v0 ** 2 + 2 * accel * positions) - v0) / accel
+    # x(t) has no closed-form inverse, sample it densely and interpolate
+    duration = _ramp_duration(v0, vp, accel, profile)
+    t = np.linspace(0.0, duration, max(64, 8 * int(positions.max(initial=0)) + 2))
+    x = v0 * t + (vp - v0) / 2 * (t - duration / math.pi * np.sin(math.pi * t / duration))
+    return np.interp(positions, x, t)
+
+
+def _check(rate, accel, profile):
+    if rate <= 0:
+        raise ValueError("Step rate must be greater than 0")
+    if accel <= 0:
+        raise ValueError("Acceleration must be greater than 0")
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile {profile!r}, use one of {PROFILES}")
+
+
+def plan_move(steps, max_rate, accel, start_rate=0.0, profile='trapezoidal'):
+    """Per-step periods (s) for a move of `steps` pulses.
+
+    Ramps from start_rate up to max_rate (steps/s) at `accel` steps/s^2,
+    cruises, and ramps back down so the last step is at start_rate again.
+    Short moves become triangular. The s-curve uses a cosine velocity ramp,
+    so acceleration itself starts and ends at zero.
+    """
+    steps = abs(int(steps))
+    _check(max_rate, accel, profile)
+    if steps == 0:
+        return np.empty(0)
+    v0 = min(max(start_rate, 0.0), max_rate)
+    vp = max_rate
+    ramp = _ramp_distance(v0, vp, accel, profile)
+    if 2 * ramp > steps:
+        ramp = steps / 2
+        vp = _peak_for_distance(v0, ramp, accel, profile)
+    ramp_time = _ramp_duration(v0, vp, accel, profile)
+    total = 2 * ramp_time + (steps - 2 * ramp) / vp
+
+    x = np.arange(steps + 1, dtype=float)
+    t = np.empty_like(x)
+    accelerating = x <= ramp
+    decelerating = x >= steps - ramp
+    cruising = ~(accelerating | decelerating)
+    t[accelerating] = _ramp_times(x[accelerating], v0, vp, accel, profile)
+    t[decelerating] = total - _ramp_times(steps - x[decelerating], v0, vp, accel, profile)
+    t[cruising] = ramp_time + (x[cruising] - ramp) / vp
+    return np.diff(t)
+
+
+def ramp_intervals(from_rate, to_rate, accel, profile='trapezoidal'):
+    """Per-step periods to change speed from from_rate to to_rate steps/s"""
+    _check(max(from_rate, to_rate), accel, profile)
+    lo, hi = sorted((max(from_rate, 0.0), max(to_rate, 0.0)))
+    steps = int(_ramp_distance(lo, hi, accel, profile))
+    if steps == 0:
+        return np.empty(0)
+    intervals = np.diff(_ramp_times(np.arange(steps + 1), lo, hi, accel, profile))
+    return intervals if to_rate >= from_rate else intervals[::-1]
+
+
+def ramp_time(rate, accel, profile='trapezoidal'):
+    """Seconds to ramp between standstill and `rate` steps/s"""
+    _check(rate, accel, profile)
+    return _ramp_duration(0.0, rate, accel, profile)
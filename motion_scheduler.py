@@ -0,0 +1,284 @@
+import heapq
+import itertools
+import time
+from collections import deque
+from threading import Event, Lock, Thread
+
+from gpio_backend import GPIO
+
+from step_runner import SPIN_NS
+
+# Command priorities, lower runs first
+ESTOP, STOP, DIRECTION, RATE, MOVE = range(5)
+
+DIR_SETUP_NS = 5_000   # TB6600 wants DIR stable 5 µs before the first PUL edge
+COALESCE_NS = 20_000   # edges due this close together go out in one GPIO call
+MIN_PULSE_NS = 5_000   # never shorter than the TB6600's 2.5 µs minimum, with margin
+
+
+class Motion:
+    """One queued move of one stepper, `periods` yields step periods in seconds"""
+
+    def __init__(self, stepper, periods, direction=True, on_done=None):
+        self.stepper = stepper
+        self.periods = iter(periods)
+        self.direction = direction
+        self.on_done = on_done
+        self.steps_done = 0
+        self.cancelled = False
+        self.finished = Event()
+
+    def cancel(self):
+        """Stop before the next pulse"""
+        self.cancelled = True
+
+    def done(self):
+        return self.finished.is_set()
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+
+class CommandQueue:
+    """Prioritised, coalescing commands for one stepper.
+
+    Drained by the scheduler thread between pulses. Only the newest
+    DIRECTION and RATE command survives, and a STOP or ESTOP discards any
+    queued direction changes and moves it overtakes.
+    """
+
+    COALESCED = (DIRECTION, RATE)
+
+    def __init__(self):
+        self.heap = []
+        self.seq = itertools.count()
+        self.latest = {}
+        self.lock = Lock()
+
+    def __bool__(self):
+        return bool(self.heap)
+
+    def put(self, kind, *args):
+        with self.lock:
+            seq = next(self.seq)
+            if kind in (ESTOP, STOP):
+                self.heap = [c for c in self.heap if c[0] not in (DIRECTION, MOVE)]
+                heapq.heapify(self.heap)
+            if kind in self.COALESCED:
+                self.latest[kind] = seq
+            heapq.heappush(self.heap, (kind, seq, args))
+
+    def pop_all(self):
+        """Pending commands in priority order, superseded ones dropped"""
+        with self.lock:
+            heap, self.heap = self.heap, []
+            latest, self.latest = self.latest, {}
+        commands = []
+        while heap:
+            kind, seq, args = heapq.heappop(heap)
+            if kind in self.COALESCED and latest.get(kind) != seq:
+                continue
+            commands.append((kind, args))
+        return commands
+
+
+class _Axis:
+    """Scheduler-side state of one stepper"""
+
+    def __init__(self, stepper):
+        self.stepper = stepper
+        self.motions = deque()
+        self.current = None
+        self.high = False
+        self.rise_ns = 0
+        self.period_ns = 0
+
+
+class MotionScheduler(Thread):
+    """One thread pulsing any number of steppers off a shared deadline heap.
+
+    Every axis has at most one pending edge in the heap. The thread sleeps
+    until just before the earliest edge, spins to it, then drives every PUL
+    pin due within COALESCE_NS in a single GPIO.output call and pushes each
+    axis's next edge. Rising edges are spaced from the previous rising edge's
+    deadline, so lateness doesn't accumulate. Work scales with the total step
+    rate instead of with the number of pumps.
+    """
+
+    def __init__(self, spin_ns=SPIN_NS, coalesce_ns=COALESCE_NS):
+        super().__init__(daemon=True)
+        self.spin_ns = spin_ns
+        self.coalesce_ns = coalesce_ns
+        self.heap = []
+        self.seq = itertools.count()
+        self.axes = {}
+        self.pending = deque()
+        self.cancels = []
+        self.hooks = []
+        self.lock = Lock()
+        self.wake = Event()
+        self.alive = True
+        self.missed = 0
+        self.max_late_ns = 0
+
+    def move(self, stepper, periods, direction=True, on_done=None):
+        """Queue a move, it starts once the stepper's earlier moves are done"""
+        motion = Motion(stepper, periods, direction, on_done)
+        with self.lock:
+            self.pending.append(motion)
+        self.wake.set()
+        return motion
+
+    def cancel_all(self, stepper, keep=None):
+        """Cancel the current and all queued moves of a stepper, except `keep`.
+
+        A move whose next rising edge hasn't happened yet stops without it,
+        so cancellation takes effect within one step period.
+        """
+        with self.lock:
+            for motion in self.pending:
+                if motion.stepper is stepper and motion is not keep:
+                    motion.cancel()
+            # Moves already admitted are only touched on the scheduler thread
+            self.cancels.append((stepper.PUL, keep))
+        self.wake.set()
+
+    def add_hook(self, hook):
+        """Call hook() on the scheduler thread before every batch of edges"""
+        with self.lock:
+            self.hooks.append(hook)
+        self.wake.set()
+
+    def shutdown(self):
+        self.alive = False
+        self.wake.set()
+
+    def run(self):
+        while self.alive:
+            for hook in self.hooks:
+                hook()
+            self._admit()
+            if not self.heap:
+                self.wake.wait()
+                self.wake.clear()
+                continue
+            due = self.heap[0][0]
+            remaining = due - time.perf_counter_ns()
+            if remaining > self.spin_ns:
+                # Woken early by a new move, re-check the heap
+                self.wake.wait((remaining - self.spin_ns) / 1e9)
+                self.wake.clear()
+                continue
+            while time.perf_counter_ns() < due:
+                pass
+            self._fire(time.perf_counter_ns())
+
+    def _admit(self):
+        with self.lock:
+            if not (self.pending or self.cancels):
+                return
+            cancels, self.cancels = self.cancels, []
+            pending, self.pending = self.pending, deque()
+        now = time.perf_counter_ns()
+        # Cancels first, moves queued before them were already marked by cancel_all
+        for pul, keep in cancels:
+            axis = self.axes.get(pul)
+            if axis is not None:
+                self._preempt(axis, keep, now)
+        for motion in pending:
+            axis = self.axes.get(motion.stepper.PUL)
+            if axis is None:
+                axis = self.axes[motion.stepper.PUL] = _Axis(motion.stepper)
+            axis.motions.append(motion)
+        for axis in self.axes.values():
+            if axis.current is None and axis.motions:
+                self._start_next(axis, now)
+
+    def _start_next(self, axis, now):
+        while axis.motions:
+            motion = axis.motions.popleft()
+            if motion.cancelled:
+                self._finish(motion)
+                continue
+            axis.current = motion
+            axis.stepper.enable()
+            axis.stepper.set_direction(motion.direction)
+            self._schedule_rise(axis, now + DIR_SETUP_NS)
+            return
+        axis.current = None
+
+    def _preempt(self, axis, keep, now):
+        for motion in axis.motions:
+            if motion is not keep:
+                motion.cancel()
+        current = axis.current
+        if current is None or current is keep:
+            return
+        current.cancel()
+        if not axis.high:
+            # Drop the pending rising edge rather than making one more step
+            self.heap = [entry for entry in self.heap if entry[2] is not axis]
+            heapq.heapify(self.heap)
+            self._finish(current)
+            axis.current = None
+            self._start_next(axis, now)
+
+    def _schedule_rise(self, axis, t):
+        motion = axis.current
+        period = None if motion.cancelled else next(motion.periods, None)
+        if period is None:
+            self._finish(motion)
+            axis.current = None
+            self._start_next(axis, t)
+            return
+        axis.rise_ns = t
+        axis.period_ns = int(period * 1e9)
+        heapq.heappush(self.heap, (t, next(self.seq), axis))
+
+    def _finish(self, motion):
+        motion.finished.set()
+        if motion.on_done is not None:
+            motion.on_done(motion)
+
+    def _fire(self, now):
+        limit = now + self.coalesce_ns
+        due = []
+        while self.heap and self.heap[0][0] <= limit:
+            due.append(heapq.heappop(self.heap))
+        late = now - due[0][0]
+        if late > self.max_late_ns:
+            self.max_late_ns = late
+
+        pins = []
+        levels = []
+        for _, _, axis in due:
+            axis.high = not axis.high
+            pins.append(axis.stepper.PUL)
+            levels.append(GPIO.HIGH if axis.high else GPIO.LOW)
+        GPIO.output(pins, levels)
+
+        for t, _, axis in due:
+            if axis.high:
+                axis.current.steps_done += 1
+                # A late rising edge still gets a full-width pulse
+                fall = max(axis.rise_ns + axis.period_ns // 2, now + MIN_PULSE_NS)
+                heapq.heappush(self.heap, (fall, next(self.seq), axis))
+            else:
+                rise = axis.rise_ns + axis.period_ns
+                if now - rise >= axis.period_ns // 2:
+                    # A whole half period behind, restart the timeline instead of bursting
+                    self.missed += 1
+                    rise = now
+                self._schedule_rise(axis, rise)
+
+
+_shared = None
+
+
+def shared_scheduler():
+    """The process-wide scheduler, started on first use"""
+    global _shared
+    if _shared is None or not _shared.is_alive():
+        _shared = MotionScheduler()
+        _shared.start()
+    return _shared
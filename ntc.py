@@ -1,19 +1,204 @@
+import json
+import os
+import threading
+import time
 
-from gpiozero import MCP3208
 import numpy as np
 
-red_pot = MCP3208(channel=1)
+from paths import CALIBRATION_DIR
+
+VREF = 3.3
+ADC_MAX = 4095  # MCP3208 is a 12 bit converter
+r25 = 10000
+
 a1=0.003354016
 b1=0.000256524
 c1=2.60597E-06
 d1=6.32926E-08
-r25 = 10000
+DEFAULT_COEFFS = (a1, b1, c1, d1)
+
 
 def kelvin_to_celsius(k):
-	return k - 273.15
+    return k - 273.15
+
+
+def adc_to_resistance(value):
+    """Thermistor resistance for a normalised (0..1) divider reading"""
+    adc_value = np.asarray(value) * VREF
+    return (adc_value * r25) / (VREF - adc_value)
+
+
+def resistance_to_celsius(r, coeffs=DEFAULT_COEFFS):
+    """Steinhart-Hart conversion, works on scalars and arrays"""
+    a, b, c, d = coeffs
+    x = np.log(np.asarray(r, dtype=float) / r25)
+    t_in_k = 1 / (a + b * x + c * x ** 2 + d * x ** 3)
+    return kelvin_to_celsius(t_in_k)
+
+
+def celsius_to_resistance(t, coeffs=DEFAULT_COEFFS, iterations=6):
+    """Inverse Steinhart-Hart, Newton iterations on ln(R/R25)"""
+    a, b, c, d = coeffs
+    target = 1 / (np.asarray(t, dtype=float) + 273.15)
+    x = (target - a) / b
+    for _ in range(iterations):
+        f = a + b * x + c * x ** 2 + d * x ** 3 - target
+        x = x - f / (b + 2 * c * x + 3 * d * x ** 2)
+    return r25 * np.exp(x)
+
+
+def calibration_path(probe, directory=CALIBRATION_DIR):
+    return os.path.join(directory, f'{probe}.json')
+
+
+def load_coefficients(probe, directory=CALIBRATION_DIR):
+    """Fitted coefficients for a probe, written by calibrate.py"""
+    with open(calibration_path(probe, directory)) as f:
+        data = json.load(f)
+    if data.get('r25', r25) != r25:
+        raise ValueError(f"Probe {probe} was calibrated against R25={data['r25']}, expected {r25}")
+    return tuple(data['coefficients'])
+
+
+def build_conversion_table(coeffs=DEFAULT_COEFFS):
+    """Temperature for every raw ADC code, so a reading is a single lookup"""
+    codes = np.arange(ADC_MAX + 1, dtype=float)
+    # Code 0 and full scale are a shorted / open probe, clamp them to the nearest valid code
+    codes = np.clip(codes, 1, ADC_MAX - 1)
+    return resistance_to_celsius(adc_to_resistance(codes / ADC_MAX), coeffs)
+
+
+class NTCScanner:
+    """Round-robin reader for any subset of the eight MCP3208 channels.
+
+    Every scan reads the selected channels back to back and converts and
+    filters them together, so the only per-channel cost is the SPI transfer.
+    Results are kept in a 2-D ring buffer, one row per scan cycle.
+    """
+
+    def __init__(self, channels=(1,), coeffs=None, alpha=0.2, buffer_len=1024, backend=None, probes=None):
+        self.channels = tuple(channels)
+        for ch in self.channels:
+            if not 0 <= ch <= 7:
+                raise ValueError(f"MCP3208 channel must be 0-7, got {ch}")
+        n = len(self.channels)
+
+        # Per-channel Steinhart-Hart coefficients, default to the datasheet set.
+        # Probes with a calibration file override both.
+        coeffs = dict(coeffs or {})
+        for ch, probe in (probes or {}).items():
+            coeffs[ch] = load_coefficients(probe)
+        self.coeffs = [coeffs.get(ch, DEFAULT_COEFFS) for ch in self.channels]
+        self.tables = np.vstack([build_conversion_table(c) for c in self.coeffs])
+        self._rows = np.arange(n)
+
+        # Per-channel exponential filter state
+        self.alpha = np.broadcast_to(np.asarray(alpha, dtype=float), (n,)).copy()
+        self.filtered = np.full(n, np.nan)
+
+        if backend is None:
+            from sensor_backend import GpiozeroADC
+            backend = GpiozeroADC(self.channels)
+        elif tuple(backend.channels) != self.channels:
+            raise ValueError("Backend channels do not match scanner channels")
+        self.backend = backend
+
+        self.buffer = np.full((buffer_len, n), np.nan)
+        self.times = np.zeros(buffer_len)
+        self.count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def read_raw(self):
+        """One pass over the channels, returns normalised readings"""
+        return self.backend.read()
+
+    def scan(self):
+        """Read, convert and filter all channels, returns filtered temperatures"""
+        # Time of the sample, taken first: a simulated backend's clock advances on read
+        now = self.backend.now()
+        values = self.read_raw()
+
+        codes = np.rint(values * ADC_MAX).astype(np.intp)
+        temps = self.tables[self._rows, codes]
+
+        # First sample seeds the filter
+        fresh = np.isnan(self.filtered)
+        self.filtered[fresh] = temps[fresh]
+        self.filtered += self.alpha * (temps - self.filtered)
+
+        row = self.count % len(self.buffer)
+        self.buffer[row] = self.filtered
+        self.times[row] = now
+        self.count += 1
+        return self.filtered.copy()
+
+    def history(self):
+        """Buffered scans in time order as (times, temperatures)"""
+        size = len(self.buffer)
+        if self.count <= size:
+            return self.times[:self.count], self.buffer[:self.count]
+        start = self.count % size
+        order = np.r_[start:size, 0:start]
+        return self.times[order], self.buffer[order]
+
+    def gradient(self):
+        """Spread between the hottest and coldest probe in the last scan"""
+        return float(np.nanmax(self.filtered) - np.nanmin(self.filtered))
+
+    def temperature(self, channel=None):
+        """Latest filtered temperature of a channel (the first by default), None before the first scan"""
+        i = 0 if channel is None else self.channels.index(channel)
+        value = self.filtered[i]
+        return None if np.isnan(value) else float(value)
+
+    def start(self, period=0.5):
+        """Scan every `period` seconds on a background thread"""
+        def loop():
+            next_scan = time.perf_counter()
+            while not self._stop.is_set():
+                try:
+                    self.scan()
+                except Exception as e:
+                    print(f"NTC scan failed: {e}")
+                next_scan += period
+                self._stop.wait(max(0.0, next_scan - time.perf_counter()))
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name='ntc', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.backend.close()
+
+    def run(self, period=0.0):
+        """Scan forever, printing each batch"""
+        next_scan = time.perf_counter()
+        while True:
+            temps = self.scan()
+            print(" ".join(f"CH{ch}:{t:6.2f}" for ch, t in zip(self.channels, temps)))
+            if period > 0:
+                next_scan += period
+                time.sleep(max(0.0, next_scan - time.perf_counter()))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print NTC probe temperatures")
+    parser.add_argument('--channels', type=int, nargs='+', default=[1])
+    parser.add_argument('--period', type=float, default=0.5)
+    parser.add_argument('--simulate', metavar='CSV', help="replay a temperature log instead of the ADC")
+    parser.add_argument('--probes', nargs='+', default=[], metavar='ID',
+                        help="calibrated probe id for each channel, in order")
+    args = parser.parse_args()
 
-while(True):
-	adc_value = red_pot.value*3.3
-	r= (adc_value*r25)/(3.3-adc_value)
-	t_in_k= 1/(a1+b1*np.log(r/r25)+c1*(np.log(r/r25)**2)+d1*(np.log(r/r25)**3))
-	print(r,keZ)
\ No newline at end of file
+    backend = None
+    if args.simulate:
+        from sensor_backend import SimulatedADC
+        backend = SimulatedADC.from_csv(args.simulate, channels=args.channels, realtime=True)
+    probes = dict(zip(args.channels, args.probes))
+    NTCScanner(channels=args.channels, backend=backend, probes=probes).run(period=args.period)
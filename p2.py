@@ -1,4 +1,4 @@
-import RPi.GPIO as GPIO
+from gpio_backend import GPIO
 import time
 import kivy
 from kivy.app import App
@@ -15,6 +15,10 @@ from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.graphics import Color, Rectangle
 
+from microstep import load_microsteps, max_rpm
+from motion_profile import plan_move
+from step_runner import StepRunner
+
 # Set dark theme colors
 Window.clearcolor = (0.1, 0.1, 0.1, 1)  # Dark background
 
@@ -27,6 +31,8 @@ class TB6600_Stepper:
         self.steps_per_rev = 200 # SW 3 & SW 6 is OFF 200
         self.microsteps = 1
         self.delay = 0.0025
+        self.accel = 800  # steps/s^2, ramp moves so the pump doesn't stall
+        self.profile = 'trapezoidal'  # or 's-curve'
 
         try:
             # Use BOARD numbering instead of BCM to avoid conflicts
@@ -67,10 +73,14 @@ class TB6600_Stepper:
         if rpm <= 0:
             raise ValueError("RPM must be greater than 0")
 
-        self.delay = 30/(self.steps_per_rev*rpm)
+        self.delay = 30/(self.steps_per_rev*rpm)  # half a step period, HIGH then LOW
 
     def get_rpm(self):
-        return 60/(self.steps_per_rev*self.delay)
+        return 30/(self.steps_per_rev*self.delay)
+
+    def step_rate(self):
+        """Cruise rate in steps/s, each step is a HIGH and a LOW of `delay`"""
+        return 1 / (2 * self.delay)
 
     def step(self, steps=1):
         if steps == 0:
@@ -84,18 +94,22 @@ class TB6600_Stepper:
 
         print(f"Moving {steps} steps {'forward' if direction else 'backward'}")
 
-        for i in range(steps):
+        # Whole move is timed up front, the loop only toggles the pin and sleeps
+        intervals = plan_move(steps, self.step_rate(), self.accel, profile=self.profile).tolist()
+        for i, interval in enumerate(intervals):
+            half = interval / 2
             GPIO.output(self.PUL, GPIO.HIGH)
-            time.sleep(self.delay)
+            time.sleep(half)
             GPIO.output(self.PUL, GPIO.LOW)
-            time.sleep(self.delay)
+            time.sleep(half)
 
             # Show progress every 50 steps
             if (i + 1) % 50 == 0:
                 print(f"Completed {i + 1}/{steps} steps")
 
     def rotate_degrees(self, degrees, direction=True):
-        steps = int((degrees / 360) * self.steps_per_rev * self.microsteps)
+        # steps_per_rev already counts microsteps, see microstep.apply_microsteps
+        steps = int((degrees / 360) * self.steps_per_rev)
         self.step(steps if direction else -steps)
 
     def cleanup(self):
@@ -105,8 +119,6 @@ class TB6600_Stepper:
 
 
 class StepperControlPanel(BoxLayout):
-    count = 0
-
     def __init__(self, stepper, **kwargs):
         super().__init__(**kwargs)
         self.stepper = stepper
@@ -158,7 +170,8 @@ class StepperControlPanel(BoxLayout):
         )
         self.rpm_slider = Slider(
             min=1,
-            max=200,
+            # Capped at what this host can pulse at the driver's microstep setting
+            max=max(1, min(200, int(max_rpm(self.stepper)))),
             value=self.stepper.get_rpm(),
             step=1,
             value_track=True,
@@ -168,6 +181,12 @@ class StepperControlPanel(BoxLayout):
 
         self.rpm_layout.add_widget(self.rpm_label)
         self.rpm_layout.add_widget(self.rpm_slider)
+        self.speed_label = Label(
+            text='Achieved: -- RPM',
+            font_size='14sp',
+            color=(0.6, 0.6, 0.6, 1)
+        )
+        self.rpm_layout.add_widget(self.speed_label)
         self.add_widget(self.rpm_layout)
 
         # Direction Control
@@ -206,30 +225,31 @@ class StepperControlPanel(BoxLayout):
         self.motor_running = False
         self.current_direction = True  # Clockwise
 
+        # Continuous rotation runs on its own thread, off the Kivy clock
+        self.runner = StepRunner(stepper)
+        self.runner.start()
+
     def start_motor(self, instance):
         if not self.motor_running:
             self.motor_running = True
             self.status_indicator.text = 'RUNNING'
             self.status_indicator.color = (0.3, 1, 0.3, 1)
-            # Start continuous rotation
-            Clock.schedule_interval(self.continuous_step, 1.0 / 60.0)  # Update at 60Hz
+            self.runner.run_motor(self.current_direction)
+            Clock.schedule_interval(self.update_speed, 0.5)
 
     def stop_motor(self, instance):
         if self.motor_running:
             self.motor_running = False
             self.status_indicator.text = 'STOPPED'
             self.status_indicator.color = (1, 0.3, 0.3, 1)
-            Clock.unschedule(self.continuous_step)
-    def continuous_step(self, dt):
-        # Move one step continuously while motor is running
-        self.count = self.count + 1
-        print(self.count)
-        self.stepper.enable()
-        self.stepper.set_direction(self.current_direction)
-        GPIO.output(self.stepper.PUL, GPIO.HIGH)
-        time.sleep(self.stepper.delay)
-        GPIO.output(self.stepper.PUL, GPIO.LOW)
-        time.sleep(self.stepper.delay)
+            self.runner.stop_motor()
+            Clock.unschedule(self.update_speed)
+            self.speed_label.text = 'Achieved: -- RPM'
+
+    def update_speed(self, dt):
+        stats = self.runner.stats()
+        self.speed_label.text = (f"Achieved: {stats['achieved_rpm']:.1f} / {stats['commanded_rpm']:.1f} RPM, "
+                                 f"missed {stats['missed']}")
 
     def update_rpm(self, instance, value):
         try:
@@ -240,7 +260,10 @@ class StepperControlPanel(BoxLayout):
 
     def set_direction(self, direction):
         self.current_direction = direction
-        self.stepper.set_direction(direction)
+        # While running the runner ramps down, flips DIR and ramps back up
+        self.runner.set_direction(direction)
+        if not self.motor_running:
+            self.stepper.set_direction(direction)
 
     def show_error(self, title, message):
         content = BoxLayout(orientation='vertical', padding=10, spacing=10)
@@ -258,6 +281,7 @@ class StepperControlApp(App):
         # Initialize stepper with your GPIO pins
         # Replace these pin numbers with your actual GPIO pins
         self.stepper = TB6600_Stepper(pul_pin=8, dir_pin=10, ena_pin=15)
+        load_microsteps(self.stepper)
 
     def build(self):
         self.title = "TB6600 Stepper Motor Controller"
@@ -265,6 +289,7 @@ class StepperControlApp(App):
 
     def on_stop(self):
         # Cleanup when app closes
+        self.root.runner.shutdown()
         self.stepper.cleanup()
 
 
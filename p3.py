@@ -1,4 +1,4 @@
-import RPi.GPIO as GPIO
+from gpio_backend import GPIO
 import time
 import kivy
 from kivy.app import App
@@ -14,15 +14,17 @@ from kivy.uix.popup import Popup
 from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.graphics import Color, Rectangle
-from threading import Thread
-import queue
+
+from microstep import load_microsteps, max_rpm
+from motion_profile import plan_move, ramp_intervals
+from motion_scheduler import DIRECTION, ESTOP, MOVE, RATE, STOP, CommandQueue, shared_scheduler
 
 # Set dark theme colors
 Window.clearcolor = (0.1, 0.1, 0.1, 1)  # Dark background
 
 
 class TB6600_Stepper:
-    def __init__(self, pul_pin, dir_pin, ena_pin=None):
+    def __init__(self, pul_pin, dir_pin, ena_pin=None, scheduler=None):
         self.PUL = pul_pin
         self.DIR = dir_pin
         self.ENA = ena_pin
@@ -30,9 +32,18 @@ class TB6600_Stepper:
         self.steps_per_rev = 200  # SW 3 & SW 6 is OFF 200
         self.microsteps = 1
         self.delay = 0.005
+        self.commanded_delay = self.delay  # set_rpm's value, `delay` follows between pulses
+        self.accel = 800  # steps/s^2, ramp moves so the pump doesn't stall
+        self.profile = 'trapezoidal'  # or 's-curve'
         self.running = False
-        self.step_queue = queue.Queue()
         self.continuous_mode = False
+        self._continuous = None
+        self._continuous_direction = True
+        self._continuous_motion = None
+        # Pulses for every stepper come from one scheduler thread, commands
+        # are applied by it between pulses
+        self.scheduler = scheduler
+        self.commands = CommandQueue()
 
         try:
             # Use BOARD numbering instead of BCM to avoid conflicts
@@ -71,82 +82,133 @@ class TB6600_Stepper:
     def set_rpm(self, rpm):
         if rpm <= 0:
             raise ValueError("RPM must be greater than 0")
-        self.delay = 60.0 / (self.steps_per_rev * rpm * 2)  # Account for both HIGH and LOW delays
+        # Account for both HIGH and LOW delays. Applied between pulses, a burst
+        # of slider events coalesces into one change
+        self.commanded_delay = 60.0 / (self.steps_per_rev * rpm * 2)
+        self._submit(RATE, self.commanded_delay)
 
     def get_rpm(self):
-        if self.delay <= 0:
+        """The last rpm set, even if the scheduler hasn't applied it yet"""
+        if self.commanded_delay <= 0:
             return 0
-        return 60.0 / (self.steps_per_rev * self.delay * 2)  # Account for both HIGH and LOW delays
+        return 60.0 / (self.steps_per_rev * self.commanded_delay * 2)  # Account for both HIGH and LOW delays
+
+    def step_rate(self):
+        """Cruise rate in steps/s, each step is a HIGH and a LOW of `delay`"""
+        return 1 / (2 * self.delay)
+
+    def _submit(self, kind, *args):
+        """Queue a command, applied by the scheduler once start() has attached it"""
+        self.commands.put(kind, *args)
+        if self.scheduler is not None:
+            self.scheduler.wake.set()
 
     def step(self, steps=1):
-        """Add steps to the queue for processing"""
+        """Queue a move on the motion scheduler"""
         if steps != 0:
-            self.step_queue.put(('steps', abs(steps), steps > 0))
+            self._submit(MOVE, steps, steps > 0)
 
     def start_continuous(self, direction):
         """Start continuous rotation"""
         self.continuous_mode = True
-        self.step_queue.put(('continuous', direction))
+        self._submit(MOVE, None, direction)
 
     def stop_continuous(self):
-        """Stop continuous rotation"""
+        """Ramp down, and drop any moves still queued"""
+        self.continuous_mode = False
+        self._submit(STOP)
+
+    def change_direction(self, direction):
+        """Reverse a continuous run (ramp down, ramp up), otherwise used by the next run"""
+        self._submit(DIRECTION, direction)
+
+    def emergency_stop(self):
+        """Cut the driver now and cancel everything without ramping"""
         self.continuous_mode = False
-        self.step_queue.put(('stop',))
-
-    def _step_thread(self):
-        """Background thread for handling stepper pulses without blocking UI"""
-        while self.running:
-            try:
-                # Check for new commands with timeout to allow checking running flag
-                command = self.step_queue.get(timeout=0.1)
-
-                if command[0] == 'steps':
-                    _, steps, direction = command
-                    self.enable()
-                    self.set_direction(direction)
-
-                    for i in range(steps):
-                        if not self.running:
-                            break
-                        GPIO.output(self.PUL, GPIO.HIGH)
-                        time.sleep(self.delay)
-                        GPIO.output(self.PUL, GPIO.LOW)
-                        time.sleep(self.delay)
-
-                elif command[0] == 'continuous':
-                    _, direction = command
-                    self.enable()
-                    self.set_direction(direction)
-
-                    while self.continuous_mode and self.running:
-                        GPIO.output(self.PUL, GPIO.HIGH)
-                        time.sleep(self.delay)
-                        GPIO.output(self.PUL, GPIO.LOW)
-                        time.sleep(self.delay)
-
-                elif command[0] == 'stop':
-                    self.continuous_mode = False
-
-            except queue.Empty:
-                continue
-            except Exception as e:
-                print(f"Step thread error: {e}")
+        self.disable()
+        self._submit(ESTOP)
+
+    def _apply_commands(self):
+        """Runs on the scheduler thread between pulses"""
+        if not self.commands:
+            return
+        for kind, args in self.commands.pop_all():
+            if kind == ESTOP:
+                self._continuous = None
+                self.scheduler.cancel_all(self)
+                self.disable()
+            elif kind == STOP:
+                keep = self._continuous_motion if self._continuous is not None else None
+                self._continuous = None
+                self.scheduler.cancel_all(self, keep=keep)
+            elif kind == DIRECTION:
+                direction = args[0]
+                if self._continuous is not None and direction != self._continuous_direction:
+                    keep = self._continuous_motion
+                    self._continuous = None
+                    self.scheduler.cancel_all(self, keep=keep)
+                    self._start_continuous(direction)
+            elif kind == RATE:
+                self.delay = args[0]
+            elif kind == MOVE:
+                steps, direction = args
+                if steps is None:
+                    if self._continuous is None:
+                        self._start_continuous(direction)
+                else:
+                    # Timing for the whole move is computed before the first pulse
+                    periods = plan_move(steps, self.step_rate(), self.accel, profile=self.profile).tolist()
+                    self.scheduler.move(self, periods, direction)
+
+    def _start_continuous(self, direction):
+        token = self._continuous = object()
+        self._continuous_direction = direction
+        self._continuous_motion = self.scheduler.move(self, self._continuous_periods(token), direction)
+
+    def _continuous_periods(self, token):
+        """Ramp up, follow set_rpm, ramp down once this run is stopped.
+
+        Pulled one period at a time by the scheduler thread. The token ties
+        the generator to one start_continuous call, so a stop followed by a
+        new start ends this run instead of reviving it.
+        """
+        current = 0.0
+        for interval in ramp_intervals(0, self.step_rate(), self.accel, self.profile).tolist():
+            if self._continuous is not token or not self.running:
+                break
+            current = 1 / interval
+            yield interval
+
+        while self._continuous is token and self.running:
+            current = self.step_rate()
+            yield 2 * self.delay
+
+        # Ramp down from the speed reached on a normal stop,
+        # shutting down stops straight away
+        if self.running and current > 0:
+            yield from ramp_intervals(current, 0, self.accel, self.profile).tolist()
 
     def start(self):
-        """Start the stepper thread"""
+        """Attach to the shared motion scheduler"""
         if not self.running:
             self.running = True
-            self.thread = Thread(target=self._step_thread, daemon=True)
-            self.thread.start()
+            if self.scheduler is None:
+                self.scheduler = shared_scheduler()
+            if self._apply_commands not in self.scheduler.hooks:
+                self.scheduler.add_hook(self._apply_commands)
 
     def stop(self):
-        """Stop the stepper thread"""
+        """Stop all motion of this stepper"""
         self.running = False
         self.continuous_mode = False
+        self._continuous = None
+        if self.scheduler is not None:
+            self.scheduler.cancel_all(self)
         self.disable()
 
     def rotate_degrees(self, degrees, direction=True):
-        steps = int((degrees / 360) * self.steps_per_rev * self.microsteps)
+        # steps_per_rev already counts microsteps, see microstep.apply_microsteps
+        steps = int((degrees / 360) * self.steps_per_rev)
         self.step(steps if direction else -steps)
 
     def cleanup(self):
@@ -198,8 +260,17 @@ class StepperControlPanel(BoxLayout):
         )
         self.stop_btn.bind(on_press=self.stop_motor)
 
+        self.estop_btn = Button(
+            text='E-STOP',
+            background_color=(1, 0, 0, 1),
+            font_size='20sp',
+            bold=True
+        )
+        self.estop_btn.bind(on_press=self.emergency_stop)
+
         self.control_layout.add_widget(self.start_btn)
         self.control_layout.add_widget(self.stop_btn)
+        self.control_layout.add_widget(self.estop_btn)
         self.add_widget(self.control_layout)
 
         # RPM Control
@@ -211,7 +282,8 @@ class StepperControlPanel(BoxLayout):
         )
         self.rpm_slider = Slider(
             min=1,
-            max=100,
+            # Capped at what this host can pulse at the driver's microstep setting
+            max=max(1, min(100, int(max_rpm(self.stepper)))),
             value=self.stepper.get_rpm(),
             step=1,
             value_track=True,
@@ -276,6 +348,12 @@ class StepperControlPanel(BoxLayout):
             self.status_indicator.color = (1, 0.3, 0.3, 1)
             self.stepper.stop_continuous()
 
+    def emergency_stop(self, instance):
+        self.stepper.emergency_stop()
+        self.motor_running = False
+        self.status_indicator.text = 'E-STOP'
+        self.status_indicator.color = (1, 0, 0, 1)
+
     def update_rpm(self, instance, value):
         try:
             self.stepper.set_rpm(value)
@@ -285,11 +363,8 @@ class StepperControlPanel(BoxLayout):
 
     def set_direction(self, direction):
         self.current_direction = direction
-        self.stepper.set_direction(direction)
-        # If motor is running, update direction immediately
-        if self.motor_running:
-            self.stepper.stop_continuous()
-            self.stepper.start_continuous(direction)
+        # Reverses a running motor in place, the DIR pin only changes between runs
+        self.stepper.change_direction(direction)
 
     def show_error(self, title, message):
         content = BoxLayout(orientation='vertical', padding=10, spacing=10)
@@ -307,6 +382,7 @@ class StepperControlApp(App):
         # Initialize stepper with your GPIO pins
         # Replace these pin numbers with your actual GPIO pins
         self.stepper = TB6600_Stepper(pul_pin=8, dir_pin=10, ena_pin=15)
+        load_microsteps(self.stepper)
 
     def build(self):
         self.title = "TB6600 Stepper Motor Controller"
@@ -0,0 +1,6 @@
+import os
+
+# Files the apps write live next to the code, whatever directory they are started from
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CALIBRATION_DIR = os.path.join(BASE_DIR, 'calibration')
+TELEMETRY_DIR = os.path.join(BASE_DIR, 'telemetry')
@@ -0,0 +1,247 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from threading import Event, Thread
+
+import numpy as np
+
+UNITS = {'s': 1, 'sec': 1, 'min': 60, 'h': 3600, 'hr': 3600}
+_DURATION = r'(\d+(?:\.\d+)?)\s*(s|sec|min|h|hr)'
+_RATE = r'(\d+(?:\.\d+)?)\s*ml/min'
+PATTERNS = (
+    ('hold', re.compile(rf'^{_RATE}\s+for\s+{_DURATION}$')),
+    ('ramp', re.compile(rf'^ramp\s+to\s+{_RATE}\s+over\s+{_DURATION}$')),
+    ('pause', re.compile(rf'^pause\s+{_DURATION}$')),
+)
+
+
+class Segment:
+    """One line of a program: a rate going linearly from start_rate to end_rate"""
+
+    def __init__(self, kind, start_rate, end_rate, duration, text):
+        self.kind = kind
+        self.start_rate = start_rate
+        self.end_rate = end_rate
+        self.duration = duration
+        self.text = text
+
+    def __repr__(self):
+        return f'Segment({self.text!r})'
+
+
+def parse_program(text):
+    """Segments from lines like '2 mL/min for 30 min', 'ramp to 5 mL/min over 10 min', 'pause 5 min'"""
+    segments = []
+    rate = 0.0
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.split('#', 1)[0].strip()
+        if not line:
+            continue
+        for kind, pattern in PATTERNS:
+            match = pattern.match(line.lower())
+            if match:
+                break
+        else:
+            raise ValueError(f"Line {number}: can't read {line!r}")
+        amount, unit = match.groups()[-2:]
+        duration = float(amount) * UNITS[unit]
+        if duration <= 0:
+            raise ValueError(f"Line {number}: {line!r} takes no time")
+        if kind == 'pause':
+            segments.append(Segment(kind, 0.0, 0.0, duration, line))
+            rate = 0.0
+            continue
+        target = float(match.group(1))
+        start = target if kind == 'hold' else rate
+        segments.append(Segment(kind, start, target, duration, line))
+        rate = target
+    if not segments:
+        raise ValueError("Program is empty")
+    return segments
+
+
+class Timeline:
+    """A program compiled to segment boundaries, rates and cumulative volume"""
+
+    def __init__(self, segments):
+        self.segments = segments
+        durations = np.array([s.duration for s in segments])
+        self.starts = np.r_[0.0, np.cumsum(durations)[:-1]]
+        self.ends = self.starts + durations
+        self.start_rates = np.array([s.start_rate for s in segments])
+        self.end_rates = np.array([s.end_rate for s in segments])
+        # mL per segment, rates are per minute and linear within a segment
+        volumes = (self.start_rates + self.end_rates) / 2 * durations / 60
+        self.volume_before = np.r_[0.0, np.cumsum(volumes)[:-1]]
+        self.total = float(self.ends[-1])
+        self.total_volume = float(volumes.sum())
+
+    def index(self, t):
+        return min(int(np.searchsorted(self.ends, t, side='right')), len(self.segments) - 1)
+
+    def rate_at(self, t):
+        i = self.index(t)
+        span = self.ends[i] - self.starts[i]
+        frac = min(max((t - self.starts[i]) / span, 0.0), 1.0) if span > 0 else 1.0
+        return float(self.start_rates[i] + (self.end_rates[i] - self.start_rates[i]) * frac)
+
+    def volume_at(self, t):
+        """Volume the program should have delivered by t"""
+        i = self.index(t)
+        dt = min(max(t - self.starts[i], 0.0), self.ends[i] - self.starts[i])
+        return float(self.volume_before[i] + (self.start_rates[i] + self.rate_at(t)) / 2 * dt / 60)
+
+
+def program_id(text):
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+class ProgramRunner(Thread):
+    """Runs a perfusion program on a dosing.Pump.
+
+    Constant segments cost one rate change and a sleep until the next
+    boundary. Ramps are followed by updating the flow every
+    `ramp_interval` seconds, and the step engine slews between those
+    updates at the stepper's acceleration. Progress and the pump odometer
+    are checkpointed to `state_path` at every boundary and every
+    `checkpoint` seconds, so ProgramRunner.resume() can continue after a
+    restart and still report the volume delivered by the whole program.
+    """
+
+    def __init__(self, pump, text, state_path=None, start_at=0.0, odometer=0, ramp_interval=0.5,
+                 checkpoint=10.0):
+        super().__init__(daemon=True)
+        self.pump = pump
+        self.text = text
+        self.timeline = Timeline(parse_program(text))
+        self.state_path = state_path
+        self.start_at = start_at
+        self.odometer = odometer  # pump steps made before start_at
+        self.ramp_interval = ramp_interval
+        self.checkpoint = checkpoint
+        self.stopped = Event()
+        self.flowing = False
+        self.started = None
+        self.finished = False
+
+    @classmethod
+    def resume(cls, pump, state_path, **kwargs):
+        """Runner continuing from the checkpoint in state_path"""
+        with open(state_path) as f:
+            state = json.load(f)
+        if state['program_id'] != program_id(state['program']):
+            raise ValueError(f"{state_path} is corrupt, program does not match its id")
+        if state.get('finished'):
+            raise ValueError("Program already finished")
+        print(f"Resuming program at {state['elapsed']:.0f} s of {state['total']:.0f} s, "
+              f"{state['delivered_ml']:.2f} mL delivered")
+        return cls(pump, state['program'], state_path, start_at=state['elapsed'], odometer=state['odometer'],
+                   **kwargs)
+
+    def elapsed(self):
+        if self.started is None:
+            return self.start_at
+        return min(self.start_at + time.monotonic() - self.started, self.timeline.total)
+
+    def position(self):
+        """Where the program is: segment, time, current and expected values"""
+        t = self.elapsed()
+        i = self.timeline.index(t)
+        return {
+            'segment': i,
+            'segments': len(self.timeline.segments),
+            'step': self.timeline.segments[i].text,
+            'elapsed': t,
+            'remaining': self.timeline.total - t,
+            'rate': self.timeline.rate_at(t),
+            'expected_ml': self.timeline.volume_at(t),
+            'total_ml': self.timeline.total_volume,
+            'delivered_ml': self.pump.delivered_ml,
+            'finished': self.finished,
+        }
+
+    def stop(self):
+        """Stop the pump and keep the checkpoint, resume() picks it up later"""
+        self.stopped.set()
+
+    def _apply(self, rate):
+        if rate <= 0:
+            if self.flowing:
+                self.pump.stop_flow()
+                self.flowing = False
+            return
+        self.pump.set_flow(rate)
+        if not self.flowing:
+            self.pump.start_flow()
+            self.flowing = True
+
+    def _save(self):
+        if self.state_path is None:
+            return
+        state = {
+            'program': self.text,
+            'program_id': program_id(self.text),
+            'elapsed': self.elapsed(),
+            'total': self.timeline.total,
+            'odometer': self.pump.odometer,
+            'delivered_ml': self.pump.delivered_ml,
+            'finished': self.finished,
+            'saved': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def run(self):
+        self.pump.reset_odometer(self.odometer)
+        self.started = time.monotonic()
+        next_save = 0.0
+        try:
+            while not self.stopped.is_set():
+                t = self.elapsed()
+                if t >= self.timeline.total:
+                    self.finished = True
+                    break
+                i = self.timeline.index(t)
+                end = float(self.timeline.ends[i])
+                if self.timeline.segments[i].kind == 'ramp':
+                    # The rate half way to the next update delivers the ramp's volume,
+                    # and a ramp up from rest doesn't open with a step period of seconds
+                    wake = min(t + self.ramp_interval, end)
+                    self._apply(self.timeline.rate_at((t + wake) / 2))
+                else:
+                    wake = end
+                    self._apply(self.timeline.rate_at(t))
+                if t >= next_save:
+                    self._save()
+                    next_save = t + self.checkpoint
+                self.stopped.wait(max(min(wake, next_save) - self.elapsed(), 0.0))
+        finally:
+            if self.flowing:
+                self.pump.stop_flow()
+                self.flowing = False
+                # Steps made while ramping down belong in the checkpoint too
+                self.pump.wait_stopped(self.pump.stop_time() + 1.0)
+            self._save()
+        status = "Program finished" if self.finished else f"Program stopped at {self.elapsed():.0f} s"
+        print(f"{status}, {self.pump.delivered_ml:.2f} mL delivered")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a perfusion program and show its timeline")
+    parser.add_argument('program', help="text file, one step per line")
+    args = parser.parse_args()
+
+    with open(args.program) as f:
+        timeline = Timeline(parse_program(f.read()))
+    for segment, start, before in zip(timeline.segments, timeline.starts, timeline.volume_before):
+        print(f"{start / 60:8.1f} min  {before:8.2f} mL  {segment.text}")
+    print(f"{timeline.total / 60:8.1f} min  {timeline.total_volume:8.2f} mL  end")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+
+def edges(timeline, pin):
+    """(rising, falling) edge times in ns, repeated writes of a level ignored"""
+    times, pins, levels = timeline.view()
+    mask = pins == pin
+    t = times[mask]
+    level = levels[mask]
+    previous = np.r_[0, level[:-1]]  # pins start LOW
+    change = level != previous
+    return t[change & (level == 1)], t[change & (level == 0)]
+
+
+def step_periods(timeline, pul):
+    rising, _ = edges(timeline, pul)
+    return np.diff(rising)
+
+
+def pulse_widths(timeline, pul):
+    """HIGH time of every complete pulse, ns"""
+    rising, falling = edges(timeline, pul)
+    idx = np.searchsorted(falling, rising)
+    valid = idx < len(falling)
+    return falling[idx[valid]] - rising[valid]
+
+
+def jitter(periods, expected=None):
+    """Spread of step periods around `expected` (ns), or their median"""
+    if len(periods) == 0:
+        return {'std_ns': 0.0, 'p2p_ns': 0, 'max_dev_ns': 0.0}
+    reference = np.median(periods) if expected is None else expected
+    deviation = periods - reference
+    return {
+        'std_ns': float(periods.std()),
+        'p2p_ns': int(periods.max() - periods.min()),
+        'max_dev_ns': float(np.abs(deviation).max()),
+    }
+
+
+def dir_setup_violations(timeline, pul, dir_pin, setup_ns=5000):
+    """PUL rising edges less than setup_ns after a DIR change.
+
+    The TB6600 needs DIR stable for 5 µs before the step edge, a closer
+    edge may be taken in the old direction. Returns (edge times, gaps).
+    """
+    rising, _ = edges(timeline, pul)
+    dir_rising, dir_falling = edges(timeline, dir_pin)
+    changes = np.sort(np.r_[dir_rising, dir_falling])
+    if len(changes) == 0 or len(rising) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    last = np.searchsorted(changes, rising, side='right') - 1
+    has_change = last >= 0
+    gaps = np.full(len(rising), np.iinfo(np.int64).max)
+    gaps[has_change] = rising[has_change] - changes[last[has_change]]
+    bad = gaps < setup_ns
+    return rising[bad], gaps[bad]
+
+
+def analyze(timeline, pul, dir_pin=None, expected_rate=None):
+    """Summary of one stepper's pulse train"""
+    periods = step_periods(timeline, pul)
+    widths = pulse_widths(timeline, pul)
+    expected = 1e9 / expected_rate if expected_rate else None
+    stats = {
+        'steps': len(widths),
+        'rate': 1e9 / periods.mean() if len(periods) else 0.0,
+        'expected_rate': expected_rate,
+        'min_width_ns': int(widths.min()) if len(widths) else 0,
+        'mean_width_ns': float(widths.mean()) if len(widths) else 0.0,
+        'dropped': timeline.dropped,
+    }
+    stats.update(jitter(periods, expected))
+    if dir_pin is not None:
+        violations, _ = dir_setup_violations(timeline, pul, dir_pin)
+        stats['dir_setup_violations'] = len(violations)
+    return stats
+
+
+def format_report(stats):
+    lines = [f"Steps:       {stats['steps']}"]
+    if stats['expected_rate']:
+        lines.append(f"Rate:        {stats['rate']:.1f} steps/s (commanded {stats['expected_rate']:.1f})")
+    else:
+        lines.append(f"Rate:        {stats['rate']:.1f} steps/s")
+    lines.append(f"Jitter:      {stats['std_ns'] / 1e3:.1f} µs std, {stats['p2p_ns'] / 1e3:.1f} µs p-p, "
+                 f"{stats['max_dev_ns'] / 1e3:.1f} µs worst")
+    lines.append(f"Pulse width: {stats['min_width_ns'] / 1e3:.1f} µs min, {stats['mean_width_ns'] / 1e3:.1f} µs mean")
+    if 'dir_setup_violations' in stats:
+        lines.append(f"DIR setup:   {stats['dir_setup_violations']} violations")
+    if stats['dropped']:
+        lines.append(f"Timeline full, {stats['dropped']} edges not recorded")
+    return '\n'.join(lines)
+
+
+class BenchStepper:
+    """Just the TB6600_Stepper attributes the step engines use"""
+
+    def __init__(self, GPIO, pul=8, dir_pin=10, steps_per_rev=400, rpm=60, accel=800):
+        self.GPIO = GPIO
+        self.PUL = pul
+        self.DIR = dir_pin
+        self.steps_per_rev = steps_per_rev
+        self.accel = accel
+        self.profile = 'trapezoidal'
+        self.delay = 30/(steps_per_rev*rpm)
+
+    def enable(self):
+        pass
+
+    def set_direction(self, direction):
+        self.GPIO.output(self.DIR, self.GPIO.HIGH if direction else self.GPIO.LOW)
+
+    def set_rpm(self, rpm):
+        if rpm <= 0:
+            raise ValueError("RPM must be greater than 0")
+        self.delay = 30/(self.steps_per_rev*rpm)
+
+    def step_rate(self):
+        return 1 / (2 * self.delay)
+
+    def get_rpm(self):
+        return 30/(self.steps_per_rev*self.delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure a step loop against the recording fake GPIO")
+    parser.add_argument('--engine', choices=('sleep', 'runner', 'scheduler'), default='runner',
+                        help="sleep: the original HIGH/sleep/LOW/sleep loop")
+    parser.add_argument('--rpm', type=float, default=60)
+    parser.add_argument('--steps-per-rev', type=int, default=400)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--accel', type=float, default=1e9,
+                        help="steps/s^2, the default skips the ramp so jitter is measured at cruise speed")
+    args = parser.parse_args()
+
+    os.environ['GPIO_BACKEND'] = 'fake'
+    import fake_gpio
+    from gpio_backend import GPIO
+
+    stepper = BenchStepper(GPIO, steps_per_rev=args.steps_per_rev, rpm=args.rpm, accel=args.accel)
+    fake_gpio.reset()
+    if args.engine == 'sleep':
+        end = time.monotonic() + args.seconds
+        while time.monotonic() < end:
+            GPIO.output(stepper.PUL, GPIO.HIGH)
+            time.sleep(stepper.delay)
+            GPIO.output(stepper.PUL, GPIO.LOW)
+            time.sleep(stepper.delay)
+    elif args.engine == 'runner':
+        from step_runner import StepRunner
+        runner = StepRunner(stepper)
+        runner.start()
+        runner.run_motor(True)
+        time.sleep(args.seconds)
+        runner.shutdown()
+        runner.join()
+    else:
+        from motion_scheduler import MotionScheduler
+        scheduler = MotionScheduler()
+        scheduler.start()
+        count = int(args.seconds * stepper.step_rate())
+        scheduler.move(stepper, [2 * stepper.delay] * count).wait()
+        scheduler.shutdown()
+
+    stats = analyze(fake_gpio.timeline, stepper.PUL, stepper.DIR, stepper.step_rate())
+    print(f"{args.engine} engine, {args.rpm} RPM at {args.steps_per_rev} steps/rev")
+    print(format_report(stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
-import RPi.GPIO as GPIO
+from gpio_backend import GPIO
 import time
 
+from microstep import load_microsteps
+from motion_profile import plan_move
+
 class TB6600_Stepper:
     def __init__(self, pul_pin, dir_pin, ena_pin=None):
         self.PUL = pul_pin
@@ -10,6 +13,8 @@ class TB6600_Stepper:
         self.steps_per_rev = 400 # SW 3 & SW 6 is OFF 200
         self.microsteps = 1
         self.delay = 0.005
+        self.accel = 800  # steps/s^2, ramp moves so the pump doesn't stall
+        self.profile = 'trapezoidal'  # or 's-curve'
 
         try:
             # Use BOARD numbering instead of BCM to avoid conflicts
@@ -49,10 +54,14 @@ class TB6600_Stepper:
 
         if rpm <= 0:
             raise ValueError("RPM must be greater than 0")
-        self.delay = 60/(self.steps_per_rev*rpm)
+        self.delay = 30/(self.steps_per_rev*rpm)  # half a step period, HIGH then LOW
 
     def get_rpm(self):
-        return 60/(self.steps_per_rev*self.delay)
+        return 30/(self.steps_per_rev*self.delay)
+
+    def step_rate(self):
+        """Cruise rate in steps/s, each step is a HIGH and a LOW of `delay`"""
+        return 1 / (2 * self.delay)
 
     def step(self, steps=1):
         if steps == 0:
@@ -66,18 +75,22 @@ class TB6600_Stepper:
 
         print(f"Moving {steps} steps {'forward' if direction else 'backward'}")
 
-        for i in range(steps):
+        # Whole move is timed up front, the loop only toggles the pin and sleeps
+        intervals = plan_move(steps, self.step_rate(), self.accel, profile=self.profile).tolist()
+        for i, interval in enumerate(intervals):
+            half = interval / 2
             GPIO.output(self.PUL, GPIO.HIGH)
-            time.sleep(self.delay)
+            time.sleep(half)
             GPIO.output(self.PUL, GPIO.LOW)
-            time.sleep(self.delay)
+            time.sleep(half)
 
             # Show progress every 50 steps
             if (i + 1) % 50 == 0:
                 print(f"Completed {i + 1}/{steps} steps")
 
     def rotate_degrees(self, degrees, direction=True):
-        steps = int((degrees / 360) * self.steps_per_rev * self.microsteps)
+        # steps_per_rev already counts microsteps, see microstep.apply_microsteps
+        steps = int((degrees / 360) * self.steps_per_rev)
         self.step(steps if direction else -steps)
 
     def cleanup(self):
@@ -86,6 +99,7 @@ class TB6600_Stepper:
         print("GPIO cleanup completed")
 
 stepper  = TB6600_Stepper(pul_pin=8, dir_pin=10, ena_pin=13)
+load_microsteps(stepper)
 
 stepper.set_rpm(60)
 
@@ -1,4 +1,8 @@
-import RPi.GPIO as GPIO
+from startup import after_first_frame, in_background, mark, preload
+# numpy (for the motion profiles) loads while Kivy sets up the window
+preload('numpy')
+
+from gpio_backend import FAKE, GPIO
 import time
 import kivy
 from kivy.app import App
@@ -15,6 +19,11 @@ from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.graphics import Color, Rectangle
 
+from microstep import load_microsteps, max_rpm
+from motion_profile import plan_move
+from step_runner import StepRunner
+from dosing import Pump
+
 # Set dark theme colors
 Window.clearcolor = (0.1, 0.1, 0.1, 1)  # Dark background
 
@@ -27,7 +36,11 @@ class TB6600_Stepper:
         self.steps_per_rev = 400 # SW 3 & SW 6 is OFF 200
         self.microsteps = 1
         self.delay = 0.005
+        self.accel = 800  # steps/s^2, ramp moves so the pump doesn't stall
+        self.profile = 'trapezoidal'  # or 's-curve'
+        self.ready = False  # pins are set up by setup_pins(), off the UI thread
 
+    def setup_pins(self):
         try:
             # Use BOARD numbering instead of BCM to avoid conflicts
             GPIO.setmode(GPIO.BOARD)
@@ -45,7 +58,8 @@ class TB6600_Stepper:
             GPIO.output(self.PUL, GPIO.LOW)
             GPIO.output(self.DIR, GPIO.LOW)
 
-            print(f"Stepper initialized on pins PUL:{pul_pin}, DIR:{dir_pin}")
+            self.ready = True
+            print(f"Stepper initialized on pins PUL:{self.PUL}, DIR:{self.DIR}")
 
         except Exception as e:
             print(f"Initialization error: {e}")
@@ -67,10 +81,14 @@ class TB6600_Stepper:
         if rpm <= 0:
             raise ValueError("RPM must be greater than 0")
 
-        self.delay = 60/(self.steps_per_rev*rpm)
+        self.delay = 30/(self.steps_per_rev*rpm)  # half a step period, HIGH then LOW
 
     def get_rpm(self):
-        return 60/(self.steps_per_rev*self.delay)
+        return 30/(self.steps_per_rev*self.delay)
+
+    def step_rate(self):
+        """Cruise rate in steps/s, each step is a HIGH and a LOW of `delay`"""
+        return 1 / (2 * self.delay)
 
     def step(self, steps=1):
         if steps == 0:
@@ -84,21 +102,27 @@ class TB6600_Stepper:
 
         print(f"Moving {steps} steps {'forward' if direction else 'backward'}")
 
-        for i in range(steps):
+        # Whole move is timed up front, the loop only toggles the pin and sleeps
+        intervals = plan_move(steps, self.step_rate(), self.accel, profile=self.profile).tolist()
+        for i, interval in enumerate(intervals):
+            half = interval / 2
             GPIO.output(self.PUL, GPIO.HIGH)
-            time.sleep(self.delay)
+            time.sleep(half)
             GPIO.output(self.PUL, GPIO.LOW)
-            time.sleep(self.delay)
+            time.sleep(half)
 
             # Show progress every 50 steps
             if (i + 1) % 50 == 0:
                 print(f"Completed {i + 1}/{steps} steps")
 
     def rotate_degrees(self, degrees, direction=True):
-        steps = int((degrees / 360) * self.steps_per_rev * self.microsteps)
+        # steps_per_rev already counts microsteps, see microstep.apply_microsteps
+        steps = int((degrees / 360) * self.steps_per_rev)
         self.step(steps if direction else -steps)
 
     def cleanup(self):
+        if not self.ready:
+            return
         self.disable()
         GPIO.cleanup()
         print("GPIO cleanup completed")
@@ -122,6 +146,12 @@ class StepperControlPanel(BoxLayout):
         )
         self.status_layout.add_widget(Label(text='Status:', font_size='18sp', color=(0.8, 0.8, 0.8, 1)))
         self.status_layout.add_widget(self.status_indicator)
+        self.link_label = Label(
+            text='Driver: not connected',
+            font_size='16sp',
+            color=(0.8, 0.6, 0.2, 1)
+        )
+        self.status_layout.add_widget(self.link_label)
         self.add_widget(self.status_layout)
 
         # Control buttons
@@ -156,7 +186,8 @@ class StepperControlPanel(BoxLayout):
         )
         self.rpm_slider = Slider(
             min=1,
-            max=100,
+            # Capped at what this host can pulse at the driver's microstep setting
+            max=max(1, min(100, int(max_rpm(self.stepper)))),
             value=self.stepper.get_rpm(),
             step=1,
             value_track=True,
@@ -166,6 +197,12 @@ class StepperControlPanel(BoxLayout):
 
         self.rpm_layout.add_widget(self.rpm_label)
         self.rpm_layout.add_widget(self.rpm_slider)
+        self.speed_label = Label(
+            text='Achieved: -- RPM',
+            font_size='14sp',
+            color=(0.6, 0.6, 0.6, 1)
+        )
+        self.rpm_layout.add_widget(self.speed_label)
         self.add_widget(self.rpm_layout)
 
         # Direction Control
@@ -210,9 +247,11 @@ class StepperControlPanel(BoxLayout):
 
         self.step_buttons_layout = GridLayout(cols=3, rows=2, size_hint=(1, 0.8))
 
+        # Angles follow the driver's steps per revolution instead of fixed counts
+        spr = self.stepper.steps_per_rev
         step_buttons = [
             ('1 Step', 1), ('10 Steps', 10), ('100 Steps', 100),
-            ('1 Rev', 400), ('90°', 100), ('180°', 200)
+            ('1 Rev', spr), ('90°', spr // 4), ('180°', spr // 2)
         ]
 
         for text, steps in step_buttons:
@@ -239,33 +278,125 @@ class StepperControlPanel(BoxLayout):
         self.manual_layout.add_widget(self.manual_btn)
         self.add_widget(self.manual_layout)
 
+        # Dosing
+        self.dose_layout = BoxLayout(orientation='vertical', size_hint=(1, 0.2))
+        self.dose_label = Label(
+            text='DOSE   Delivered: 0.000 mL',
+            font_size='18sp',
+            color=(0.8, 0.8, 0.8, 1)
+        )
+        self.dose_buttons_layout = BoxLayout(orientation='horizontal', size_hint=(1, 0.5))
+        for ml in (0.1, 1, 5):
+            btn = Button(
+                text=f'{ml} mL',
+                background_color=(0.4, 0.6, 0.4, 1),
+                font_size='14sp'
+            )
+            btn.bind(on_press=lambda instance, v=ml: self.start_dose(v))
+            self.dose_buttons_layout.add_widget(btn)
+        self.cancel_dose_btn = Button(
+            text='CANCEL',
+            background_color=(0.8, 0.2, 0.2, 1),
+            font_size='14sp'
+        )
+        self.cancel_dose_btn.bind(on_press=lambda x: self.cancel_dose())
+        self.dose_buttons_layout.add_widget(self.cancel_dose_btn)
+        self.dose_progress = ProgressBar(max=1, value=0, size_hint=(1, 0.2))
+
+        self.dose_layout.add_widget(self.dose_label)
+        self.dose_layout.add_widget(self.dose_buttons_layout)
+        self.dose_layout.add_widget(self.dose_progress)
+        self.add_widget(self.dose_layout)
+
         # Initialize state
         self.motor_running = False
         self.current_direction = True  # Clockwise
 
+        # Continuous rotation runs on its own thread, off the Kivy clock
+        self.runner = StepRunner(stepper)
+        self.runner.start()
+        self.pump = Pump(stepper, runner=self.runner)
+        self.dose = None
+
+    def connect(self):
+        """Set up the driver's pins off the UI thread, the status bar shows how it went"""
+        self.link_label.text = 'Driver: connecting...'
+        in_background('stepper', self.stepper.setup_pins, self.on_connected)
+
+    def on_connected(self, result, error):
+        if error is None:
+            self.stepper.set_direction(self.current_direction)
+            if FAKE:
+                # Nothing reaches the motor, say so where the operator looks
+                self.link_label.text = f'Driver: FAKE GPIO, PUL {self.stepper.PUL} not connected'
+                self.link_label.color = (1, 0.8, 0.2, 1)
+            else:
+                self.link_label.text = f'Driver: ready on PUL {self.stepper.PUL}'
+                self.link_label.color = (0.3, 1, 0.3, 1)
+        else:
+            self.link_label.text = f'Driver: not connected ({error})'
+            self.link_label.color = (1, 0.3, 0.3, 1)
+
+    def require_driver(self):
+        if not self.stepper.ready:
+            self.show_error("Not Connected", "The stepper driver isn't set up yet")
+        return self.stepper.ready
+
     def start_motor(self, instance):
+        if not self.require_driver():
+            return
+        if self.dose is not None and not self.dose.done():
+            self.show_error("Pump Busy", "Wait for the dose to finish or cancel it")
+            return
         if not self.motor_running:
             self.motor_running = True
             self.status_indicator.text = 'RUNNING'
             self.status_indicator.color = (0.3, 1, 0.3, 1)
-            # Start continuous rotation
-            Clock.schedule_interval(self.continuous_step, 1.0 / 60.0)  # Update at 60Hz
+            self.runner.run_motor(self.current_direction)
+            Clock.schedule_interval(self.update_speed, 0.5)
 
     def stop_motor(self, instance):
         if self.motor_running:
             self.motor_running = False
             self.status_indicator.text = 'STOPPED'
             self.status_indicator.color = (1, 0.3, 0.3, 1)
-            Clock.unschedule(self.continuous_step)
+            self.runner.stop_motor()
+            Clock.unschedule(self.update_speed)
+            self.speed_label.text = 'Achieved: -- RPM'
+
+    def update_speed(self, dt):
+        stats = self.runner.stats()
+        self.speed_label.text = (f"Achieved: {stats['achieved_rpm']:.1f} / {stats['commanded_rpm']:.1f} RPM, "
+                                 f"missed {stats['missed']}")
+        self.update_delivered()
 
-    def continuous_step(self, dt):
-        # Move one step continuously while motor is running
-        self.stepper.enable()
-        self.stepper.set_direction(self.current_direction)
-        GPIO.output(self.stepper.PUL, GPIO.HIGH)
-        time.sleep(self.stepper.delay)
-        GPIO.output(self.stepper.PUL, GPIO.LOW)
-        time.sleep(self.stepper.delay)
+    def update_delivered(self):
+        self.dose_label.text = f'DOSE   Delivered: {self.pump.delivered_ml:.3f} mL'
+
+    def start_dose(self, ml):
+        if not self.require_driver():
+            return
+        try:
+            self.dose = self.pump.dose(ml, on_complete=lambda handle: Clock.schedule_once(self.dose_finished))
+        except (RuntimeError, ValueError) as e:
+            self.show_error("Dose Error", str(e))
+            return
+        self.dose_progress.value = 0
+        Clock.schedule_interval(self.update_dose, 0.2)
+
+    def cancel_dose(self):
+        if self.dose is not None:
+            self.dose.cancel()
+
+    def update_dose(self, dt):
+        self.dose_progress.value = self.dose.progress
+        self.update_delivered()
+
+    def dose_finished(self, dt):
+        Clock.unschedule(self.update_dose)
+        self.update_dose(dt)
+        if self.dose.error is not None:
+            self.show_error("Dose Error", str(self.dose.error))
 
     def update_rpm(self, instance, value):
         try:
@@ -276,12 +407,18 @@ class StepperControlPanel(BoxLayout):
 
     def set_direction(self, direction):
         self.current_direction = direction
-        self.stepper.set_direction(direction)
+        # While running the runner ramps down, flips DIR and ramps back up
+        self.runner.set_direction(direction)
+        if self.stepper.ready and not self.motor_running:
+            self.stepper.set_direction(direction)
 
     def move_steps(self, steps):
+        if not self.require_driver():
+            return
         if not self.motor_running:  # Only allow manual steps when not running continuously
             try:
-                self.stepper.step(steps)
+                self.pump.jog(steps)
+                self.update_delivered()
             except Exception as e:
                 self.show_error("Step Error", str(e))
 
@@ -295,19 +432,31 @@ class StepperControlPanel(BoxLayout):
         popup.open()
 
 
+def create_stepper():
+    """The pump's stepper at its saved microstep setting, pins not set up yet"""
+    # Replace these pin numbers with your actual GPIO pins
+    stepper = TB6600_Stepper(pul_pin=8, dir_pin=10, ena_pin=15)
+    load_microsteps(stepper)
+    return stepper
+
+
 class StepperControlApp(App):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # Initialize stepper with your GPIO pins
-        # Replace these pin numbers with your actual GPIO pins
-        self.stepper = TB6600_Stepper(pul_pin=8, dir_pin=10, ena_pin=15)
+        self.stepper = create_stepper()
 
     def build(self):
         self.title = "TB6600 Stepper Motor Controller"
-        return StepperControlPanel(stepper=self.stepper)
+        panel = StepperControlPanel(stepper=self.stepper)
+        mark('panel built')
+        return panel
+
+    def on_start(self):
+        after_first_frame(self.root.connect)
 
     def on_stop(self):
         # Cleanup when app closes
+        self.root.runner.shutdown()
         self.stepper.cleanup()
 
 
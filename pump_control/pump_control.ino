@@ -1,19 +1,188 @@
 #define dirPin 2
 #define stepPin 3
+#define enaPin 4
+
+// Serial protocol, one ASCII command per line ending in '\r' (as used by
+// the amplifier), every command is answered with one '\r' terminated line:
+//   setRATE<steps/s>     cruise rate                 -> OK
+//   setACCEL<steps/s^2>  ramp rate, 0 for none       -> OK
+//   setDIR<0|1>          direction                   -> OK
+//   setENA<0|1>          driver enable               -> OK
+//   MOVE<n>              n steps in the current dir  -> OK
+//   RUN                  run until STOP              -> OK
+//   STOP                 ramp down and stop          -> OK
+//   HALT                 stop at once, no ramp       -> OK
+//   getSTATUS            -> STATUS <position> <remaining> <rate> <dir> <ena> <state>
+// Anything else is answered with ERR <command>.
+
+#define IDLE 0
+#define MOVING 1
+#define RUNNING 2
+#define STOPPING 3
+
+const float MIN_RATE = 50.0;  // start/stop speed in steps/s
+
+char line[32];
+byte lineLen = 0;
+
+float targetRate = 625.0;  // the old fixed 800 us half period
+float accel = 2000.0;
+float rate = 0.0;
+long position = 0;
+unsigned long remaining = 0;
+byte state = IDLE;
+bool forward = true;
+bool enabled = false;
+bool pulseHigh = false;
+unsigned long lastEdge = 0;
 
 void setup() {
   // Declare pins as output:
   pinMode(stepPin, OUTPUT);
   pinMode(dirPin, OUTPUT);
+  pinMode(enaPin, OUTPUT);
 
   // Set the spinning direction CW/CCW:
   digitalWrite(dirPin, HIGH);
+  digitalWrite(enaPin, HIGH);  // active low, start disabled
+
+  Serial.begin(115200);
 }
 
-void loop() {
-  // These four lines result in 1 step:
-  digitalWrite(stepPin, HIGH);
-  delayMicroseconds(800);
+void startMotion(byte newState) {
+  if (state == IDLE) {
+    rate = accel > 0 ? min(MIN_RATE, targetRate) : targetRate;
+    lastEdge = micros();
+    pulseHigh = false;
+  }
+  state = newState;
+}
+
+void stopNow() {
   digitalWrite(stepPin, LOW);
-  delayMicroseconds(800);
-}
\ No newline at end of file
+  pulseHigh = false;
+  state = IDLE;
+  remaining = 0;
+  rate = 0.0;
+}
+
+// Called after every full step: ramp towards the target, or towards zero
+// when stopping or when a move needs the remaining steps to decelerate
+void updateRate() {
+  if (state == MOVING && remaining == 0) {
+    stopNow();
+    return;
+  }
+  bool slowing = state == STOPPING ||
+                 (state == MOVING && accel > 0 && remaining <= rate * rate / (2 * accel));
+  if (accel <= 0) {
+    if (state == STOPPING) stopNow();
+    else rate = targetRate;
+    return;
+  }
+  if (slowing) {
+    rate -= accel / rate;
+    if (rate <= MIN_RATE) {
+      if (state == STOPPING) {
+        stopNow();
+        return;
+      }
+      rate = MIN_RATE;
+    }
+  } else if (rate < targetRate) {
+    rate = min(targetRate, rate + accel / rate);
+  } else {
+    rate = max(targetRate, rate - accel / rate);
+  }
+}
+
+void reply(const char *text) {
+  Serial.print(text);
+  Serial.print('\r');
+}
+
+void handleCommand(char *cmd) {
+  if (strncmp(cmd, "setRATE", 7) == 0) {
+    float value = atof(cmd + 7);
+    if (value <= 0) return reply("ERR setRATE");
+    targetRate = value;
+  } else if (strncmp(cmd, "setACCEL", 8) == 0) {
+    accel = max(0.0, atof(cmd + 8));
+  } else if (strncmp(cmd, "setDIR", 6) == 0) {
+    if (state != IDLE) return reply("ERR busy");
+    forward = atoi(cmd + 6) != 0;
+    digitalWrite(dirPin, forward ? HIGH : LOW);
+  } else if (strncmp(cmd, "setENA", 6) == 0) {
+    enabled = atoi(cmd + 6) != 0;
+    digitalWrite(enaPin, enabled ? LOW : HIGH);
+    if (!enabled) stopNow();
+  } else if (strncmp(cmd, "MOVE", 4) == 0) {
+    long steps = atol(cmd + 4);
+    if (steps <= 0) return reply("ERR MOVE");
+    remaining = steps;
+    startMotion(MOVING);
+  } else if (strcmp(cmd, "RUN") == 0) {
+    startMotion(RUNNING);
+  } else if (strcmp(cmd, "STOP") == 0) {
+    if (state != IDLE) state = STOPPING;
+  } else if (strcmp(cmd, "HALT") == 0) {
+    stopNow();
+  } else if (strcmp(cmd, "getSTATUS") == 0) {
+    Serial.print("STATUS ");
+    Serial.print(position);
+    Serial.print(' ');
+    Serial.print(remaining);
+    Serial.print(' ');
+    Serial.print((long)rate);
+    Serial.print(' ');
+    Serial.print(forward ? 1 : 0);
+    Serial.print(' ');
+    Serial.print(enabled ? 1 : 0);
+    Serial.print(' ');
+    Serial.print(state);
+    Serial.print('\r');
+    return;
+  } else {
+    Serial.print("ERR ");
+    return reply(cmd);
+  }
+  reply("OK");
+}
+
+void readSerial() {
+  while (Serial.available()) {
+    char c = Serial.read();
+    if (c == '\r' || c == '\n') {
+      if (lineLen > 0) {
+        line[lineLen] = '\0';
+        handleCommand(line);
+        lineLen = 0;
+      }
+    } else if (lineLen < sizeof(line) - 1) {
+      line[lineLen++] = c;
+    }
+  }
+}
+
+void loop() {
+  readSerial();
+  if (state == IDLE) return;
+
+  // Edges are scheduled from the previous edge, not from when loop() got here
+  unsigned long half = (unsigned long)(500000.0 / rate);
+  unsigned long now = micros();
+  if (now - lastEdge < half) return;
+  lastEdge += half;
+  if (now - lastEdge > half) lastEdge = now;  // fell behind on serial, don't burst
+
+  if (!pulseHigh) {
+    digitalWrite(stepPin, HIGH);
+    pulseHigh = true;
+    position += forward ? 1 : -1;
+    if (state == MOVING) remaining--;
+  } else {
+    digitalWrite(stepPin, LOW);
+    pulseHigh = false;
+    updateRate();
+  }
+}
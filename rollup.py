@@ -0,0 +1,225 @@
+import os
+
+import numpy as np
+
+from telemetry_store import ColumnStore, to_epoch
+
+RESOLUTIONS = (1, 60, 3600)  # seconds: 1 s -> 1 min -> 1 h
+CHANNELS = ('temperature', 'load_power', 'voltage')
+
+
+def raw_stats(values):
+    """Per-sample (min, max, sum, count) so raw rows and buckets merge the same way"""
+    v = np.asarray(values, dtype=float)
+    valid = ~np.isnan(v)
+    return v, v, np.where(valid, v, 0.0), valid.astype(np.int64)
+
+
+def reduce_buckets(times, stats, resolution):
+    """Merge consecutive rows falling into the same resolution-wide bucket"""
+    buckets = np.floor(np.asarray(times) / resolution) * resolution
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    reduced = {}
+    for ch, (mins, maxs, sums, counts) in stats.items():
+        # fmin/fmax skip NaN, so a bucket only goes NaN when every sample was missing
+        reduced[ch] = (np.fmin.reduceat(mins, starts), np.fmax.reduceat(maxs, starts),
+                       np.add.reduceat(sums, starts), np.add.reduceat(counts, starts))
+    return buckets[starts], reduced
+
+
+class RollupTier:
+    """min/max/sum/count buckets at one resolution, stored as a ColumnStore.
+
+    The newest bucket stays open in memory until a later sample closes it,
+    only closed buckets are written and passed on to the next tier.
+    """
+
+    def __init__(self, path, resolution, channels=CHANNELS, readonly=False):
+        self.resolution = resolution
+        self.channels = tuple(channels)
+        columns = {}
+        for ch in self.channels:
+            columns[f'{ch}_min'] = 'f4'
+            columns[f'{ch}_max'] = 'f4'
+            columns[f'{ch}_sum'] = 'f8'
+            columns[f'{ch}_count'] = 'u4'
+        self.store = ColumnStore(path, columns=columns, categories={}, grow=4096, readonly=readonly)
+        self.open_time = None
+        self.open = None
+
+    def add(self, times, stats):
+        """Fold rows (or finer buckets) in, returns the buckets this closed"""
+        if len(times) == 0:
+            return times, stats
+        times, stats = reduce_buckets(times, stats, self.resolution)
+        if self.open_time is not None:
+            if times[0] == self.open_time:
+                for ch, (mins, maxs, sums, counts) in stats.items():
+                    o_min, o_max, o_sum, o_count = self.open[ch]
+                    mins[0] = np.fmin(mins[0], o_min[0])
+                    maxs[0] = np.fmax(maxs[0], o_max[0])
+                    sums[0] += o_sum[0]
+                    counts[0] += o_count[0]
+            else:
+                times = np.r_[self.open_time, times]
+                stats = {ch: tuple(np.r_[o, a] for o, a in zip(self.open[ch], stats[ch])) for ch in stats}
+
+        self.open_time = times[-1]
+        self.open = {ch: tuple(a[-1:] for a in arrays) for ch, arrays in stats.items()}
+        closed_times = times[:-1]
+        closed = {ch: tuple(a[:-1] for a in arrays) for ch, arrays in stats.items()}
+        self._write(closed_times, closed)
+        return closed_times, closed
+
+    def finish(self):
+        """Write out the open bucket, returns it for the next tier"""
+        if self.open_time is None:
+            return None
+        times = np.array([self.open_time])
+        stats = self.open
+        self._write(times, stats)
+        self.open_time = None
+        self.open = None
+        return times, stats
+
+    def _write(self, times, stats):
+        if len(times) == 0:
+            return
+        columns = {}
+        for ch, (mins, maxs, sums, counts) in stats.items():
+            columns[f'{ch}_min'] = mins
+            columns[f'{ch}_max'] = maxs
+            columns[f'{ch}_sum'] = sums
+            columns[f'{ch}_count'] = counts
+        self.store.append_columns(times, columns)
+
+    def read(self, t0=None, t1=None, channels=None):
+        """Buckets starting in [t0, t1] with means, min/max/count are views"""
+        rows = self.store.range_slice(t0, t1)
+        result = {'timestamp': self.store.maps['timestamp'][rows], 'resolution': self.resolution}
+        for ch in channels or self.channels:
+            counts = self.store.maps[f'{ch}_count'][rows]
+            sums = self.store.maps[f'{ch}_sum'][rows]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[f'{ch}_mean'] = np.where(counts > 0, sums / counts, np.nan)
+            result[f'{ch}_min'] = self.store.maps[f'{ch}_min'][rows]
+            result[f'{ch}_max'] = self.store.maps[f'{ch}_max'][rows]
+            result[f'{ch}_count'] = counts
+        return result
+
+
+class Rollups:
+    """Cascade of rollup tiers kept next to a run's raw columns"""
+
+    def __init__(self, path, resolutions=RESOLUTIONS, channels=CHANNELS, readonly=False):
+        self.channels = tuple(channels)
+        if readonly:
+            resolutions = [r for r in resolutions if os.path.exists(self.tier_path(path, r))]
+        self.tiers = [RollupTier(self.tier_path(path, r), r, self.channels, readonly)
+                      for r in sorted(resolutions)]
+
+    @staticmethod
+    def tier_path(path, resolution):
+        return os.path.join(path, f'rollup_{resolution}s')
+
+    def add(self, timestamps, values):
+        """Feed raw rows, as passed to ColumnStore.append_columns"""
+        n = len(timestamps)
+        stats = {}
+        for ch in self.channels:
+            column = values.get(ch)
+            if column is None:
+                column = np.full(n, np.nan)
+            stats[ch] = raw_stats([np.nan if v is None else v for v in column])
+        times = np.asarray(timestamps, dtype=float)
+        for tier in self.tiers:
+            times, stats = tier.add(times, stats)
+            if len(times) == 0:
+                break
+
+    def flush(self):
+        for tier in self.tiers:
+            tier.store.flush()
+
+    def close(self):
+        """Close every open bucket, cascading each tier's last buckets into the next"""
+        carry = None
+        for tier in self.tiers:
+            closed = tier.add(*carry) if carry is not None else None
+            carry = _join(closed, tier.finish())
+            tier.store.close()
+
+    def choose(self, t0, t1, points):
+        """Coarsest tier that still gives about `points` buckets over the span"""
+        wanted = (t1 - t0) / max(points, 1)
+        chosen = self.tiers[0]
+        for tier in self.tiers:
+            if tier.resolution <= wanted:
+                chosen = tier
+        return chosen
+
+    def extent(self):
+        timestamps = self.tiers[0].store.column('timestamp') if self.tiers else []
+        if len(timestamps) == 0:
+            return None
+        return float(timestamps[0]), float(timestamps[-1]) + self.tiers[0].resolution
+
+    def query(self, t0=None, t1=None, points=500, channels=None):
+        extent = self.extent()
+        if extent is None:
+            return None
+        t0 = extent[0] if t0 is None else to_epoch(t0)
+        t1 = extent[1] if t1 is None else to_epoch(t1)
+        return self.choose(t0, t1, points).read(t0, t1, channels)
+
+
+def _join(*parts):
+    """Concatenate (times, stats) bucket sets in time order, skipping empty ones"""
+    parts = [p for p in parts if p is not None and len(p[0])]
+    if not parts:
+        return None
+    times = np.concatenate([p[0] for p in parts])
+    stats = {ch: tuple(np.concatenate(arrays) for arrays in zip(*(p[1][ch] for p in parts)))
+             for ch in parts[0][1]}
+    return times, stats
+
+
+def history(store, t0, t1, points=500, channels=CHANNELS):
+    """Rollup buckets across every run of a TelemetryStore that overlaps [t0, t1]"""
+    t0 = to_epoch(t0)
+    t1 = to_epoch(t1)
+    parts = []
+    for run_id in store.run_ids():
+        run_path = store.run_path(run_id)
+        if not os.path.exists(Rollups.tier_path(run_path, RESOLUTIONS[0])):
+            continue
+        rollups = Rollups(run_path, readonly=True, channels=channels)
+        extent = rollups.extent()
+        if extent is None or extent[1] < t0 or extent[0] > t1:
+            continue
+        parts.append(rollups.choose(t0, t1, points).read(t0, t1, channels))
+    if not parts:
+        return None
+    # One resolution for the whole window so the buckets line up
+    resolution = max(p['resolution'] for p in parts)
+    if any(p['resolution'] != resolution for p in parts):
+        parts = [part if part['resolution'] == resolution else _coarsen(part, resolution, channels) for part in parts]
+    merged = {key: np.concatenate([p[key] for p in parts]) for key in parts[0] if key != 'resolution'}
+    merged['resolution'] = resolution
+    return merged
+
+
+def _coarsen(part, resolution, channels):
+    """Re-bucket a finer tier's read() result to a coarser resolution"""
+    stats = {ch: (part[f'{ch}_min'], part[f'{ch}_max'],
+                  np.nan_to_num(part[f'{ch}_mean']) * part[f'{ch}_count'], part[f'{ch}_count'].astype(np.int64))
+             for ch in channels}
+    times, stats = reduce_buckets(part['timestamp'], stats, resolution)
+    result = {'timestamp': times, 'resolution': resolution}
+    for ch, (mins, maxs, sums, counts) in stats.items():
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[f'{ch}_mean'] = np.where(counts > 0, sums / counts, np.nan)
+        result[f'{ch}_min'] = mins
+        result[f'{ch}_max'] = maxs
+        result[f'{ch}_count'] = counts
+    return result
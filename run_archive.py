@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import codec
+from telemetry_logger import TIME_FORMAT
+from telemetry_store import TelemetryStore, to_epoch
+
+
+class RunArchive(TelemetryStore):
+    """TelemetryStore that keeps a catalog of every START/STOP run.
+
+    Each run's data lives in its own run directory. When a run closes, one
+    line of metadata (start/stop time, sound pressure, operation type, peak
+    temperature, delivered energy) is appended to catalog.jsonl, and find()
+    answers queries from that catalog alone.
+    """
+
+    def __init__(self, root='telemetry', **options):
+        super().__init__(root, **options)
+        self.catalog_path = os.path.join(root, 'catalog.jsonl')
+        self.catalog = []
+        if os.path.exists(self.catalog_path):
+            with open(self.catalog_path) as f:
+                self.catalog = [json.loads(line) for line in f if line.strip()]
+        self.info = {}
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.start = None
+        self.stop = None
+        self.samples = 0
+        self.peak = float('nan')
+        self.energy = 0.0
+        self.power_samples = 0
+        self.operations = set()
+        self._last_power = None  # last valid (time, power)
+
+    def write_batch(self, records):
+        super().write_batch(records)
+        t = np.array([r[0] for r in records], dtype=float)
+        temp = np.array([np.nan if r[1] is None else r[1] for r in records], dtype=float)
+        power = np.array([np.nan if r[4] is None else r[4] for r in records], dtype=float)
+        if self.start is None:
+            self.start = t[0]
+        self.stop = t[-1]
+        self.samples += len(t)
+        if not np.all(np.isnan(temp)):
+            self.peak = float(np.fmax(self.peak, np.nanmax(temp)))
+        self.operations.update(r[3] for r in records if r[3] is not None)
+
+        # Trapezoidal integral of load power, continued across batches. Rows
+        # may be swinging-door compressed and samples may be missing, so
+        # interpolate between consecutive valid readings.
+        valid = ~np.isnan(power)
+        t = t[valid]
+        power = power[valid]
+        self.power_samples += len(power)
+        if self._last_power is not None:
+            t = np.r_[self._last_power[0], t]
+            power = np.r_[self._last_power[1], power]
+        if len(t) >= 2:
+            self.energy += float(np.sum((power[1:] + power[:-1]) * np.diff(t)) / 2)
+        if len(t):
+            self._last_power = (t[-1], power[-1])
+
+    def rotate(self, info=None):
+        self.close()
+        self.info = info or {}
+
+    def close(self):
+        run_id = self.current_id if self.current is not None else None
+        super().close()
+        if run_id is not None and self.samples:
+            self._add_entry(run_id)
+        self._reset_stats()
+
+    def _add_entry(self, run_id):
+        if len(self.operations) == 1:
+            operation = next(iter(self.operations))
+        else:
+            operation = 'MIXED' if self.operations else self.info.get('operation')
+        entry = {
+            'run_id': run_id,
+            'start': self.start,
+            'stop': self.stop,
+            'pressure_kpa': self.info.get('pressure_kpa'),
+            'operation': operation,
+            'peak_temperature': None if np.isnan(self.peak) else round(self.peak, 2),
+            # None when the amplifier's power was never read, e.g. PULSED runs
+            'energy_j': round(self.energy, 3) if self.power_samples else None,
+            'samples': self.samples,
+        }
+        self.catalog.append(entry)
+        with open(self.catalog_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def find(self, pressure=None, operation=None, since=None, until=None, min_peak=None):
+        """Catalog entries matching every given filter, oldest first"""
+        since = None if since is None else to_epoch(since)
+        until = None if until is None else to_epoch(until)
+        found = []
+        for entry in self.catalog:
+            if pressure is not None and entry['pressure_kpa'] != pressure:
+                continue
+            if operation is not None and entry['operation'] != operation:
+                continue
+            if since is not None and entry['stop'] < since:
+                continue
+            if until is not None and entry['start'] > until:
+                continue
+            if min_peak is not None and (entry['peak_temperature'] is None or entry['peak_temperature'] < min_peak):
+                continue
+            found.append(entry)
+        return found
+
+    def compact(self, run_id):
+        """Write a closed run as delta/varint chunks next to its raw columns"""
+        store = self.open_run(run_id)
+        path = os.path.join(store.path, 'chunks.lfz')
+        codec.write_compressed(store, path)
+        return path
+
+
+def _format_energy(energy):
+    return '-' if energy is None else f'{energy:.1f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List archived reactor runs")
+    parser.add_argument('--root', default='telemetry')
+    parser.add_argument('--pressure', type=int, help="sound pressure in kPa")
+    parser.add_argument('--operation', choices=['CONTINUOUS', 'PULSED', 'MIXED'])
+    parser.add_argument('--since', help="'YYYY-mm-dd HH:MM:SS'")
+    parser.add_argument('--until', help="'YYYY-mm-dd HH:MM:SS'")
+    parser.add_argument('--min-peak', type=float, help="°C")
+    parser.add_argument('--compact', action='store_true', help="write compressed chunks for the matching runs")
+    args = parser.parse_args()
+
+    archive = RunArchive(args.root)
+    runs = archive.find(args.pressure, args.operation, args.since, args.until, args.min_peak)
+    print(f"{'run':>5} {'start':19} {'dur s':>7} {'kPa':>4} {'operation':>10} {'peak °C':>8} {'energy J':>9}")
+    for entry in runs:
+        start = time.strftime(TIME_FORMAT, time.localtime(entry['start']))
+        peak = entry['peak_temperature']
+        print(f"{entry['run_id']:5d} {start:19} {entry['stop'] - entry['start']:7.0f} "
+              f"{entry['pressure_kpa'] if entry['pressure_kpa'] is not None else '-':>4} {entry['operation'] or '-':>10} "
+              f"{peak if peak is not None else '-':>8} {_format_energy(entry['energy_j']):>9}")
+    print(f"{len(runs)} of {len(archive.catalog)} runs")
+
+    if args.compact:
+        for entry in runs:
+            path = archive.compact(entry['run_id'])
+            raw = sum(os.path.getsize(os.path.join(os.path.dirname(path), name))
+                      for name in os.listdir(os.path.dirname(path))
+                      if name.endswith(('.f8', '.f4', '.u1')) and name != 'index.f8')
+            print(f"run {entry['run_id']}: {raw} -> {os.path.getsize(path)} bytes")
+
+
+if __name__ == '__main__':
+    main()
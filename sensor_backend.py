@@ -0,0 +1,139 @@
+import csv
+import time
+from datetime import datetime
+
+import numpy as np
+
+import ntc
+
+
+class ADCBackend:
+    """Source of normalised (0..1) divider readings for a set of channels"""
+
+    def __init__(self, channels):
+        self.channels = tuple(channels)
+
+    def read(self):
+        """One reading per channel, in channel order"""
+        raise NotImplementedError
+
+    def now(self):
+        return time.time()
+
+    def close(self):
+        pass
+
+
+def mcp3208_request(channel):
+    """3-byte MCP3208 frame: start bit, single ended, channel select"""
+    return [0x06 | (channel >> 2), (channel & 0x03) << 6, 0]
+
+
+def mcp3208_code(reply):
+    """12-bit code from the last 12 bits of a 3-byte reply"""
+    return ((reply[1] & 0x0F) << 8) | reply[2]
+
+
+class GpiozeroADC(ADCBackend):
+    """MCP3208 through gpiozero, as wired on the reactor"""
+
+    def __init__(self, channels):
+        super().__init__(channels)
+        # Imported here so the rest of the pipeline loads off the Pi
+        from gpiozero import MCP3208
+        self.adcs = [MCP3208(channel=ch) for ch in self.channels]
+
+    def read(self):
+        return np.fromiter((adc.value for adc in self.adcs), dtype=float, count=len(self.adcs))
+
+    def close(self):
+        for adc in self.adcs:
+            adc.close()
+
+
+class SpidevADC(ADCBackend):
+    """MCP3208 through spidev directly, skips gpiozero's per-read overhead"""
+
+    def __init__(self, channels, bus=0, device=0, max_speed_hz=1000000):
+        super().__init__(channels)
+        import spidev
+        self.spi = spidev.SpiDev()
+        self.spi.open(bus, device)
+        self.spi.max_speed_hz = max_speed_hz
+        self.requests = [mcp3208_request(ch) for ch in self.channels]
+
+    def read(self):
+        codes = np.empty(len(self.requests))
+        for i, request in enumerate(self.requests):
+            codes[i] = mcp3208_code(self.spi.xfer2(list(request)))
+        return codes / ntc.ADC_MAX
+
+    def close(self):
+        self.spi.close()
+
+
+class SimulatedADC(ADCBackend):
+    """Thermistor divider readings generated from a thermal trace.
+
+    The trace is a pair of (seconds, °C) arrays, interpolated and offset per
+    channel. With realtime=False every read advances a virtual clock by dt,
+    so the acquisition pipeline runs as fast as the host allows.
+    """
+
+    def __init__(self, channels, times, temps, offsets=None, noise=0.0, dt=0.01,
+                 realtime=False, loop=True, coeffs=ntc.DEFAULT_COEFFS, seed=None):
+        super().__init__(channels)
+        self.times = np.asarray(times, dtype=float)
+        self.temps = np.asarray(temps, dtype=float)
+        if self.times.shape != self.temps.shape or len(self.times) < 2:
+            raise ValueError("Trace needs matching times and temperatures, at least two points")
+        self.offsets = np.zeros(len(self.channels)) if offsets is None else np.asarray(offsets, dtype=float)
+        self.noise = noise
+        self.dt = dt
+        self.realtime = realtime
+        self.loop = loop
+        self.coeffs = coeffs
+        self.rng = np.random.default_rng(seed)
+        self.duration = self.times[-1] - self.times[0]
+        self.elapsed = 0.0
+        self.started = time.perf_counter()
+        self.epoch = time.time()
+
+    @classmethod
+    def from_csv(cls, path, channels=(1,), **kwargs):
+        """Replay a Timestamp,Temperature log such as temperature_data.csv"""
+        stamps = []
+        temps = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                stamps.append(datetime.strptime(row['Timestamp'], '%Y-%m-%d %H:%M:%S').timestamp())
+                temps.append(float(row['Temperature']))
+        stamps = np.asarray(stamps)
+        return cls(channels, stamps - stamps[0], temps, **kwargs)
+
+    def _trace_time(self):
+        if self.realtime:
+            self.elapsed = time.perf_counter() - self.started
+        t = self.elapsed
+        if self.loop and self.duration > 0:
+            t = t % self.duration
+        return self.times[0] + t
+
+    def temperature(self):
+        """True (noise free) probe temperatures at the current trace time"""
+        return np.interp(self._trace_time(), self.times, self.temps) + self.offsets
+
+    def read(self):
+        temps = self.temperature()
+        if self.noise:
+            temps = temps + self.rng.normal(0.0, self.noise, len(temps))
+        r = ntc.celsius_to_resistance(temps, self.coeffs)
+        value = r / (r + ntc.r25)
+        if not self.realtime:
+            self.elapsed += self.dt
+        return np.rint(value * ntc.ADC_MAX) / ntc.ADC_MAX
+
+    def now(self):
+        if self.realtime:
+            return time.time()
+        return self.epoch + self.elapsed
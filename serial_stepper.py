@@ -0,0 +1,142 @@
+import time
+from threading import Lock
+
+STATES = ('IDLE', 'MOVING', 'RUNNING', 'STOPPING')
+
+
+class SerialStepper:
+    """TB6600_Stepper interface backed by the pump_control.ino firmware.
+
+    The Arduino generates the pulses, the host only sends one command per
+    move or speed change over the serial rate protocol (see the .ino for
+    the command list). step() returns once the move is accepted, use
+    wait() to block until the pump is idle again. A step() while an earlier
+    move is still running waits for it to finish first, so moves queue up
+    like they do on the GPIO driver instead of replacing each other. Pass `link` to use any
+    object with the pyserial write/read_until interface, for example
+    firmware_sim.PumpFirmwareSim.
+    """
+
+    def __init__(self, port='/dev/ttyACM0', baudrate=115200, link=None, timeout=1):
+        if link is None:
+            import serial
+            link = serial.Serial(port=port, baudrate=baudrate, timeout=timeout)
+            time.sleep(2)  # the Uno resets when the port opens
+            link.reset_input_buffer()
+        self.link = link
+        self.lock = Lock()
+
+        self.steps_per_rev = 400  # SW 3 & SW 6 is OFF 200
+        self.microsteps = 1
+        self.delay = 0.0008  # half period, the firmware's old fixed speed
+        self.accel = 800  # steps/s^2
+        self.profile = 'trapezoidal'  # the firmware only ramps linearly
+        self.direction = True
+
+        self.command('setACCEL', self.accel)
+        self.command('setRATE', f'{self.step_rate():.2f}')
+        print(f"Serial stepper connected on {getattr(link, 'port', type(link).__name__)}")
+
+    def command(self, cmd, value=''):
+        """Send one command, returns the reply line"""
+        with self.lock:
+            self.link.write(f'{cmd}{value}\r'.encode())
+            reply = self.link.read_until(b'\r').decode().strip()
+        if not reply:
+            raise TimeoutError(f"No reply to {cmd}")
+        if reply.startswith('ERR'):
+            raise ValueError(f"Pump rejected {cmd}{value}: {reply}")
+        return reply
+
+    def enable(self):
+        self.command('setENA', 1)
+
+    def disable(self):
+        self.command('setENA', 0)
+
+    def set_direction(self, direction):
+        self.command('setDIR', int(bool(direction)))
+        self.direction = bool(direction)
+
+    def set_rpm(self, rpm):
+        if rpm <= 0:
+            raise ValueError("RPM must be greater than 0")
+        self.delay = 30/(self.steps_per_rev*rpm)
+        self.command('setRATE', f'{self.step_rate():.2f}')
+
+    def get_rpm(self):
+        return 30/(self.steps_per_rev*self.delay)
+
+    def step_rate(self):
+        """Cruise rate in steps/s, each step is a HIGH and a LOW of `delay`"""
+        return 1 / (2 * self.delay)
+
+    def set_accel(self, accel):
+        self.accel = accel
+        self.command('setACCEL', accel)
+
+    def step(self, steps=1):
+        if steps == 0:
+            return
+        direction = steps > 0
+        self._finish_move()
+        self.enable()
+        if direction != self.direction:
+            self.set_direction(direction)
+        self.command('MOVE', abs(steps))
+        print(f"Moving {abs(steps)} steps {'forward' if direction else 'backward'}")
+
+    def rotate_degrees(self, degrees, direction=True):
+        # steps_per_rev already counts microsteps, see microstep.apply_microsteps
+        steps = int((degrees / 360) * self.steps_per_rev)
+        self.step(steps if direction else -steps)
+
+    def start_continuous(self, direction):
+        self._finish_move()
+        self.enable()
+        if direction != self.direction:
+            self.set_direction(direction)
+        self.command('RUN')
+
+    def stop_continuous(self):
+        self.command('STOP')
+
+    def emergency_stop(self):
+        self.command('HALT')
+        self.disable()
+
+    def status(self):
+        """Position, remaining steps, current rate, direction, enable and state"""
+        _, position, remaining, rate, direction, enabled, state = self.command('getSTATUS').split()
+        return {
+            'position': int(position),
+            'remaining': int(remaining),
+            'rate': int(rate),
+            'direction': direction == '1',
+            'enabled': enabled == '1',
+            'state': STATES[int(state)],
+        }
+
+    def wait(self, timeout=None, poll=0.05):
+        """Block until the current move has finished, False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.status()['state'] != 'IDLE':
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def _finish_move(self):
+        """Wait out a move or stop in progress, the firmware rejects setDIR and replaces MOVE while busy"""
+        state = self.status()['state']
+        if state == 'RUNNING':
+            raise RuntimeError("Pump is running continuously, stop it first")
+        if state != 'IDLE':
+            self.wait()
+
+    def cleanup(self):
+        try:
+            self.emergency_stop()
+        finally:
+            self.link.close()
+        print("Serial stepper closed")
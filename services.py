@@ -0,0 +1,37 @@
+from coordinator import Coordinator
+from telemetry_bus import TelemetryBus
+
+
+class Services:
+    """Threads shared by the subsystems, stopped together when the app closes.
+
+    Each subsystem registers its device when its screen first loads:
+    'amplifier' (main.AmplifierLink) and 'pump' (the panel's dosing.Pump),
+    the names the coordinator's leads use. The coordinator thread is only
+    started once there is a device for it to drive.
+    """
+
+    def __init__(self):
+        self.bus = TelemetryBus()
+        self.coordinator = Coordinator()
+        self.devices = {}
+        self._stops = []
+
+    def register(self, name, device):
+        """Make device available to coordinated programs as `name`"""
+        self.devices[name] = device
+        if not self.coordinator.is_alive():
+            self.coordinator.start()
+
+    def on_shutdown(self, stop):
+        """Call stop() at shutdown, in reverse order of registration"""
+        self._stops.append(stop)
+
+    def shutdown(self):
+        # Nothing scheduled may fire at a device that is being stopped
+        self.coordinator.shutdown()
+        for stop in reversed(self._stops):
+            try:
+                stop()
+            except Exception as e:
+                print(f"Shutdown error: {e}")
@@ -0,0 +1,160 @@
+import sqlite3
+import time
+
+from telemetry_store import to_epoch
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    start REAL,
+    stop REAL,
+    pressure_kpa INTEGER,
+    operation TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    temperature REAL,
+    mode TEXT,
+    operation TEXT,
+    load_power REAL,
+    voltage REAL,
+    frequency REAL
+);
+-- Covers the dashboard history queries, they never touch the table itself
+CREATE INDEX IF NOT EXISTS samples_run_time
+    ON samples (run_id, timestamp, temperature, load_power, voltage);
+CREATE INDEX IF NOT EXISTS runs_start ON runs (start);
+"""
+
+INSERT_SAMPLE = """
+INSERT INTO samples (run_id, timestamp, temperature, mode, operation, load_power, voltage, frequency)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+INSERT_RUN = "INSERT INTO runs (start, pressure_kpa, operation) VALUES (?, ?, ?)"
+UPDATE_RUN = "UPDATE runs SET stop = ? WHERE run_id = ?"
+
+# Aggregate queries behind the history views. sqlite3 keeps compiled
+# statements in its per-connection cache, so these are prepared once.
+HISTORY_SQL = """
+SELECT CAST(timestamp / :width AS INTEGER) * :width AS bucket,
+       MIN(temperature), AVG(temperature), MAX(temperature), COUNT(temperature),
+       AVG(load_power), AVG(voltage)
+FROM samples
+WHERE run_id = :run_id AND timestamp BETWEEN :t0 AND :t1
+GROUP BY bucket
+ORDER BY bucket
+"""
+RUN_SUMMARY_SQL = """
+SELECT COUNT(*), MIN(timestamp), MAX(timestamp), MAX(temperature), AVG(temperature)
+FROM samples
+WHERE run_id = ?
+"""
+RANGE_SQL = """
+SELECT timestamp, temperature, load_power, voltage
+FROM samples
+WHERE run_id = ? AND timestamp BETWEEN ? AND ?
+ORDER BY timestamp
+"""
+RUNS_SQL = """
+SELECT run_id, start, stop, pressure_kpa, operation
+FROM runs
+WHERE start BETWEEN ? AND ?
+ORDER BY start
+"""
+
+
+def _bound(t, default):
+    return default if t is None else to_epoch(t)
+
+
+def connect(path, readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, cached_statements=64)
+    else:
+        # A TelemetryLogger writes from its own thread, not the one that opened the store
+        conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+    return conn
+
+
+class SQLiteStore:
+    """Embedded SQLite telemetry store in WAL mode.
+
+    Implements the TelemetryLogger writer interface: each batch goes in as
+    one executemany inside one transaction. WAL lets analysis tools read
+    through SQLiteReader while the reactor keeps writing, readers never
+    block the writer.
+    """
+
+    def __init__(self, path='telemetry.db'):
+        self.path = path
+        self.conn = connect(path)
+        self.run_id = None
+        self.last_timestamp = None
+        self.info = {}
+
+    def new_run(self, start=None):
+        start = time.time() if start is None else start
+        with self.conn:
+            cursor = self.conn.execute(INSERT_RUN, (start, self.info.get('pressure_kpa'), self.info.get('operation')))
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def write_batch(self, records):
+        if self.run_id is None:
+            self.new_run(records[0][0])
+        run_id = self.run_id
+        with self.conn:
+            self.conn.executemany(INSERT_SAMPLE, ((run_id,) + tuple(r) for r in records))
+        self.last_timestamp = records[-1][0]
+
+    def flush(self):
+        pass  # every batch is already its own transaction
+
+    def sync(self):
+        # Fold the WAL back into the database file, without waiting on readers
+        self.conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def rotate(self, info=None):
+        self._end_run()
+        self.info = info or {}
+
+    def _end_run(self):
+        if self.run_id is not None:
+            with self.conn:
+                self.conn.execute(UPDATE_RUN, (self.last_timestamp, self.run_id))
+            self.run_id = None
+
+    def close(self):
+        self._end_run()
+        self.sync()
+        self.conn.close()
+
+
+class SQLiteReader:
+    """Read-only connection for dashboards and analysis tools"""
+
+    def __init__(self, path='telemetry.db'):
+        self.conn = connect(path, readonly=True)
+
+    def runs(self, since=None, until=None):
+        return self.conn.execute(RUNS_SQL, (_bound(since, 0), _bound(until, float('inf')))).fetchall()
+
+    def summary(self, run_id):
+        return self.conn.execute(RUN_SUMMARY_SQL, (run_id,)).fetchone()
+
+    def history(self, run_id, t0=None, t1=None, width=60):
+        """(bucket, min, mean, max, count, mean power, mean voltage) per bucket"""
+        return self.conn.execute(HISTORY_SQL, {
+            'run_id': run_id, 't0': _bound(t0, 0), 't1': _bound(t1, float('inf')), 'width': width,
+        }).fetchall()
+
+    def samples(self, run_id, t0=None, t1=None):
+        """Cursor over raw rows, iterate it rather than fetching everything"""
+        return self.conn.execute(RANGE_SQL, (run_id, _bound(t0, 0), _bound(t1, float('inf'))))
+
+    def close(self):
+        self.conn.close()
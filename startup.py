@@ -0,0 +1,80 @@
+import importlib
+import sys
+import threading
+import time
+
+# Imported before Kivy by the app entry points: the clock starts here, and
+# Kivy would reject an argument it doesn't know
+STARTED = time.perf_counter()
+PROFILE = '--profile-startup' in sys.argv
+if PROFILE:
+    sys.argv.remove('--profile-startup')
+
+_marks = []
+_lock = threading.Lock()
+_reported = False
+
+
+def mark(name):
+    """Record how long after startup `name` happened, for --profile-startup"""
+    at = time.perf_counter() - STARTED
+    with _lock:
+        _marks.append((name, at, threading.current_thread().name))
+    if PROFILE and _reported:
+        # after the first frame, e.g. hardware connecting in the background
+        print(f"[startup] {at:7.3f} s  {name}")
+
+
+def report():
+    global _reported
+    if not PROFILE or _reported:
+        return
+    _reported = True
+    with _lock:
+        marks = sorted(_marks, key=lambda m: m[1])
+    print("Startup profile:")
+    previous = 0.0
+    for name, at, thread in marks:
+        where = '' if thread == 'MainThread' else f'  ({thread})'
+        print(f"  {at:7.3f} s  +{at - previous:6.3f}  {name}{where}")
+        previous = at
+
+
+def preload(*modules):
+    """Import modules on a background thread while the window is set up.
+
+    A later import of the same module waits for this one to finish instead
+    of doing the work twice, so the caller's imports stay as they are.
+    """
+    def work():
+        for module in modules:
+            importlib.import_module(module)
+            mark(f'preloaded {module}')
+    threading.Thread(target=work, name='preload', daemon=True).start()
+
+
+def in_background(name, work, on_done):
+    """Run work() on a thread, then on_done(result, error) on the Kivy clock"""
+    from kivy.clock import Clock
+
+    def run():
+        try:
+            result, error = work(), None
+        except Exception as e:
+            result, error = None, e
+        mark(f'{name} {"failed" if error else "ready"}')
+        Clock.schedule_once(lambda dt: on_done(result, error))
+    threading.Thread(target=run, name=name, daemon=True).start()
+
+
+def after_first_frame(callback):
+    """Call callback() once the window has drawn, on the Kivy thread"""
+    from kivy.core.window import Window
+
+    def flipped(*args):
+        Window.unbind(on_flip=flipped)
+        if not _reported:
+            mark('first frame')
+            report()
+        callback()
+    Window.bind(on_flip=flipped)
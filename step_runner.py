@@ -0,0 +1,193 @@
+import time
+from threading import Event, Thread
+
+from gpio_backend import GPIO
+
+from motion_profile import ramp_intervals
+
+SPIN_NS = 200_000  # busy-wait the last 0.2 ms, sleep() alone overshoots by more
+
+
+def wait_until(deadline_ns, spin_ns=SPIN_NS):
+    """Sleep until just before deadline_ns, then spin on perf_counter_ns"""
+    remaining = deadline_ns - time.perf_counter_ns()
+    if remaining > spin_ns:
+        time.sleep((remaining - spin_ns) / 1e9)
+    while time.perf_counter_ns() < deadline_ns:
+        pass
+
+
+class StepRunner(Thread):
+    """Continuous rotation on its own thread, paced by absolute deadlines.
+
+    Each step is due one period after the previous deadline (not after the
+    previous pulse finished), so sleep overshoot and GPIO call time don't
+    accumulate into drift. A step that starts after its LOW edge was due
+    counts as a missed deadline and the schedule restarts from now instead
+    of bursting to catch up. The target rate is read from the stepper every
+    step, so set_rpm takes effect at once, ramped at the stepper's accel.
+    A reversal while running ramps down, flips DIR and ramps back up.
+    """
+
+    def __init__(self, stepper, spin_ns=SPIN_NS, window=1.0):
+        super().__init__(daemon=True)
+        self.stepper = stepper
+        self.spin_ns = spin_ns
+        self.window_ns = int(window * 1e9)
+        self.direction = True
+        self.moving = False
+        self.alive = True
+        self.wake = Event()
+        self._nudge = Event()  # cuts a long inter-step wait short
+        self.idle = Event()  # set while no run is in progress
+        self.idle.set()
+        self.total_steps = 0  # signed, never reset, forward is positive
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.steps = 0
+        self.missed = 0
+        self.max_late_ns = 0
+        self.achieved_rate = 0.0  # steps/s over the last window
+        self._window_start = time.perf_counter_ns()
+        self._window_steps = 0
+
+    def run_motor(self, direction=None):
+        if direction is not None:
+            self.set_direction(direction)
+        self.moving = True
+        self.idle.clear()
+        self.wake.set()
+
+    def set_direction(self, direction):
+        """Direction of the next run, or reverse (ramped) if running now"""
+        self.direction = direction
+        self._nudge.set()
+
+    def stop_motor(self):
+        """Ramp down and stop, the thread stays ready for the next run"""
+        self.moving = False
+        self._nudge.set()
+
+    def shutdown(self):
+        self.moving = False
+        self.alive = False
+        self._nudge.set()
+        self.wake.set()
+
+    def commanded_rpm(self):
+        return self.stepper.get_rpm()
+
+    def achieved_rpm(self):
+        return self.achieved_rate * 60 / self.stepper.steps_per_rev
+
+    def stats(self):
+        return {
+            'steps': self.steps,
+            'missed': self.missed,
+            'max_late_ms': self.max_late_ns / 1e6,
+            'commanded_rpm': self.commanded_rpm(),
+            'achieved_rpm': self.achieved_rpm(),
+        }
+
+    def run(self):
+        while self.alive:
+            self.wake.wait()
+            self.wake.clear()
+            if self.moving and self.alive:
+                self.idle.clear()
+                self._rotate()
+            if not self.moving:
+                self.idle.set()
+        self.idle.set()
+
+    def _periods(self, direction):
+        """Step periods: ramp up, cruise at the current rpm, ramp down on a stop or reversal"""
+        stepper = self.stepper
+        rate = 0.0
+        for period in ramp_intervals(0, stepper.step_rate(), stepper.accel, stepper.profile).tolist():
+            if not self._running(direction):
+                break
+            rate = 1 / period
+            yield period
+        while self._running(direction):
+            # Speed changes while running are slewed at the same acceleration
+            target = stepper.step_rate()
+            if rate <= 0:
+                rate = target
+            elif rate < target:
+                rate = min(target, rate + stepper.accel / rate)
+            elif rate > target:
+                rate = max(target, rate - stepper.accel / rate)
+            yield 1 / rate
+        if rate > 0:
+            yield from ramp_intervals(rate, 0, stepper.accel, stepper.profile).tolist()
+
+    def _running(self, direction):
+        return self.moving and self.alive and self.direction == direction
+
+    def _wait(self, deadline_ns, period, direction):
+        """wait_until, False if a stop or reversal can take effect without waiting.
+
+        That is at shutdown, or once the rate is low enough to stop within
+        a step, where the ramp down would end here anyway.
+        """
+        stoppable = 2 * self.stepper.accel * period * period >= 1
+        while True:
+            remaining = deadline_ns - time.perf_counter_ns()
+            if remaining <= self.spin_ns or not self._nudge.wait((remaining - self.spin_ns) / 1e9):
+                break
+            self._nudge.clear()
+            if not self.alive or (stoppable and not self._running(direction)):
+                return False
+        wait_until(deadline_ns, self.spin_ns)
+        return True
+
+    def _rotate(self):
+        stepper = self.stepper
+        stepper.enable()
+        self.reset_stats()
+        deadline = time.perf_counter_ns()
+        while True:
+            # One segment per direction, a reversal ramps to zero in between
+            direction = self.direction
+            stepper.set_direction(direction)
+            sign = 1 if direction else -1
+            self._nudge.clear()
+            deadline = self._segment(direction, sign, deadline)
+            if not (self.moving and self.alive and self.direction != direction):
+                break
+        self.achieved_rate = 0.0
+        print(f"Continuous run: {self.steps} steps, {self.missed} missed deadlines, "
+              f"worst lateness {self.max_late_ns / 1e6:.2f} ms")
+
+    def _segment(self, direction, sign, deadline):
+        stepper = self.stepper
+        for period in self._periods(direction):
+            period_ns = int(period * 1e9)
+            if not self.alive or not self._wait(deadline, period, direction):
+                break
+            late = time.perf_counter_ns() - deadline
+            if late > self.max_late_ns:
+                self.max_late_ns = late
+            if late >= period_ns // 2:
+                self.missed += 1
+                deadline += late
+            GPIO.output(stepper.PUL, GPIO.HIGH)
+            self.total_steps += sign
+            self._count(time.perf_counter_ns())
+            finished = self._wait(deadline + period_ns // 2, period, direction)
+            GPIO.output(stepper.PUL, GPIO.LOW)
+            deadline += period_ns
+            if not finished:
+                break
+        return max(deadline, time.perf_counter_ns())
+
+    def _count(self, now):
+        self.steps += 1
+        self._window_steps += 1
+        elapsed = now - self._window_start
+        if elapsed >= self.window_ns:
+            self.achieved_rate = self._window_steps * 1e9 / elapsed
+            self._window_start = now
+            self._window_steps = 0
@@ -0,0 +1,38 @@
+import collections
+import time
+
+
+class TelemetryBus:
+    """Latest readings of every subsystem, fanned out to subscribers.
+
+    publish() only stores the values and appends them to a deque, so it is
+    safe from any thread. Subscribers are called from drain(), on whichever
+    thread calls it; the app host drains on the Kivy clock so callbacks can
+    update widgets directly.
+    """
+
+    def __init__(self):
+        self.latest = {}
+        self._pending = collections.deque()
+        self._subscribers = collections.defaultdict(list)
+
+    def publish(self, topic, **values):
+        values['time'] = time.time()
+        self.latest[topic] = values
+        self._pending.append((topic, values))
+
+    def subscribe(self, topic, callback):
+        """callback(topic, values) for every publish on topic, '*' for all"""
+        self._subscribers[topic].append(callback)
+
+    def get(self, topic, key, default=None):
+        return self.latest.get(topic, {}).get(key, default)
+
+    def drain(self, *args):
+        while self._pending:
+            topic, values = self._pending.popleft()
+            for callback in self._subscribers[topic] + self._subscribers['*']:
+                try:
+                    callback(topic, values)
+                except Exception as e:
+                    print(f"Telemetry subscriber for {topic} failed: {e}")
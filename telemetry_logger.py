@@ -0,0 +1,153 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+FIELDS = ['Timestamp', 'Temperature', 'Mode', 'OperationType', 'LoadPower', 'Voltage', 'Frequency']
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_ROTATE = object()
+_STOP = object()
+
+
+def format_record(record):
+    """Queue record -> CSV row, timestamps are formatted on the logger thread"""
+    timestamp, *values = record
+    return [time.strftime(TIME_FORMAT, time.localtime(timestamp))] + ['' if v is None else v for v in values]
+
+
+class CSVWriter:
+    """Rotating CSV sink in the temperature_data.csv layout plus power columns"""
+
+    def __init__(self, directory='logs', prefix='temperature_data', max_bytes=16 * 1024 * 1024,
+                 buffer_size=1024 * 1024):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        self.file = None
+        self.writer = None
+        self.path = None
+        self.part = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self):
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        self.path = os.path.join(self.directory, f'{self.prefix}_{stamp}_{self.part:03d}.csv')
+        self.part += 1
+        self.file = open(self.path, 'w', newline='', buffering=self.buffer_size)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(FIELDS)
+
+    def write_batch(self, records):
+        if self.file is None:
+            self._open()
+        self.writer.writerows(format_record(r) for r in records)
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def sync(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def rotate(self, info=None):
+        """Close the current file, the next batch starts a new one"""
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+    def close(self):
+        self.rotate()
+
+
+class TelemetryLogger(threading.Thread):
+    """Background writer fed from an in-memory queue.
+
+    log() only appends a tuple to the queue, so it is safe to call from the
+    Kivy and serial threads. This thread drains the queue in batches, hands
+    them to the writer, flushes every flush_interval and fsyncs every
+    fsync_interval rather than per row. A batch the writer fails on is
+    counted in `dropped` and the thread carries on with the next one.
+    """
+
+    def __init__(self, writer, batch_size=512, flush_interval=1.0, fsync_interval=30.0):
+        super().__init__(daemon=True)
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.queue = queue.SimpleQueue()
+        self.dropped = 0
+
+    def log(self, temperature, mode, operation, load_power=None, voltage=None, frequency=None, timestamp=None):
+        self.queue.put((time.time() if timestamp is None else timestamp,
+                        temperature, mode, operation, load_power, voltage, frequency))
+
+    def new_run(self, **info):
+        """Start a new file for the next run, info is passed on to the writer"""
+        self.queue.put((_ROTATE, info))
+
+    def end_run(self):
+        """Close the current run without starting another"""
+        self.queue.put((_ROTATE, None))
+
+    def stop(self, timeout=5.0):
+        self.queue.put(_STOP)
+        self.join(timeout)
+        if self.dropped:
+            print(f"Telemetry logger dropped {self.dropped} records")
+
+    def run(self):
+        last_flush = last_sync = time.monotonic()
+        running = True
+        while running:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is _STOP:
+                        running = False
+                        break
+                    if item[0] is _ROTATE:
+                        self._write(batch)
+                        batch = []
+                        self._call(self.writer.rotate, item[1])
+                    else:
+                        batch.append(item)
+                        if len(batch) >= self.batch_size:
+                            break
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._write(batch)
+
+            now = time.monotonic()
+            if now - last_sync >= self.fsync_interval:
+                self._call(self.writer.sync)
+                last_sync = last_flush = now
+            elif now - last_flush >= self.flush_interval:
+                self._call(self.writer.flush)
+                last_flush = now
+        self._call(self.writer.close)
+
+    def _write(self, batch):
+        if batch and not self._call(self.writer.write_batch, batch):
+            self.dropped += len(batch)
+
+    def _call(self, method, *args):
+        """Run a writer method, False if it failed"""
+        # Any error, not just I/O, would otherwise end the thread and leave the queue growing
+        try:
+            method(*args)
+        except Exception as e:
+            print(f"Telemetry {method.__name__} error: {e!r}")
+            return False
+        return True
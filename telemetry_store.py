@@ -0,0 +1,297 @@
+import bisect
+import csv
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from telemetry_logger import FIELDS, TIME_FORMAT
+
+# Column name -> on-disk dtype. The timestamp column (epoch seconds, f8) is implicit.
+COLUMNS = {
+    'temperature': 'f4',
+    'mode': 'u1',
+    'operation': 'u1',
+    'load_power': 'f4',
+    'voltage': 'f4',
+    'frequency': 'f4',
+}
+# Small string columns are stored as codes into these lists
+CATEGORIES = {
+    'mode': ['OFF', 'AUTO'],
+    'operation': ['CONTINUOUS', 'PULSED'],
+}
+# Order of the values in a TelemetryLogger record after the timestamp
+RECORD_COLUMNS = ['temperature', 'mode', 'operation', 'load_power', 'voltage', 'frequency']
+
+
+def to_epoch(t):
+    """Accept epoch seconds, datetime or 'YYYY-mm-dd HH:MM:SS' strings"""
+    if isinstance(t, str):
+        t = datetime.strptime(t, TIME_FORMAT)
+    if isinstance(t, datetime):
+        return t.timestamp()
+    return float(t)
+
+
+def format_column(values):
+    """Shortest text form of a float column, missing values left blank"""
+    text = values.astype(str)
+    text[np.isnan(values)] = ''
+    return text
+
+
+class ColumnStore:
+    """One run of telemetry as fixed-width memmap files, one per column.
+
+    Rows are appended in time order. Every index_stride rows the timestamp
+    is recorded in a sparse index, so a time range query bisects the index
+    and then only searches one stride of the timestamp column. Queries
+    return views into the memmaps, nothing is copied.
+    """
+
+    def __init__(self, path, columns=None, categories=None, index_stride=256, grow=65536, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        elif readonly:
+            raise FileNotFoundError(f"No telemetry store at {path}")
+        else:
+            os.makedirs(path, exist_ok=True)
+            meta = {
+                'columns': dict(columns or COLUMNS),
+                'categories': {k: list(v) for k, v in (categories or CATEGORIES).items()},
+                'index_stride': index_stride,
+                'length': 0,
+                'created': time.time(),
+            }
+        self.meta = meta
+        self.columns = {'timestamp': 'f8', **meta['columns']}
+        self.categories = meta['categories']
+        self._codes = {name: {v: i for i, v in enumerate(values)} for name, values in self.categories.items()}
+        self.index_stride = meta['index_stride']
+        self.length = meta['length']
+        self.grow = grow
+
+        index_path = os.path.join(path, 'index.f8')
+        self.index = np.fromfile(index_path).tolist() if os.path.exists(index_path) else []
+        self.capacity = 0
+        self.maps = {}
+        self.rollups = None  # see rollup.Rollups, fed on every append
+        self._map(self.length if readonly else max(self.length, grow))
+        if not readonly:
+            self._write_meta()
+
+    def _file(self, name):
+        return os.path.join(self.path, f'{name}.{self.columns[name]}')
+
+    def _map(self, capacity):
+        """(Re)map every column file at the given row capacity"""
+        for name, dtype in self.columns.items():
+            old = self.maps.get(name)
+            if old is not None:
+                old.flush()
+            filename = self._file(name)
+            if self.readonly:
+                self.maps[name] = np.memmap(filename, dtype=dtype, mode='r', shape=(capacity,)) if capacity \
+                    else np.empty(0, dtype=dtype)
+                continue
+            with open(filename, 'ab') as f:
+                f.truncate(capacity * np.dtype(dtype).itemsize)
+            self.maps[name] = np.memmap(filename, dtype=dtype, mode='r+', shape=(capacity,))
+        self.capacity = capacity
+
+    def _write_meta(self):
+        self.meta['length'] = self.length
+        tmp = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, 'meta.json'))
+
+    def encode(self, name, values):
+        """Map category strings to their stored codes, adding new ones"""
+        codes = self._codes[name]
+        out = np.empty(len(values), dtype=self.columns[name])
+        for i, v in enumerate(values):
+            if v not in codes:
+                codes[v] = len(codes)
+                self.categories[name].append(v)
+            out[i] = codes[v]
+        return out
+
+    def append_columns(self, timestamps, values):
+        """Append a block of rows given as whole columns"""
+        if self.readonly:
+            raise IOError("Store is open read-only")
+        timestamps = np.asarray(timestamps, dtype='f8')
+        n = len(timestamps)
+        if n == 0:
+            return
+        if self.length and timestamps[0] < self.maps['timestamp'][self.length - 1]:
+            raise ValueError("Telemetry must be appended in time order")
+        if self.length + n > self.capacity:
+            self._map(max(self.capacity * 2, self.length + n, self.grow))
+
+        start, end = self.length, self.length + n
+        self.maps['timestamp'][start:end] = timestamps
+        for name in self.meta['columns']:
+            column = values.get(name)
+            if column is None:
+                self.maps[name][start:end] = np.nan if self.maps[name].dtype.kind == 'f' else 0
+            elif name in self.categories:
+                self.maps[name][start:end] = self.encode(name, column)
+            else:
+                self.maps[name][start:end] = np.asarray(column, dtype=float)
+
+        first = -(-start // self.index_stride) * self.index_stride
+        new_index = timestamps[first - start::self.index_stride] if first < end else []
+        if len(new_index):
+            self.index.extend(float(t) for t in new_index)
+            with open(os.path.join(self.path, 'index.f8'), 'ab') as f:
+                np.asarray(new_index, dtype='f8').tofile(f)
+        self.length = end
+        if self.rollups is not None:
+            self.rollups.add(timestamps, values)
+
+    def append(self, timestamp, **values):
+        self.append_columns([timestamp], {k: [v] for k, v in values.items()})
+
+    def write_batch(self, records):
+        """TelemetryLogger writer interface, records are logger tuples"""
+        timestamps = [r[0] for r in records]
+        columns = {}
+        for i, name in enumerate(RECORD_COLUMNS, start=1):
+            column = [r[i] for r in records]
+            if name not in self.categories:
+                column = [np.nan if v is None else v for v in column]
+            columns[name] = column
+        self.append_columns(timestamps, columns)
+
+    def flush(self):
+        for m in self.maps.values():
+            if isinstance(m, np.memmap):
+                m.flush()
+        if not self.readonly:
+            self._write_meta()
+        if self.rollups is not None:
+            self.rollups.flush()
+
+    def sync(self):
+        self.flush()
+
+    def close(self):
+        self.flush()
+        if self.rollups is not None:
+            self.rollups.close()
+            self.rollups = None
+        self.maps = {}
+        if not self.readonly and self.capacity > self.length:
+            # Trim the preallocated tail
+            for name, dtype in self.columns.items():
+                with open(self._file(name), 'r+b') as f:
+                    f.truncate(self.length * np.dtype(dtype).itemsize)
+            self.capacity = self.length
+
+    def column(self, name):
+        return self.maps[name][:self.length]
+
+    def decode(self, name, codes):
+        return np.asarray(self.categories[name], dtype=object)[codes]
+
+    def _search(self, t, side):
+        """Row position of t, using the sparse index to narrow the search"""
+        block = bisect.bisect_left(self.index, t) if side == 'left' else bisect.bisect_right(self.index, t)
+        lo = max(block - 1, 0) * self.index_stride
+        hi = min(block * self.index_stride + 1, self.length)
+        return lo + int(np.searchsorted(self.maps['timestamp'][lo:hi], t, side=side))
+
+    def range_slice(self, t0=None, t1=None):
+        start = 0 if t0 is None else self._search(to_epoch(t0), 'left')
+        stop = self.length if t1 is None else self._search(to_epoch(t1), 'right')
+        return slice(start, max(start, stop))
+
+    def range(self, t0=None, t1=None, columns=None):
+        """Columns for t0 <= timestamp <= t1 as zero-copy views"""
+        rows = self.range_slice(t0, t1)
+        names = ['timestamp'] + list(columns or self.meta['columns'])
+        return {name: self.maps[name][rows] for name in names}
+
+    def export_csv(self, path, t0=None, t1=None, chunk=65536):
+        """Write a range out in the temperature_data.csv layout"""
+        rows = self.range_slice(t0, t1)
+        with open(path, 'w', newline='', buffering=1024 * 1024) as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for start in range(rows.start, rows.stop, chunk):
+                part = slice(start, min(start + chunk, rows.stop))
+                stamps = [time.strftime(TIME_FORMAT, time.localtime(t)) for t in self.maps['timestamp'][part]]
+                cols = [self.decode(n, self.maps[n][part]) if n in self.categories else format_column(self.maps[n][part])
+                        for n in RECORD_COLUMNS]
+                writer.writerows(zip(stamps, *cols))
+
+
+class TelemetryStore:
+    """Directory of ColumnStores, one per run (run_0001, run_0002, ...).
+
+    Runs written through the store also keep 1 s / 1 min / 1 h rollups,
+    pass rollup_resolutions=() to turn that off.
+    """
+
+    def __init__(self, root='telemetry', rollup_resolutions=None, **store_options):
+        self.root = root
+        self.rollup_resolutions = rollup_resolutions
+        self.store_options = store_options
+        self.current = None
+        self.current_id = None
+        os.makedirs(root, exist_ok=True)
+
+    def run_ids(self):
+        ids = []
+        for name in os.listdir(self.root):
+            if name.startswith('run_') and name[4:].isdigit():
+                ids.append(int(name[4:]))
+        return sorted(ids)
+
+    def run_path(self, run_id):
+        return os.path.join(self.root, f'run_{run_id:04d}')
+
+    def open_run(self, run_id, readonly=True):
+        return ColumnStore(self.run_path(run_id), readonly=readonly, **self.store_options)
+
+    def new_run(self):
+        ids = self.run_ids()
+        run_id = ids[-1] + 1 if ids else 1
+        self.close()
+        self.current = self.open_run(run_id, readonly=False)
+        self.current_id = run_id
+        from rollup import Rollups, RESOLUTIONS
+        resolutions = RESOLUTIONS if self.rollup_resolutions is None else self.rollup_resolutions
+        if resolutions:
+            self.current.rollups = Rollups(self.current.path, resolutions)
+        return run_id
+
+    # TelemetryLogger writer interface, logger rotation starts a new run
+    def write_batch(self, records):
+        if self.current is None:
+            self.new_run()
+        self.current.write_batch(records)
+
+    def flush(self):
+        if self.current is not None:
+            self.current.flush()
+
+    def sync(self):
+        self.flush()
+
+    def rotate(self, info=None):
+        self.close()
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Step engines under test record to fake_gpio, never a real header
+os.environ.setdefault('GPIO_BACKEND', 'fake')
@@ -0,0 +1,77 @@
+import numpy as np
+
+from analyze_log import LogStats, load_log, read_chunks
+
+
+def chunk(start, temps, operation=0):
+    n = len(temps)
+    return {
+        'timestamp': np.datetime64('2025-09-10T12:00:00') + np.arange(start, start + n).astype('timedelta64[s]'),
+        'temperature': np.asarray(temps, dtype=float),
+        'mode': np.zeros(n, dtype=np.int16),
+        'operation': np.full(n, operation, dtype=np.int16),
+    }
+
+
+def test_rolling_peak_does_not_reach_into_the_previous_run():
+    stats = LogStats(window=3)
+    stats.add(chunk(0, [60, 60, 60, 60]))
+    stats.add(chunk(100, [30, 30, 30, 30]))  # after a gap, a new run
+    runs = stats.finish()
+    assert len(runs) == 2
+    assert runs[1]['peak_rolling'] == 30
+
+
+def test_rolling_mean_carries_across_chunks_of_one_run():
+    stats = LogStats(window=4)
+    stats.add(chunk(0, [10, 20]))
+    stats.add(chunk(2, [30, 40, 10]))
+    runs = stats.finish()
+    assert len(runs) == 1
+    assert runs[0]['peak_rolling'] == 25
+
+
+def test_run_shorter_than_the_window_has_no_rolling_peak():
+    stats = LogStats(window=5)
+    stats.add(chunk(0, [60, 60, 60, 60, 60, 60]))
+    stats.add(chunk(0, [40, 40], operation=1))
+    runs = stats.finish()
+    assert runs[0]['peak_rolling'] == 60
+    assert np.isnan(runs[1]['peak_rolling'])
+
+
+def test_new_file_restarts_the_window():
+    stats = LogStats(window=3)
+    stats.add(chunk(0, [60, 60, 60]))
+    stats.start_file()
+    stats.add(chunk(3, [30, 30, 30]))
+    runs = stats.finish()
+    assert len(runs) == 1  # contiguous, still one run
+    assert runs[0]['peak_rolling'] == 60
+    stats = LogStats(window=3)
+    stats.add(chunk(0, [60, 60]))
+    stats.start_file()
+    stats.add(chunk(2, [30, 30, 30]))
+    assert stats.finish()[0]['peak_rolling'] == 30
+
+
+def test_missing_samples_are_left_out_of_the_mean():
+    stats = LogStats(window=2)
+    stats.add(chunk(0, [50, np.nan, 50]))
+    assert stats.finish()[0]['peak_rolling'] == 50
+
+
+def test_categories_are_shared_across_files(tmp_path):
+    a = tmp_path / 'a.csv'
+    b = tmp_path / 'b.csv'
+    a.write_text('Timestamp,Temperature,Mode,OperationType\n2025-09-10 12:00:00,40,AUTO,PULSED\n')
+    b.write_text('Timestamp,Temperature,Mode,OperationType\n2025-09-10 13:00:00,41,OFF,CONTINUOUS\n')
+    categories = {}
+    codes = []
+    for path in (a, b):
+        for columns, categories in read_chunks([str(path)], categories=categories):
+            codes.append(int(columns['operation'][0]))
+    assert categories['operation'].values == ['PULSED', 'CONTINUOUS']
+    assert codes == [0, 1]
+    columns, _ = load_log(str(a))
+    assert columns['temperature'][0] == 40
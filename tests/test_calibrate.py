@@ -0,0 +1,21 @@
+import numpy as np
+
+import ntc
+from calibrate import fit_steinhart_hart, save_calibration
+
+KNOWN = (3.35e-3, 2.5e-4, 3.0e-6, 7.0e-8)
+
+
+def test_fit_recovers_known_coefficients():
+    temps = np.linspace(5, 80, 12)
+    resistance = ntc.celsius_to_resistance(temps, KNOWN)
+    coeffs, residuals = fit_steinhart_hart(resistance, temps)
+    np.testing.assert_allclose(coeffs, KNOWN, rtol=1e-6)
+    assert np.max(np.abs(residuals)) < 1e-6
+
+
+def test_calibration_file_is_read_back(tmp_path):
+    temps = np.linspace(10, 60, 8)
+    coeffs, residuals = fit_steinhart_hart(ntc.celsius_to_resistance(temps, KNOWN), temps)
+    save_calibration('probe-7', coeffs, residuals, str(tmp_path))
+    assert ntc.load_coefficients('probe-7', str(tmp_path)) == coeffs
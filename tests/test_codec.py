@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import codec
+from telemetry_store import ColumnStore
+
+
+def test_varint_round_trip_covers_every_length():
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2 ** 35, 2 ** 63, 2 ** 64 - 1], dtype=np.uint64)
+    decoded, used = codec.varint_decode(codec.varint_encode(values))
+    assert used == len(codec.varint_encode(values))
+    assert np.array_equal(decoded, values)
+
+
+def test_zigzag_round_trip():
+    values = np.array([0, -1, 1, -2 ** 40, 2 ** 40, np.iinfo(np.int64).min, np.iinfo(np.int64).max])
+    assert np.array_equal(codec.zigzag_decode(codec.zigzag_encode(values)), values)
+
+
+def test_chunk_round_trip_with_gaps_and_categories():
+    n = 1000
+    t = 1_700_000_000.0 + np.arange(n)
+    temperature = np.round(37 + np.sin(np.arange(n) / 50), 2)
+    power = np.where(np.arange(n) % 9 == 0, np.nan, 12.5)
+    modes = ['OFF', 'AUTO']
+    mode_codes = (np.arange(n) // 300) % 2
+    data = codec.encode_chunk(t, {'temperature': temperature, 'load_power': power},
+                              {'temperature': 100, 'load_power': 100},
+                              categories={'mode': (mode_codes, modes)})
+    times, columns = codec.decode_chunk(data)
+    assert np.allclose(times, t)
+    assert np.allclose(columns['temperature'], temperature)
+    assert np.array_equal(np.isnan(columns['load_power']), np.isnan(power))
+    assert list(columns['mode']) == [modes[c] for c in mode_codes]
+    assert len(data) < n * 8  # vs 32 bytes a row as float64
+
+
+def test_foreign_data_is_rejected():
+    t = np.arange(10, dtype=float)
+    data = codec.encode_chunk(t, {'temperature': t}, {'temperature': 100})
+    with pytest.raises(ValueError):
+        codec.decode_chunk(b'XXXX' + data[4:])
+
+
+def test_compacted_run_restores_the_original_schema(tmp_path):
+    store = ColumnStore(str(tmp_path / 'run'))
+    records = [(1_700_000_000.0 + i, 37.0 + (i % 5) / 10, 'AUTO' if i < 40 else 'OFF',
+                'PULSED' if i % 20 < 10 else 'CONTINUOUS', None if i % 3 else 5.0, 10.0, 40000.0)
+               for i in range(100)]
+    store.write_batch(records)
+    path = str(tmp_path / 'chunks.lfz')
+    codec.write_compressed(store, path, chunk_rows=32)
+
+    chunks = list(codec.read_compressed(path))
+    assert len(chunks) == 4
+    times = np.concatenate([c[0] for c in chunks])
+    columns = {name: np.concatenate([c[1][name] for c in chunks]) for name in chunks[0][1]}
+    assert np.allclose(times, [r[0] for r in records])
+    assert list(columns['mode']) == [r[2] for r in records]
+    assert list(columns['operation']) == [r[3] for r in records]
+    assert np.allclose(columns['temperature'], [r[1] for r in records], atol=0.005)
+    power = np.array([np.nan if r[4] is None else r[4] for r in records])
+    assert np.allclose(columns['load_power'], power, equal_nan=True)
@@ -0,0 +1,131 @@
+import time
+
+import pytest
+
+import fake_gpio
+from gpio_backend import GPIO
+from motion_scheduler import DIRECTION, ESTOP, MOVE, RATE, STOP, CommandQueue, MotionScheduler
+from pulse_analysis import BenchStepper, edges
+
+
+def test_commands_come_out_in_priority_order():
+    queue = CommandQueue()
+    queue.put(MOVE, 100, True)
+    queue.put(RATE, 0.002)
+    queue.put(DIRECTION, False)
+    queue.put(MOVE, 50, False)
+    assert [kind for kind, _ in queue.pop_all()] == [DIRECTION, RATE, MOVE, MOVE]
+    assert not queue
+
+
+def test_only_the_last_rate_is_applied():
+    queue = CommandQueue()
+    for delay in (0.004, 0.003, 0.002, 0.001):
+        queue.put(RATE, delay)
+    queue.put(DIRECTION, True)
+    queue.put(DIRECTION, False)
+    assert queue.pop_all() == [(DIRECTION, (False,)), (RATE, (0.001,))]
+    assert queue.pop_all() == []
+
+
+def test_stop_discards_what_it_overtakes():
+    queue = CommandQueue()
+    queue.put(MOVE, 100, True)
+    queue.put(DIRECTION, False)
+    queue.put(RATE, 0.002)
+    queue.put(STOP)
+    queue.put(MOVE, 10, True)
+    assert queue.pop_all() == [(STOP, ()), (RATE, (0.002,)), (MOVE, (10, True))]
+
+    queue.put(MOVE, 100, True)
+    queue.put(STOP)
+    queue.put(ESTOP)
+    assert [kind for kind, _ in queue.pop_all()] == [ESTOP, STOP]
+
+
+class QueuedStepper(BenchStepper):
+    """Applies its commands on the scheduler thread, as p3's stepper does"""
+
+    def __init__(self, scheduler, **kwargs):
+        super().__init__(GPIO, **kwargs)
+        self.scheduler = scheduler
+        self.commands = CommandQueue()
+        self.motions = []
+        self.rates = []
+        scheduler.add_hook(self.apply_commands)
+
+    def submit(self, kind, *args):
+        self.commands.put(kind, *args)
+        self.scheduler.wake.set()
+
+    def apply_commands(self):
+        if not self.commands:
+            return
+        for kind, args in self.commands.pop_all():
+            if kind in (ESTOP, STOP):
+                self.scheduler.cancel_all(self)
+            elif kind == RATE:
+                self.delay = args[0]
+                self.rates.append(args[0])
+            elif kind == MOVE:
+                steps, direction = args
+                self.motions.append(self.scheduler.move(self, [2 * self.delay] * steps, direction))
+
+
+def run_until_stopped(kind):
+    fake_gpio.reset()
+    scheduler = MotionScheduler()
+    scheduler.start()
+    try:
+        stepper = QueuedStepper(scheduler, rpm=30)  # 5 ms step period
+        period_ns = int(2 * stepper.delay * 1e9)
+        stepper.submit(MOVE, 1000, True)
+        deadline = time.monotonic() + 2
+        while not stepper.motions or stepper.motions[0].steps_done < 5:
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+        stopped_at = time.perf_counter_ns()
+        stepper.submit(kind)
+        assert stepper.motions[0].wait(period_ns / 1e9)
+        time.sleep(0.02)
+    finally:
+        scheduler.shutdown()
+        scheduler.join(1)
+    rising, falling = edges(fake_gpio.timeline, stepper.PUL)
+    return stepper, rising, falling, stopped_at, period_ns
+
+
+def test_stop_preempts_a_move_within_one_step_period():
+    stepper, rising, falling, stopped_at, period_ns = run_until_stopped(STOP)
+    assert len(stepper.motions) == 1
+    assert rising[-1] < stopped_at + period_ns
+    assert len(rising) == len(falling) == stepper.motions[0].steps_done < 1000
+
+
+def test_estop_preempts_a_move_within_one_step_period():
+    stepper, rising, falling, stopped_at, period_ns = run_until_stopped(ESTOP)
+    assert len(stepper.motions) == 1
+    assert rising[-1] < stopped_at + period_ns
+    assert len(rising) == len(falling) == stepper.motions[0].steps_done < 1000
+
+
+def test_a_burst_of_rate_changes_is_applied_once():
+    fake_gpio.reset()
+    scheduler = MotionScheduler()
+    stepper = QueuedStepper(scheduler)
+    # Queued before the scheduler runs, so they land in one drain
+    for rpm in (30, 45, 60, 90, 120):
+        stepper.submit(RATE, 30 / (stepper.steps_per_rev * rpm))
+    stepper.submit(MOVE, 10, True)
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 2
+        while not stepper.motions:
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+        assert stepper.motions[0].wait(2)
+    finally:
+        scheduler.shutdown()
+        scheduler.join(1)
+    assert stepper.rates == [30 / (stepper.steps_per_rev * 120)]
+    assert stepper.get_rpm() == pytest.approx(120)
@@ -0,0 +1,97 @@
+import math
+
+import numpy as np
+
+from compression import ChannelCompressor, CompressingWriter, RecordCompressor
+
+
+class ListWriter:
+    def __init__(self):
+        self.records = []
+
+    def write_batch(self, records):
+        self.records.extend(records)
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def rotate(self, info=None):
+        pass
+
+    def close(self):
+        pass
+
+
+def record(t, temperature, load_power=None, voltage=10.0, operation='PULSED'):
+    return (t, temperature, 'AUTO', operation, load_power, voltage, 40000)
+
+
+def compress(records, **options):
+    writer = CompressingWriter(ListWriter(), RecordCompressor(
+        {'temperature': 0.1, 'load_power': 0.05, 'voltage': 0.05}, **options))
+    writer.write_batch(records)
+    writer.close()
+    return writer.writer.records
+
+
+def kept(compressor, samples):
+    out = []
+    for i, (t, v) in enumerate(samples):
+        previous, current = compressor.push(t, v)
+        if previous:
+            out.append(i - 1)
+        if current:
+            out.append(i)
+    if compressor.finish():
+        out.append(len(samples) - 1)
+    return out
+
+
+def test_records_with_a_missing_channel_still_compress():
+    records = [record(float(i), 37.0) for i in range(1000)]
+    stored = compress(records, max_interval=None)
+    assert len(stored) <= 3
+    assert stored[0] is records[0] and stored[-1] is records[-1]
+
+
+def test_gap_keeps_only_its_edges():
+    samples = [(float(i), 37.0 if i < 10 or i >= 20 else None) for i in range(30)]
+    indices = kept(ChannelCompressor(0.1), samples)
+    assert indices == [0, 9, 10, 20, 29]
+
+
+def test_excursion_keeps_crossings_and_is_compressed_inside():
+    t = np.arange(300, dtype=float)
+    v = np.where((t >= 100) & (t < 200), 45.0, 40.0)
+    indices = kept(ChannelCompressor(0.1, limits=(None, 42.0)), list(zip(t, v)))
+    assert {99, 100, 199, 200} <= set(indices)
+    assert len(indices) <= 8
+
+
+def test_interpolation_stays_within_the_bound():
+    rng = np.random.default_rng(1)
+    t = np.arange(2000, dtype=float)
+    v = 37 + np.cumsum(rng.normal(0, 0.05, len(t)))
+    compressor = ChannelCompressor(0.1, deadband=0.02)
+    indices = kept(compressor, list(zip(t, v)))
+    assert len(indices) < len(t) / 3
+    rebuilt = np.interp(t, t[indices], v[indices])
+    assert np.max(np.abs(rebuilt - v)) <= 0.1 + 2 * 0.02 + 1e-9
+
+
+def test_fault_keeps_its_neighbours():
+    records = [record(float(i), 37.0, load_power=5.0) for i in range(50)]
+    stored = compress(records, is_fault=lambda r: r[0] == 25.0)
+    times = [r[0] for r in stored]
+    assert {24.0, 25.0, 26.0} <= set(times)
+
+
+def test_operation_change_is_kept():
+    records = [record(float(i), 37.0, operation='PULSED' if i < 30 else 'CONTINUOUS') for i in range(60)]
+    times = [r[0] for r in compress(records)]
+    assert {29.0, 30.0} <= set(times)
+    assert len(times) < 10
+    assert not any(math.isnan(r[1]) for r in compress(records))
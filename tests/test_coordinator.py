@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+
+import fake_gpio
+from coordinator import Coordinator, pulsed_sonication
+from dosing import Pump
+from gpio_backend import GPIO
+from pulse_analysis import BenchStepper, edges
+from step_runner import StepRunner
+
+ON, OFF, CYCLES, GUARD = 0.2, 0.45, 3, 0.03
+
+
+def run_bursts(dose_ml=None):
+    fake_gpio.reset()
+    stepper = BenchStepper(GPIO, rpm=60, accel=4000)
+    runner = StepRunner(stepper)
+    runner.start()
+    pump = Pump(stepper, ul_per_step=1.0, runner=runner)
+    bursts = []
+
+    coordinator = Coordinator()
+    coordinator.start()
+    if dose_ml is None:
+        pump.start_flow()
+    start = 0.1 + GUARD + pump.stop_time()
+    pulsed_sonication(coordinator, start, ON, OFF, CYCLES,
+                      lambda: bursts.append(time.perf_counter_ns()),
+                      lambda: bursts.append(time.perf_counter_ns()),
+                      pump, GUARD, dose_ml)
+    time.sleep(start + CYCLES * (ON + OFF))
+    pump.pause()
+    pump.wait_stopped(2)
+    coordinator.shutdown()
+    runner.shutdown()
+    return coordinator, pump, np.array(bursts).reshape(-1, 2)
+
+
+def steps_in_bursts(pump, bursts):
+    rising, _ = edges(fake_gpio.timeline, pump.stepper.PUL)
+    return [int(np.sum((rising >= on) & (rising <= off))) for on, off in bursts]
+
+
+def test_no_pump_steps_during_bursts():
+    coordinator, pump, bursts = run_bursts()
+    assert len(bursts) == CYCLES
+    assert steps_in_bursts(pump, bursts) == [0] * CYCLES
+    assert pump.odometer > 0
+    rests = [row for row in coordinator.log if row[1].startswith('pump at rest')]
+    assert len(rests) == CYCLES and not any(row[5] for row in rests)
+
+
+def test_doses_stay_out_of_bursts():
+    coordinator, pump, bursts = run_bursts(dose_ml=0.05)
+    assert steps_in_bursts(pump, bursts) == [0] * CYCLES
+    doses = [row for row in coordinator.log if row[1].startswith('dose')]
+    assert len(doses) == CYCLES and not any(row[5] for row in doses)
+    assert pump.odometer == 50 * CYCLES
@@ -0,0 +1,52 @@
+import pytest
+
+import fake_gpio
+from dosing import Pump
+from firmware_sim import PumpFirmwareSim
+from gpio_backend import GPIO
+from pulse_analysis import BenchStepper, edges
+from serial_stepper import SerialStepper
+
+
+def bench_pump():
+    fake_gpio.reset()
+    return Pump(BenchStepper(GPIO, rpm=120, accel=4000), ul_per_step=1.0)
+
+
+def test_dose_pulses_through_the_scheduler():
+    pump = bench_pump()
+    handle = pump.dose(-0.2)
+    assert handle.wait(5) and handle.error is None
+    rising, _ = edges(fake_gpio.timeline, pump.stepper.PUL)
+    assert len(rising) == handle.steps_done == 200
+    assert pump.odometer == -200
+
+
+def test_cancelled_dose_counts_only_the_steps_made():
+    pump = bench_pump()
+    handle = pump.dose(5.0)
+    handle.wait(0.3)
+    handle.cancel()
+    assert handle.wait(1)
+    rising, _ = edges(fake_gpio.timeline, pump.stepper.PUL)
+    assert 0 < handle.steps_done < 5000
+    assert pump.odometer == handle.steps_done == len(rising)
+
+
+def test_dose_on_the_serial_firmware():
+    pump = Pump(SerialStepper(link=PumpFirmwareSim()), ul_per_step=1.0)
+    handle = pump.dose(-0.1)
+    assert handle.wait(5) and handle.error is None
+    assert handle.steps_done == 100 and pump.odometer == -100
+    assert pump.stepper.status()['position'] == -100
+
+
+def test_jog_is_refused_while_dosing():
+    pump = Pump(SerialStepper(link=PumpFirmwareSim()), ul_per_step=1.0)
+    handle = pump.dose(2.0)
+    with pytest.raises(RuntimeError, match="busy"):
+        pump.jog(10)
+    handle.cancel()
+    assert handle.wait(5)
+    pump.jog(10)
+    assert pump.odometer == handle.steps_done + 10
@@ -0,0 +1,44 @@
+import numpy as np
+
+from export import resample
+
+
+def make_blocks(n, block_rows):
+    t = 1000.0 + np.arange(n) * 0.1
+    temperature = 37 + np.sin(t)
+    temperature[::7] = np.nan
+    mode = (np.arange(n) // 50 % 3).astype(np.uint8)
+    return [{'timestamp': t[i:i + block_rows], 'temperature': temperature[i:i + block_rows],
+             'Mode': mode[i:i + block_rows]} for i in range(0, n, block_rows)]
+
+
+def joined(parts):
+    parts = list(parts)
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def test_resample_does_not_depend_on_block_size():
+    whole = joined(resample(make_blocks(1000, 1000), 2.0, {'Mode': ['a', 'b', 'c']}))
+    for rows in (1, 3, 64, 999):
+        split = joined(resample(make_blocks(1000, rows), 2.0, {'Mode': ['a', 'b', 'c']}))
+        assert list(split) == ['timestamp', 'temperature', 'Mode']
+        np.testing.assert_array_equal(split['timestamp'], whole['timestamp'])
+        np.testing.assert_allclose(split['temperature'], whole['temperature'])
+        np.testing.assert_array_equal(split['Mode'], whole['Mode'])
+
+
+def test_resample_means_and_first_category():
+    blocks = [{'timestamp': np.array([0.0, 0.5]), 'power': np.array([1.0, np.nan]), 'Mode': np.array([2, 1])},
+              {'timestamp': np.array([0.9, 1.2]), 'power': np.array([3.0, 5.0]), 'Mode': np.array([1, 0])}]
+    out = joined(resample(blocks, 1.0, {'Mode'}))
+    np.testing.assert_array_equal(out['timestamp'], [0.0, 1.0])
+    np.testing.assert_allclose(out['power'], [2.0, 5.0])
+    np.testing.assert_array_equal(out['Mode'], [2, 0])
+
+
+def test_carry_stays_one_bucket():
+    # One bucket spanning every block is carried as a single row of sums
+    blocks = make_blocks(1000, 10)
+    out = list(resample(iter(blocks), 1e6, {'Mode'}))
+    assert len(out) == 1 and len(out[0]['timestamp']) == 1
+    assert np.isclose(out[0]['temperature'][0], np.nanmean(joined(blocks)['temperature']))
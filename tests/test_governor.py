@@ -0,0 +1,63 @@
+import time
+
+from governor import PulseGovernor
+from ntc import NTCScanner
+from sensor_backend import SimulatedADC
+
+
+def scanner_at(celsius):
+    backend = SimulatedADC((1,), [0, 10], [celsius, celsius])
+    return NTCScanner(channels=(1,), backend=backend)
+
+
+def test_scanner_temperature_none_before_first_scan():
+    scanner = scanner_at(37.0)
+    assert scanner.temperature() is None
+    scanner.scan()
+    assert abs(scanner.temperature() - 37.0) < 0.2
+
+
+def test_scanner_thread_updates_temperature():
+    scanner = scanner_at(37.0)
+    scanner.start(period=0.01)
+    try:
+        deadline = time.monotonic() + 2
+        while scanner.temperature() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scanner.stop()
+    assert abs(scanner.temperature() - 37.0) < 0.2
+
+
+def run_cycles(temperature, cycles=20):
+    scanner = scanner_at(temperature)
+    scanner.scan()
+    governor = PulseGovernor(read_temperature=scanner.temperature, ceiling=42.0, period=0.01)
+    writes = []
+    for _ in range(cycles):
+        governor.cycle(10, writes.append)
+    return governor, writes
+
+
+def test_governor_keeps_full_duty_below_ceiling():
+    governor, writes = run_cycles(37.0)
+    assert governor.duty == governor.max_duty
+    assert governor.voltage_scale == 1.0
+    assert writes[0] == 10
+
+
+def test_governor_backs_off_above_ceiling():
+    scanner = scanner_at(50.0)
+    scanner.scan()
+    governor = PulseGovernor(read_temperature=scanner.temperature, ceiling=42.0)
+    for _ in range(50):
+        governor.update(governor.read_temperature())
+    assert governor.duty == governor.min_duty
+    assert governor.voltage_scale == governor.min_voltage_scale
+
+
+def test_governor_without_probe_leaves_duty_alone():
+    governor = PulseGovernor(read_temperature=lambda: None, ceiling=42.0, period=0.01)
+    governor.cycle(10, lambda v: None)
+    assert governor.temperature is None
+    assert governor.duty == governor.max_duty
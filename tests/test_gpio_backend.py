@@ -0,0 +1,10 @@
+from gpio_backend import on_raspberry_pi
+
+
+def test_detects_a_pi_from_the_device_tree_model(tmp_path):
+    model = tmp_path / 'model'
+    model.write_bytes(b'Raspberry Pi 4 Model B Rev 1.4\x00')
+    assert on_raspberry_pi(str(model))
+    model.write_bytes(b'Some Other Board\x00')
+    assert not on_raspberry_pi(str(model))
+    assert not on_raspberry_pi(str(tmp_path / 'missing'))
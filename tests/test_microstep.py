@@ -0,0 +1,19 @@
+from microstep import find_max_rate
+
+
+def test_bisects_between_last_pass_and_first_fail():
+    tried = []
+
+    def sustains(rate):
+        tried.append(rate)
+        return rate <= 7300
+
+    best = find_max_rate(sustains, 500, 50000, resolution=0.01)
+    # Doubling alone would report 4000
+    assert 7300 * 0.99 <= best <= 7300
+    assert max(r for r in tried if r <= 7300) == best
+
+
+def test_limits_of_the_search():
+    assert find_max_rate(lambda rate: True, 500, 50000) == 50000
+    assert find_max_rate(lambda rate: False, 500, 50000) == 0.0
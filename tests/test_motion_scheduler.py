@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+import fake_gpio
+from gpio_backend import GPIO
+from motion_scheduler import MotionScheduler
+from pulse_analysis import BenchStepper, edges
+
+
+@pytest.fixture
+def scheduler():
+    fake_gpio.reset()
+    scheduler = MotionScheduler()
+    yield scheduler
+    scheduler.shutdown()
+    scheduler.join(1)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def test_edges_due_together_go_out_in_one_call(scheduler, monkeypatch):
+    calls = []
+    output = fake_gpio.output
+
+    def recording_output(channel, value):
+        calls.append(channel)
+        output(channel, value)
+
+    monkeypatch.setattr(fake_gpio, 'output', recording_output)
+    a = BenchStepper(GPIO, pul=8, dir_pin=10)
+    b = BenchStepper(GPIO, pul=12, dir_pin=16)
+    # Both admitted in the same pass, so every deadline is shared
+    moves = [scheduler.move(stepper, [0.002] * 20) for stepper in (a, b)]
+    scheduler.start()
+    assert all(move.wait(2) for move in moves)
+
+    pulses = [channel for channel in calls if isinstance(channel, list)]
+    assert len(pulses) == 40  # a rise and a fall per step, for both pins at once
+    assert all(sorted(channel) == [8, 12] for channel in pulses)
+    assert len(edges(fake_gpio.timeline, 8)[0]) == len(edges(fake_gpio.timeline, 12)[0]) == 20
+
+
+def test_steps_done_counts_rising_edges(scheduler):
+    stepper = BenchStepper(GPIO)
+    scheduler.start()
+    first = scheduler.move(stepper, [0.001] * 30)
+    second = scheduler.move(stepper, [0.001] * 20, direction=False)
+    assert second.wait(2) and first.done()
+    rising, falling = edges(fake_gpio.timeline, stepper.PUL)
+    assert first.steps_done == 30 and second.steps_done == 20
+    assert len(rising) == len(falling) == 50
+
+
+def test_cancel_all_stops_part_way_through(scheduler):
+    stepper = BenchStepper(GPIO)
+    scheduler.start()
+    motion = scheduler.move(stepper, [0.002] * 1000)
+    queued = scheduler.move(stepper, [0.002] * 1000)
+    assert wait_for(lambda: motion.steps_done >= 10)
+    scheduler.cancel_all(stepper)
+    assert motion.wait(0.1) and queued.wait(0.1)
+    time.sleep(0.01)
+
+    rising, falling = edges(fake_gpio.timeline, stepper.PUL)
+    assert 10 <= motion.steps_done < 1000
+    assert queued.steps_done == 0
+    # The pulse in flight is completed, no further one is started
+    assert len(rising) == len(falling) == motion.steps_done
+    assert not scheduler.heap
+
+
+def test_cancel_all_can_keep_one_move(scheduler):
+    stepper = BenchStepper(GPIO)
+    scheduler.start()
+    keep = scheduler.move(stepper, [0.001] * 40)
+    dropped = scheduler.move(stepper, [0.001] * 40)
+    assert wait_for(lambda: keep.steps_done >= 5)
+    scheduler.cancel_all(stepper, keep=keep)
+    assert keep.wait(2) and dropped.wait(0.1)
+    assert keep.steps_done == 40 and dropped.steps_done == 0
+
+
+def test_cancelling_one_motion_leaves_the_next_to_run(scheduler):
+    stepper = BenchStepper(GPIO)
+    scheduler.start()
+    first = scheduler.move(stepper, [0.002] * 1000)
+    second = scheduler.move(stepper, [0.001] * 15)
+    assert wait_for(lambda: first.steps_done >= 5)
+    first.cancel()
+    assert first.wait(0.1) and second.wait(2)
+    assert first.steps_done < 1000 and second.steps_done == 15
+    rising, _ = edges(fake_gpio.timeline, stepper.PUL)
+    assert len(rising) == first.steps_done + second.steps_done
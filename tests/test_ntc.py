@@ -0,0 +1,66 @@
+import numpy as np
+
+import ntc
+from ntc import ADC_MAX, NTCScanner, adc_to_resistance, build_conversion_table, resistance_to_celsius
+
+
+class ListADC:
+    """Backend returning queued normalised readings, one row per read"""
+
+    def __init__(self, channels, rows):
+        self.channels = tuple(channels)
+        self.rows = list(rows)
+        self.t = 0.0
+
+    def read(self):
+        return np.asarray(self.rows.pop(0), dtype=float)
+
+    def now(self):
+        self.t += 1.0
+        return self.t
+
+    def close(self):
+        pass
+
+
+def reading(celsius):
+    """Divider reading of a probe at celsius, on an exact ADC code"""
+    r = ntc.celsius_to_resistance(celsius)
+    return np.rint(r / (r + ntc.r25) * ADC_MAX) / ADC_MAX
+
+
+def test_table_matches_direct_steinhart_hart():
+    table = build_conversion_table()
+    codes = np.arange(1, ADC_MAX)
+    direct = resistance_to_celsius(adc_to_resistance(codes / ADC_MAX))
+    np.testing.assert_allclose(table[codes], direct)
+    # Shorted and open probe codes are clamped to their neighbours
+    assert table[0] == table[1] and table[ADC_MAX] == table[ADC_MAX - 1]
+
+
+def test_ema_smoothing():
+    table = build_conversion_table()
+    cold, hot = reading(30.0), reading(40.0)
+    scanner = NTCScanner(channels=(0,), alpha=0.5, backend=ListADC((0,), [[cold], [hot], [hot]]))
+    t_cold = table[int(round(cold * ADC_MAX))]
+    t_hot = table[int(round(hot * ADC_MAX))]
+    first = scanner.scan()[0]
+    assert first == t_cold  # the first sample seeds the filter
+    second = scanner.scan()[0]
+    assert np.isclose(second, t_cold + 0.5 * (t_hot - t_cold))
+    third = scanner.scan()[0]
+    assert np.isclose(third, second + 0.5 * (t_hot - second))
+    assert scanner.temperature() == third
+
+
+def test_ring_buffer_wraps_in_time_order():
+    rows = [[reading(30.0 + i)] * 2 for i in range(7)]
+    scanner = NTCScanner(channels=(2, 5), alpha=1.0, buffer_len=4, backend=ListADC((2, 5), rows))
+    assert scanner.temperature() is None
+    for _ in range(7):
+        scanner.scan()
+    times, temps = scanner.history()
+    np.testing.assert_array_equal(times, [4.0, 5.0, 6.0, 7.0])
+    np.testing.assert_allclose(temps[:, 0], [33, 34, 35, 36], atol=0.05)
+    np.testing.assert_array_equal(temps[:, 0], temps[:, 1])
+    assert scanner.gradient() == 0.0
@@ -0,0 +1,149 @@
+import json
+
+import numpy as np
+import pytest
+
+import fake_gpio
+from dosing import Pump
+from gpio_backend import GPIO
+from perfusion import ProgramRunner, Timeline, parse_program, program_id
+from pulse_analysis import BenchStepper, edges
+from step_runner import StepRunner
+
+PROGRAM = """
+# wash in
+2 mL/min for 30 min
+ramp to 5 mL/min over 10 min
+pause 5 min
+5 ml/min for 1 h  # hold
+"""
+
+
+def test_program_lines_become_segments():
+    segments = parse_program(PROGRAM)
+    assert [s.kind for s in segments] == ['hold', 'ramp', 'pause', 'hold']
+    assert [(s.start_rate, s.end_rate) for s in segments] == [(2, 2), (2, 5), (0, 0), (5, 5)]
+    assert [s.duration for s in segments] == [1800, 600, 300, 3600]
+    # Ramps start from the rate before them, after a pause that is zero
+    assert parse_program('pause 1 min\nramp to 3 mL/min over 1 min')[1].start_rate == 0
+
+
+@pytest.mark.parametrize('text, message', [
+    ('2 mL/min for 30 min\n2 mL/min until done', "Line 2"),
+    ('2 L/min for 30 min', "Line 1"),
+    ('ramp to 5 mL/min', "Line 1"),
+    ('2 mL/min for 10 min\npause 0 s', "Line 2: 'pause 0 s' takes no time"),
+    ('ramp to 5 mL/min over 0 min', "takes no time"),
+    ('# nothing but a comment\n\n', "empty"),
+])
+def test_bad_steps_are_rejected(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_program(text)
+
+
+def test_segments_follow_each_other_without_overlap():
+    timeline = Timeline(parse_program(PROGRAM))
+    assert timeline.starts[0] == 0
+    assert np.array_equal(timeline.starts[1:], timeline.ends[:-1])
+    assert np.all(timeline.ends > timeline.starts)
+    assert timeline.total == 1800 + 600 + 300 + 3600
+    # A boundary belongs to the segment starting there
+    assert [timeline.index(t) for t in (0, 1799.9, 1800, 2400, 2700, 6300, 9999)] == [0, 0, 1, 2, 3, 3, 3]
+
+
+def test_rate_and_volume_along_the_program():
+    timeline = Timeline(parse_program(PROGRAM))
+    assert timeline.rate_at(0) == timeline.rate_at(1799) == 2
+    assert timeline.rate_at(1800 + 300) == pytest.approx(3.5)  # half way up the ramp
+    assert timeline.rate_at(2500) == 0 and timeline.rate_at(2700) == 5
+
+    assert timeline.volume_at(0) == 0
+    assert timeline.volume_at(1800) == pytest.approx(60)
+    assert timeline.volume_at(2100) == pytest.approx(60 + (2 + 3.5) / 2 * 5)
+    assert timeline.volume_at(2400) == timeline.volume_at(2700) == pytest.approx(95)
+    assert timeline.volume_at(6300) == pytest.approx(timeline.total_volume) == pytest.approx(395)
+    assert timeline.volume_at(1e6) == pytest.approx(395)
+
+
+def bench_pump():
+    stepper = BenchStepper(GPIO, accel=20000)
+    runner = StepRunner(stepper)
+    runner.start()
+    return Pump(stepper, ul_per_step=1.0, runner=runner)
+
+
+def rising_steps(pump):
+    rising, _ = edges(fake_gpio.timeline, pump.stepper.PUL)
+    return len(rising)
+
+
+def test_runner_drives_the_pump_through_the_program(tmp_path):
+    fake_gpio.reset()
+    pump = bench_pump()
+    state_path = str(tmp_path / 'state.json')
+    program = '30 mL/min for 0.3 s\npause 0.2 s\nramp to 60 mL/min over 0.3 s'
+    runner = ProgramRunner(pump, program, state_path, ramp_interval=0.05)
+    runner.start()
+    runner.join(3)
+    pump.runner.shutdown()
+    assert runner.finished and not runner.flowing
+
+    steps = rising_steps(pump)
+    assert pump.odometer == steps
+    # 0.3 s at 500 steps/s, then a ramp from rest to 1000 steps/s
+    assert 200 < steps < 500
+    with open(state_path) as f:
+        state = json.load(f)
+    assert state['finished'] and state['odometer'] == steps
+    assert state['delivered_ml'] == pytest.approx(steps / 1000)
+    assert state['elapsed'] == pytest.approx(0.8)
+
+
+def test_a_resumed_program_reports_the_whole_volume(tmp_path):
+    fake_gpio.reset()
+    state_path = str(tmp_path / 'state.json')
+    program = '30 mL/min for 10 s'
+    pump = bench_pump()
+    first = ProgramRunner(pump, program, state_path)
+    first.start()
+    first.join(0.3)
+    first.stop()
+    first.join(2)
+    pump.runner.shutdown()
+    before = rising_steps(pump)
+    with open(state_path) as f:
+        state = json.load(f)
+    assert not state['finished'] and 0.2 < state['elapsed'] < 1
+    assert state['odometer'] == pump.odometer == before > 0
+
+    # A restart: new step engine, its own step count starting from zero
+    pump = bench_pump()
+    second = ProgramRunner.resume(pump, state_path)
+    assert second.start_at == state['elapsed']
+    second.start()
+    second.join(0.3)
+    assert second.position()['delivered_ml'] > state['delivered_ml']
+    second.stop()
+    second.join(2)
+    pump.runner.shutdown()
+
+    total = rising_steps(pump)
+    assert total > before
+    assert pump.odometer == total
+    with open(state_path) as f:
+        state = json.load(f)
+    assert state['odometer'] == total
+    assert state['delivered_ml'] == pytest.approx(total / 1000)
+
+
+def test_resume_refuses_a_finished_or_tampered_checkpoint(tmp_path):
+    state_path = tmp_path / 'state.json'
+    state = {'program': '1 mL/min for 1 s', 'program_id': program_id('1 mL/min for 1 s'), 'elapsed': 1.0,
+             'total': 1.0, 'odometer': 17, 'delivered_ml': 0.017, 'finished': True}
+    state_path.write_text(json.dumps(state))
+    with pytest.raises(ValueError, match="finished"):
+        ProgramRunner.resume(None, str(state_path))
+    state.update(finished=False, program='9 mL/min for 1 s')
+    state_path.write_text(json.dumps(state))
+    with pytest.raises(ValueError, match="corrupt"):
+        ProgramRunner.resume(None, str(state_path))
@@ -0,0 +1,35 @@
+import numpy as np
+
+from rollup import Rollups
+
+
+def feed(path, seconds, start=7200.0):
+    rollups = Rollups(str(path))
+    times = start + np.arange(seconds, dtype=float)
+    rollups.add(times, {'temperature': 37.0 + np.arange(seconds) % 3, 'load_power': [None] * seconds})
+    rollups.close()
+    return Rollups(str(path), readonly=True)
+
+
+def test_close_cascades_the_last_minute_into_the_hour_tier(tmp_path):
+    rollups = feed(tmp_path, 61)
+    counts = {tier.resolution: int(tier.read()['temperature_count'].sum()) for tier in rollups.tiers}
+    assert counts == {1: 61, 60: 61, 3600: 61}
+
+
+def test_every_tier_agrees_on_min_mean_max(tmp_path):
+    rollups = feed(tmp_path, 150)
+    for tier in rollups.tiers:
+        buckets = tier.read()
+        counts = buckets['temperature_count']
+        assert counts.sum() == 150
+        mean = np.nansum(buckets['temperature_mean'] * counts) / counts.sum()
+        assert abs(mean - (37.0 + np.arange(150) % 3).mean()) < 1e-9
+        assert buckets['temperature_min'].min() == 37.0
+        assert buckets['temperature_max'].max() == 39.0
+        assert buckets['load_power_count'].sum() == 0
+
+
+def test_single_sample_reaches_every_tier(tmp_path):
+    rollups = feed(tmp_path, 1)
+    assert [int(t.read()['temperature_count'].sum()) for t in rollups.tiers] == [1, 1, 1]
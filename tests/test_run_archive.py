@@ -0,0 +1,36 @@
+from run_archive import RunArchive
+
+
+def record(t, temperature=37.0, power=None, operation='CONTINUOUS'):
+    return (t, temperature, 'AUTO', operation, power, 10.0, 40000)
+
+
+def archive_run(root, records, batch=50):
+    archive = RunArchive(str(root))
+    archive.rotate({'pressure_kpa': 30, 'operation': records[0][3]})
+    for i in range(0, len(records), batch):
+        archive.write_batch(records[i:i + batch])
+    archive.close()
+    return archive.catalog[-1]
+
+
+def test_energy_interpolates_over_missing_power(tmp_path):
+    t0 = 1_700_000_000.0
+    records = [record(t0 + i, power=None if i % 7 == 3 else 1.0) for i in range(301)]
+    entry = archive_run(tmp_path, records)
+    assert abs(entry['energy_j'] - 300.0) < 1e-6
+
+
+def test_energy_continues_across_batches_and_gaps(tmp_path):
+    t0 = 1_700_000_000.0
+    records = [record(t0 + i, power=2.0 if i < 10 or i > 40 else None) for i in range(101)]
+    entry = archive_run(tmp_path, records, batch=7)
+    assert abs(entry['energy_j'] - 200.0) < 1e-6
+
+
+def test_energy_unknown_without_power_readings(tmp_path):
+    t0 = 1_700_000_000.0
+    entry = archive_run(tmp_path, [record(t0 + i, operation='PULSED') for i in range(20)])
+    assert entry['energy_j'] is None
+    assert entry['peak_temperature'] == 37.0
+    assert RunArchive(str(tmp_path)).find(operation='PULSED')[0]['energy_j'] is None
@@ -0,0 +1,69 @@
+import numpy as np
+
+import ntc
+from ntc import NTCScanner, build_conversion_table, celsius_to_resistance, resistance_to_celsius
+from sensor_backend import SimulatedADC, SpidevADC, mcp3208_code, mcp3208_request
+
+
+def test_celsius_to_resistance_inverts_steinhart_hart():
+    temps = np.linspace(0, 90, 19)
+    np.testing.assert_allclose(resistance_to_celsius(celsius_to_resistance(temps)), temps, atol=1e-9)
+    assert np.isclose(celsius_to_resistance(25.0), ntc.r25, rtol=1e-3)
+
+
+def test_simulated_reading_converts_back_through_the_table():
+    adc = SimulatedADC((1, 2), [0, 10], [37.0, 37.0], offsets=[0.0, 5.0])
+    codes = np.rint(adc.read() * ntc.ADC_MAX).astype(int)
+    table = build_conversion_table()
+    # 12-bit quantisation is well under 0.05 °C around body temperature
+    np.testing.assert_allclose(table[codes], [37.0, 42.0], atol=0.05)
+
+
+def test_replays_a_temperature_log(tmp_path):
+    path = tmp_path / 'log.csv'
+    path.write_text('Timestamp,Temperature\n'
+                    '2024-01-01 12:00:00,30.0\n'
+                    '2024-01-01 12:00:10,40.0\n'
+                    '2024-01-01 12:00:20,35.0\n')
+    adc = SimulatedADC.from_csv(str(path), channels=(3,), dt=5.0, loop=False)
+    np.testing.assert_array_equal(adc.times, [0, 10, 20])
+    seen = []
+    for _ in range(5):
+        seen.append(float(adc.temperature()[0]))
+        adc.read()
+    np.testing.assert_allclose(seen, [30, 35, 40, 37.5, 35])
+
+
+def test_scan_times_are_the_sample_times():
+    adc = SimulatedADC((1,), [0, 10], [30.0, 40.0], dt=0.5)
+    scanner = NTCScanner(channels=(1,), backend=adc)
+    for _ in range(3):
+        scanner.scan()
+    times, _ = scanner.history()
+    np.testing.assert_allclose(times - adc.epoch, [0.0, 0.5, 1.0])
+
+
+class FakeSpi:
+    def __init__(self, codes):
+        self.codes = codes
+        self.sent = []
+
+    def xfer2(self, frame):
+        self.sent.append(frame)
+        channel = (frame[0] & 0x01) << 2 | frame[1] >> 6
+        code = self.codes[channel]
+        # Null bit and the top nibble in byte 1, junk in the unused high bits
+        return [0xFF, 0xE0 | (code >> 8), code & 0xFF]
+
+
+def test_spidev_frames():
+    assert mcp3208_request(0) == [0x06, 0x00, 0]
+    assert mcp3208_request(5) == [0x07, 0x40, 0]
+    assert mcp3208_code([0x00, 0xFA, 0xBC]) == 0xABC
+
+    adc = SpidevADC.__new__(SpidevADC)
+    adc.channels = (1, 6)
+    adc.requests = [mcp3208_request(ch) for ch in adc.channels]
+    adc.spi = FakeSpi({1: 4095, 6: 2048})
+    np.testing.assert_allclose(adc.read(), [1.0, 2048 / 4095])
+    assert adc.spi.sent == [[0x06, 0x40, 0], [0x07, 0x80, 0]]
@@ -0,0 +1,36 @@
+import pytest
+
+from firmware_sim import PumpFirmwareSim
+from serial_stepper import SerialStepper
+
+
+def pump():
+    return SerialStepper(link=PumpFirmwareSim())
+
+
+def test_reverse_move_while_moving_runs_after_the_first():
+    stepper = pump()
+    stepper.step(200)
+    stepper.step(-50)
+    assert stepper.wait(5)
+    assert stepper.status()['position'] == 150
+    assert not stepper.status()['direction']
+
+
+def test_second_move_is_not_dropped():
+    stepper = pump()
+    stepper.step(200)
+    stepper.step(100)
+    assert stepper.wait(5)
+    assert stepper.status()['position'] == 300
+
+
+def test_move_while_running_is_refused():
+    stepper = pump()
+    stepper.start_continuous(True)
+    with pytest.raises(RuntimeError, match="running"):
+        stepper.step(10)
+    stepper.stop_continuous()
+    assert stepper.wait(5)
+    stepper.step(10)
+    assert stepper.wait(5)
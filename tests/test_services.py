@@ -0,0 +1,41 @@
+import time
+
+from services import Services
+
+
+def test_coordinator_starts_with_the_first_device():
+    services = Services()
+    assert not services.coordinator.is_alive()
+    services.register('pump', object())
+    assert services.coordinator.is_alive()
+    services.register('amplifier', object())
+    assert set(services.devices) == {'pump', 'amplifier'}
+    services.shutdown()
+    services.coordinator.join(1)
+    assert not services.coordinator.is_alive()
+
+
+def test_shutdown_stops_in_reverse_order_after_the_coordinator(capsys):
+    services = Services()
+    services.register('amplifier', object())
+    fired = []
+    services.coordinator.after(0.2, 'amplifier', 'burst on', lambda: fired.append('burst'))
+    stopped = []
+
+    def stop(name):
+        # Anything still scheduled was dropped before the devices stop
+        assert not services.coordinator.alive
+        stopped.append(name)
+
+    def broken():
+        stopped.append('broken')
+        raise RuntimeError("port already closed")
+
+    services.on_shutdown(lambda: stop('dashboard'))
+    services.on_shutdown(broken)
+    services.on_shutdown(lambda: stop('stepper'))
+    services.shutdown()
+    assert stopped == ['stepper', 'broken', 'dashboard']
+    assert "Shutdown error: port already closed" in capsys.readouterr().out
+    time.sleep(0.3)
+    assert fired == []
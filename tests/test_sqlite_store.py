@@ -0,0 +1,61 @@
+import numpy as np
+
+from sqlite_store import SQLiteReader, SQLiteStore
+
+
+def records(t0, n, step=1.0):
+    return [(t0 + i * step, 30.0 + i, 'AUTO', 'PULSED', 2.0 * i, 10.0, 40000) for i in range(n)]
+
+
+def test_batches_runs_and_ranges(tmp_path):
+    path = str(tmp_path / 'telemetry.db')
+    store = SQLiteStore(path)
+    store.write_batch(records(1000.0, 50))
+    store.write_batch(records(1050.0, 50))
+    store.rotate({'pressure_kpa': 30, 'operation': 'PULSED'})
+    store.write_batch(records(2000.0, 10))
+    store.close()
+
+    reader = SQLiteReader(path)
+    runs = reader.runs()
+    assert [r[:3] for r in runs] == [(1, 1000.0, 1099.0), (2, 2000.0, 2009.0)]
+    assert runs[1][3:] == (30, 'PULSED')
+    assert reader.runs(since=1500) == runs[1:]
+    count, first, last, hottest, _ = reader.summary(1)
+    assert (count, first, last, hottest) == (100, 1000.0, 1099.0, 79.0)
+
+    rows = list(reader.samples(1, 1010.0, 1012.5))
+    assert [r[0] for r in rows] == [1010.0, 1011.0, 1012.0]
+    assert list(reader.samples(1, 5000.0)) == []
+    reader.close()
+
+
+def test_history_buckets(tmp_path):
+    path = str(tmp_path / 'telemetry.db')
+    store = SQLiteStore(path)
+    store.write_batch(records(1200.0, 150))  # 20 min + 30 s of 1 s samples
+    store.close()
+
+    history = SQLiteReader(path).history(1, width=60)
+    buckets = [row[0] for row in history]
+    assert buckets == [1200, 1260, 1320]
+    bucket, low, mean, high, count, power, voltage = history[0]
+    assert (low, high, count) == (30.0, 89.0, 60)
+    assert np.isclose(mean, 59.5) and np.isclose(power, 59.0) and voltage == 10.0
+    assert history[-1][4] == 30
+
+
+def test_reader_alongside_the_wal_writer(tmp_path):
+    path = str(tmp_path / 'telemetry.db')
+    store = SQLiteStore(path)
+    store.write_batch(records(1000.0, 20))
+    reader = SQLiteReader(path)
+    cursor = reader.samples(1)
+    assert next(cursor)[0] == 1000.0
+    # The writer commits while the reader is part-way through a cursor
+    store.write_batch(records(1020.0, 20))
+    # The open read keeps its snapshot, the next one sees the new rows
+    assert len(list(cursor)) == 19
+    assert reader.summary(1)[0] == 40
+    store.close()
+    reader.close()
@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+
+import fake_gpio
+from gpio_backend import GPIO
+from pulse_analysis import BenchStepper, dir_setup_violations, edges
+from step_runner import StepRunner
+
+
+def start_runner(**options):
+    fake_gpio.reset()
+    runner = StepRunner(BenchStepper(GPIO, **options))
+    runner.start()
+    return runner
+
+
+def directions_at_steps(stepper):
+    """Rising PUL edges and the DIR level at each of them"""
+    times, pins, levels = fake_gpio.timeline.view()
+    rising, _ = edges(fake_gpio.timeline, stepper.PUL)
+    dir_times, dir_levels = times[pins == stepper.DIR], levels[pins == stepper.DIR]
+    last = np.searchsorted(dir_times, rising, side='right') - 1
+    return rising, np.where(last >= 0, dir_levels[np.maximum(last, 0)], 0)
+
+
+def test_reversal_ramps_through_zero_and_keeps_the_odometer():
+    runner = start_runner(rpm=120, accel=2000)
+    runner.run_motor(True)
+    time.sleep(0.3)
+    runner.set_direction(False)
+    time.sleep(0.4)
+    runner.stop_motor()
+    assert runner.idle.wait(2)
+    runner.shutdown()
+
+    stepper = runner.stepper
+    rising, level = directions_at_steps(stepper)
+    forward, backward = int(np.sum(level == 1)), int(np.sum(level == 0))
+    assert forward > 0 and backward > 0
+    assert runner.total_steps == forward - backward
+    # Only one flip, and never under a running motor
+    flip = np.flatnonzero(np.diff(level))[0]
+    cruise = 1 / stepper.step_rate()
+    assert (rising[flip + 1] - rising[flip]) / 1e9 > 2 * cruise
+    assert (rising[flip] - rising[flip - 1]) / 1e9 > 2 * cruise
+    assert len(dir_setup_violations(fake_gpio.timeline, stepper.PUL, stepper.DIR)[0]) == 0
+
+
+def test_stop_at_a_slow_rate_does_not_wait_out_the_period():
+    # 2 steps/s, a period of half a second
+    runner = start_runner(steps_per_rev=400, rpm=0.3, accel=800)
+    runner.run_motor(True)
+    time.sleep(0.1)
+    started = time.perf_counter()
+    runner.stop_motor()
+    assert runner.idle.wait(1)
+    assert time.perf_counter() - started < 0.1
+    runner.shutdown()
+    runner.join(1)
+    assert not runner.is_alive()
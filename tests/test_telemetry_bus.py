@@ -0,0 +1,36 @@
+from telemetry_bus import TelemetryBus
+
+
+def test_subscribers_only_run_on_drain():
+    bus = TelemetryBus()
+    seen = []
+    bus.subscribe('pump', lambda topic, values: seen.append((topic, values['flow'])))
+    bus.subscribe('*', lambda topic, values: seen.append(('*', topic)))
+    bus.publish('pump', flow=1.5)
+    bus.publish('ultrasound', running=True)
+    bus.publish('pump', flow=2.0)
+    assert seen == []
+    assert bus.get('pump', 'flow') == 2.0 and 'time' in bus.latest['pump']
+    assert bus.get('sensor', 'flow', 'missing') == 'missing'
+
+    bus.drain()
+    assert seen == [('pump', 1.5), ('*', 'pump'), ('*', 'ultrasound'), ('pump', 2.0), ('*', 'pump')]
+    bus.drain()
+    assert len(seen) == 5
+
+
+def test_a_failing_subscriber_does_not_stop_the_others(capsys):
+    bus = TelemetryBus()
+    seen = []
+
+    def broken(topic, values):
+        raise KeyError('temperature')
+
+    bus.subscribe('ultrasound', broken)
+    bus.subscribe('ultrasound', lambda topic, values: seen.append(values['running']))
+    bus.subscribe('*', lambda topic, values: seen.append(topic))
+    bus.publish('ultrasound', running=True)
+    bus.publish('ultrasound', running=False)
+    bus.drain()
+    assert seen == [True, 'ultrasound', False, 'ultrasound']
+    assert capsys.readouterr().out.count("Telemetry subscriber for ultrasound failed") == 2
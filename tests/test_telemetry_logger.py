@@ -0,0 +1,37 @@
+from telemetry_logger import TelemetryLogger
+
+
+class FlakyWriter:
+    def __init__(self):
+        self.rows = []
+        self.closed = False
+
+    def write_batch(self, records):
+        if any(r[1] == 'bad' for r in records):
+            raise ValueError("could not format row")
+        self.rows.extend(records)
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        raise UnicodeEncodeError('ascii', '°', 0, 1, "not encodable")
+
+    def rotate(self, info=None):
+        raise RuntimeError("rotate failed")
+
+    def close(self):
+        self.closed = True
+
+
+def test_writer_errors_drop_the_batch_and_keep_logging():
+    writer = FlakyWriter()
+    logger = TelemetryLogger(writer, flush_interval=0.01, fsync_interval=0.0)
+    logger.start()
+    logger.log('bad', 'AUTO', 'PULSED', timestamp=1.0)
+    logger.new_run()
+    logger.log(37.0, 'AUTO', 'PULSED', timestamp=2.0)
+    logger.stop()
+    assert not logger.is_alive() and writer.closed
+    assert logger.dropped == 1
+    assert [r[1] for r in writer.rows] == [37.0]
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from telemetry_store import ColumnStore, TelemetryStore
+
+
+def filled_store(path, n=203, stride=4, grow=8):
+    store = ColumnStore(str(path), index_stride=stride, grow=grow)
+    # Repeated timestamps, some straddling index entries
+    t = 1000.0 + np.repeat(np.arange(n // 2 + 1), 2)[:n] * 0.5
+    for start in range(0, n, 17):
+        block = slice(start, min(start + 17, n))
+        store.append_columns(t[block], {'temperature': np.arange(n, dtype=float)[block],
+                                        'mode': ['AUTO'] * (block.stop - block.start)})
+    return store, t
+
+
+def test_range_matches_brute_force_across_index_blocks(tmp_path):
+    store, t = filled_store(tmp_path / 'run')
+    assert store.capacity >= len(t) > store.grow
+    assert len(store.index) == -(-len(t) // store.index_stride)
+    for t0 in np.arange(999.0, 1052.0, 0.25):
+        for t1 in (t0, t0 + 0.5, t0 + 7.25, t0 + 30):
+            rows = store.range_slice(t0, t1)
+            expected = np.flatnonzero((t >= t0) & (t <= t1))
+            if len(expected):
+                assert (rows.start, rows.stop) == (expected[0], expected[-1] + 1)
+            else:
+                assert rows.stop == rows.start
+    got = store.range(1010.0, 1012.0)
+    np.testing.assert_array_equal(got['timestamp'], t[(t >= 1010.0) & (t <= 1012.0)])
+    assert set(store.decode('mode', got['mode'])) == {'AUTO'}
+
+
+def test_queries_outside_the_run(tmp_path):
+    store, t = filled_store(tmp_path / 'run')
+    assert store.range_slice(0, t[0] - 1) == slice(0, 0)
+    assert store.range_slice(t[-1] + 1, t[-1] + 100) == slice(len(t), len(t))
+    assert store.range_slice(None, t[0] - 1).stop == 0
+    assert store.range_slice(t[0] - 1, None) == slice(0, len(t))
+    assert store.range_slice() == slice(0, len(t))
+
+
+def test_reopen_after_close_keeps_the_trimmed_length(tmp_path):
+    store, t = filled_store(tmp_path / 'run')
+    store.close()
+    size = os.path.getsize(os.path.join(store.path, 'timestamp.f8'))
+    assert size == len(t) * 8
+    assert os.path.getsize(os.path.join(store.path, 'temperature.f4')) == len(t) * 4
+
+    again = ColumnStore(store.path, readonly=True)
+    assert again.length == len(t)
+    np.testing.assert_array_equal(again.column('timestamp'), t)
+    np.testing.assert_array_equal(again.column('temperature'), np.arange(len(t)))
+    with pytest.raises(IOError):
+        again.append(t[-1] + 1, temperature=1.0)
+
+    writable = ColumnStore(store.path)
+    writable.append(t[-1] + 1, temperature=-1.0)
+    assert writable.range_slice(t[-1] + 1, None) == slice(len(t), len(t) + 1)
+    writable.close()
+    assert ColumnStore(store.path, readonly=True).length == len(t) + 1
+
+
+def test_runs_are_numbered(tmp_path):
+    root = TelemetryStore(str(tmp_path), rollup_resolutions=())
+    assert root.new_run() == 1
+    root.write_batch([(1.0, 37.0, 'AUTO', 'PULSED', None, 10.0, 40000)])
+    assert root.new_run() == 2
+    root.close()
+    assert root.run_ids() == [1, 2]
+    assert root.open_run(1).length == 1